@@ -0,0 +1,110 @@
+"""
+Script para particionar `payments` por mes y archivar meses cerrados
+
+Uso:
+    python archive_payments.py partition --dry-run        # Ver el DDL de particionado
+    python archive_payments.py partition                  # Convertir la tabla (MySQL)
+    python archive_payments.py extend --months-ahead 3    # Crear particiones futuras
+    python archive_payments.py list                       # Ver particiones
+    python archive_payments.py archive --month 2025-01 --out archives/
+    python archive_payments.py restore archives/payments-2025-01.ndjson.gz
+
+`partition` crea triggers en payments (unicidad de stripe_payment_intent_id): el
+usuario necesita el privilegio TRIGGER y, con binlog activo, SUPER o
+log_bin_trust_function_creators=1.
+
+Los totales en payment_daily_rollups no se tocan al archivar; después de archivar
+usar `rebuild_payment_rollups.py --hot-only` si se necesita reconstruirlos.
+
+Con varios shards cada comando se corre por shard:
+    python archive_payments.py --shard 1 archive --month 2025-01 --out archives/shard-1/
+"""
+
+import sys
+import os
+import argparse
+import time
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from sqlalchemy import text
+from database import shard_ids, shard_session
+from services import partition_service
+
+def _parse_month(value: str):
+    year, month = value.split("-")
+    return int(year), int(month)
+
+def main():
+    parser = argparse.ArgumentParser(description="Particionado y archivo de payments")
+    parser.add_argument("--shard", choices=shard_ids(), help="Shard de payments (obligatorio con varios shards)")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    partition_parser = subparsers.add_parser("partition", help="Particionar payments por mes")
+    partition_parser.add_argument("--months-ahead", type=int, default=3)
+    partition_parser.add_argument("--dry-run", action="store_true", help="Sólo imprimir el DDL")
+
+    extend_parser = subparsers.add_parser("extend", help="Crear particiones para los próximos meses")
+    extend_parser.add_argument("--months-ahead", type=int, default=3)
+
+    subparsers.add_parser("list", help="Listar particiones")
+
+    archive_parser = subparsers.add_parser("archive", help="Archivar un mes cerrado")
+    archive_parser.add_argument("--month", required=True, type=_parse_month, help="YYYY-MM")
+    archive_parser.add_argument("--out", default="archives", help="Directorio de salida")
+    archive_parser.add_argument("--keep", action="store_true", help="No eliminar las filas archivadas")
+    archive_parser.add_argument("--chunk-size", type=int, default=5000)
+
+    restore_parser = subparsers.add_parser("restore", help="Restaurar un archivo NDJSON")
+    restore_parser.add_argument("path")
+    restore_parser.add_argument("--chunk-size", type=int, default=5000)
+
+    args = parser.parse_args()
+    if args.shard is None and len(shard_ids()) > 1:
+        parser.error("con varios shards hay que indicar --shard")
+    db = shard_session(args.shard or "0")
+    started = time.perf_counter()
+
+    try:
+        if args.command == "partition":
+            statements = partition_service.partitioning_ddl(db, args.months_ahead)
+            for statement in statements:
+                print(statement + ";\n")
+                if not args.dry_run:
+                    db.execute(text(statement))
+            if not args.dry_run:
+                db.commit()
+                print("✓ Tabla payments particionada")
+
+        elif args.command == "extend":
+            created = partition_service.ensure_future_partitions(db, args.months_ahead)
+            print(f"✓ Particiones creadas: {', '.join(created) if created else 'ninguna'}")
+
+        elif args.command == "list":
+            for partition in partition_service.list_partitions(db):
+                print(f"{partition['name']:>10}  < {partition['less_than']:<24} ~{partition['approx_rows']} filas")
+
+        elif args.command == "archive":
+            year, month = args.month
+            manifest = partition_service.archive_month(
+                db, year, month, args.out, drop=not args.keep, chunk_size=args.chunk_size
+            )
+            print(f"✓ {manifest['rows']} pagos de {manifest['month']} archivados en "
+                  f"{os.path.join(args.out, manifest['file'])}")
+            if manifest.get("removed_with"):
+                print(f"✓ Eliminados de la tabla con {manifest['removed_with']}")
+
+        elif args.command == "restore":
+            restored = partition_service.restore_archive(db, args.path, args.chunk_size)
+            print(f"✓ {restored} pagos restaurados")
+
+    except Exception as e:
+        db.rollback()
+        print(f"✗ Error: {e}")
+        sys.exit(1)
+    finally:
+        db.close()
+
+    print(f"Tiempo: {time.perf_counter() - started:.2f}s")
+
+if __name__ == "__main__":
+    main()
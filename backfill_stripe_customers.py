@@ -0,0 +1,84 @@
+"""
+Script para crear los customers de Stripe de los usuarios que todavía no tienen uno
+
+Los usuarios nuevos reciben su customer al registrarse; este script cubre a los
+usuarios que ya existían. Recorre users por id en bloques y crea los customers
+con concurrencia limitada (STRIPE_CUSTOMER_PRECREATE_CONCURRENCY). Si el usuario
+ya tiene pagos se reutiliza el customer de esos pagos sin llamar a Stripe.
+
+Es seguro correrlo varias veces: las llamadas usan llaves de idempotencia y sólo
+se procesan usuarios con stripe_customer_id vacío. Los shards se recorren uno por uno.
+
+Uso:
+    python backfill_stripe_customers.py
+    python backfill_stripe_customers.py --batch-size 200 --limit 1000
+    python backfill_stripe_customers.py --dry-run
+"""
+
+import sys
+import os
+import argparse
+import time
+from concurrent.futures import ThreadPoolExecutor
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from database import shard_ids, shard_session
+from models import User
+from config.stripe_config import StripeConfig
+from services.stripe_service import stripe_service
+
+def pending_user_ids(shard_id: str, batch_size: int, after_id: int):
+    """Siguiente bloque de usuarios sin customer de un shard (paginación por id)"""
+    db = shard_session(shard_id)
+    try:
+        rows = db.query(User.id).filter(
+            User.stripe_customer_id.is_(None),
+            User.id > after_id
+        ).order_by(User.id).limit(batch_size).all()
+        return [user_id for (user_id,) in rows]
+    finally:
+        db.close()
+
+def main():
+    parser = argparse.ArgumentParser(description="Crear customers de Stripe para usuarios existentes")
+    parser.add_argument("--batch-size", type=int, default=100, help="Usuarios por bloque")
+    parser.add_argument("--limit", type=int, default=None, help="Máximo de usuarios a procesar")
+    parser.add_argument("--dry-run", action="store_true", help="Sólo contar usuarios pendientes")
+    args = parser.parse_args()
+
+    concurrency = StripeConfig.CUSTOMER_PRECREATE_CONCURRENCY
+    print(f"Concurrencia: {concurrency} (STRIPE_CUSTOMER_PRECREATE_CONCURRENCY)")
+    started = time.perf_counter()
+    processed = created = failed = 0
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        for shard_id in shard_ids():
+            last_id = 0
+            while args.limit is None or processed < args.limit:
+                batch_size = args.batch_size if args.limit is None else min(args.batch_size, args.limit - processed)
+                user_ids = pending_user_ids(shard_id, batch_size, last_id)
+                if not user_ids:
+                    break
+                last_id = user_ids[-1]
+                processed += len(user_ids)
+                if args.dry_run:
+                    continue
+
+                for customer_id in executor.map(stripe_service.precreate_customer, user_ids):
+                    if customer_id:
+                        created += 1
+                    else:
+                        failed += 1
+                print(f"  {processed} usuarios procesados ({processed / (time.perf_counter() - started):.1f}/s)")
+
+    if args.dry_run:
+        print(f"✓ {processed} usuarios sin customer de Stripe")
+        return
+
+    print(f"\n✓ Customers asignados: {created}")
+    if failed:
+        print(f"✗ Fallidos: {failed} (se reintentan en la siguiente corrida o en su primer checkout)")
+    print(f"Tiempo: {time.perf_counter() - started:.2f}s")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+"""
+Script para elegir el costo de bcrypt según el hardware donde corre la API
+
+Mide cuánto tarda un hash con cada costo y recomienda el mayor que cabe en el
+presupuesto de latencia (BCRYPT_TARGET_MS). El resultado se configura con la
+variable de entorno BCRYPT_ROUNDS; los hashes existentes se actualizan solos
+la próxima vez que cada usuario hace login.
+
+Uso:
+    python calibrate_bcrypt.py                  # Presupuesto de AuthConfig.BCRYPT_TARGET_MS
+    python calibrate_bcrypt.py --target-ms 150  # Otro presupuesto
+    python calibrate_bcrypt.py --samples 5      # Más mediciones por costo
+"""
+
+import sys
+import os
+import argparse
+import statistics
+import time
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from passlib.hash import bcrypt
+
+from config.auth_config import AuthConfig
+
+def measure(rounds: int, samples: int) -> float:
+    """Mediana en milisegundos de `samples` hashes con el costo dado"""
+    hasher = bcrypt.using(rounds=rounds)
+    timings = []
+    for _ in range(samples):
+        started = time.perf_counter()
+        hasher.hash("calibracion-de-bcrypt")
+        timings.append((time.perf_counter() - started) * 1000)
+    return statistics.median(timings)
+
+def main():
+    parser = argparse.ArgumentParser(description="Calibrar el costo de bcrypt para un presupuesto de latencia")
+    parser.add_argument("--target-ms", type=int, default=AuthConfig.BCRYPT_TARGET_MS,
+                        help="Tiempo máximo por hash en milisegundos")
+    parser.add_argument("--samples", type=int, default=3, help="Mediciones por costo")
+    parser.add_argument("--max-rounds", type=int, default=16, help="Costo máximo a probar")
+    args = parser.parse_args()
+
+    print(f"Presupuesto: {args.target_ms} ms por hash (actual: BCRYPT_ROUNDS={AuthConfig.BCRYPT_ROUNDS})\n")
+    chosen = None
+    for rounds in range(AuthConfig.BCRYPT_FLOOR_ROUNDS, args.max_rounds + 1):
+        elapsed_ms = measure(rounds, args.samples)
+        fits = elapsed_ms <= args.target_ms
+        print(f"  {'✓' if fits else '✗'} rounds={rounds:2d}  {elapsed_ms:8.1f} ms")
+        if not fits:
+            break
+        chosen = rounds
+        # Cada punto de costo duplica el tiempo: si el siguiente no cabe, no se mide
+        if elapsed_ms * 2 > args.target_ms:
+            break
+
+    if chosen is None:
+        chosen = AuthConfig.BCRYPT_FLOOR_ROUNDS
+        print(f"\n✗ Ni el costo mínimo ({chosen}) cabe en {args.target_ms} ms; se recomienda el mínimo de todos modos")
+    else:
+        print(f"\n✓ Costo recomendado para este host: {chosen}")
+
+    print(f"\nConfigurar en .env:\n    BCRYPT_ROUNDS={chosen}")
+    if chosen != AuthConfig.BCRYPT_ROUNDS:
+        print("Los hashes con otro costo se rehashean automáticamente en el siguiente login")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+"""
+Prueba de los índices de las consultas frecuentes (services/query_plan_service.py)
+
+Arma una base con el esquema migrado, le carga filas de prueba y corre EXPLAIN
+sobre cada consulta de HOT_QUERIES: falla si alguna recorre una tabla completa.
+Antes comprueba que el detector sí marca una consulta sin índice (para que la
+prueba no pase por un plan que nunca se reconoce como full scan).
+
+  - Por defecto usa una base SQLite temporal creada con create_all (los modelos
+    declaran los mismos índices que migrations/) y marcada con baseline
+  - Con --database-url usa esa base (ej: MySQL vacía de CI con el esquema base)
+    y le aplica migrations/ con migration_service.upgrade antes de revisar
+
+NUNCA apuntarlo a producción: inserta filas de prueba.
+
+Uso:
+    python check_query_plans.py
+    python check_query_plans.py --rows 5000
+    python check_query_plans.py --database-url mysql+pymysql://root@localhost/tudi_plans
+"""
+
+import sys
+import os
+import argparse
+import tempfile
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Revisar que las consultas frecuentes usen índices")
+    parser.add_argument("--rows", type=int, default=2000, help="Pagos de prueba a insertar")
+    parser.add_argument("--database-url", default=None,
+                        help="Base de pruebas migrable (por defecto un archivo SQLite temporal)")
+    return parser.parse_args()
+
+
+args = parse_args()
+# La configuración de la base se lee al importar database: fijarla antes
+scratch = os.path.join(tempfile.mkdtemp(prefix="tudi-plans-"), "plans.db")
+os.environ["DATABASE_SHARD_URLS"] = args.database_url or f"sqlite:///{scratch}"
+os.environ.pop("DATABASE_DIRECTORY_URL", None)
+
+from datetime import datetime, timedelta
+from sqlalchemy import insert, select
+from database import database_engines, shard_session
+from models import Base, Payment, User
+from services import migration_service, query_plan_service
+
+
+def prepare_schema(db):
+    """Esquema migrado: create_all + baseline en SQLite, migrations/ en la base indicada"""
+    if args.database_url is None:
+        Base.metadata.create_all(bind=db.get_bind())
+        migration_service.baseline(db)
+    else:
+        migration_service.upgrade(db)
+    pending = [row for row in migration_service.status(db) if row["state"] != "applied"]
+    if pending:
+        raise RuntimeError(f"Migraciones sin aplicar: {', '.join(row['version'] for row in pending)}")
+
+
+def seed(db, rows: int):
+    """Filas suficientes para que el optimizador prefiera los índices a la tabla completa"""
+    users = max(1, rows // 10)
+    now = datetime.utcnow()
+    db.execute(insert(User.__table__), [
+        {"name": "plan", "last_name": "check", "email": f"plan-{i}@example.com", "password": "x",
+         "reset_token": f"token-{i}"}
+        for i in range(users)
+    ])
+    user_ids = db.scalars(select(User.id)).all()
+    statuses = ["pending", "succeeded", "failed", "canceled"]
+    db.execute(insert(Payment.__table__), [
+        {"user_id": user_ids[i % len(user_ids)], "stripe_payment_intent_id": f"pi_plan_{i}",
+         "amount": 10, "currency": "usd", "status": statuses[i % len(statuses)],
+         "payment_method_types": "card", "created_at": now - timedelta(minutes=i)}
+        for i in range(rows)
+    ])
+    db.commit()
+
+
+def main():
+    failures = []
+    for shard_id in database_engines():
+        db = shard_session(shard_id)
+        try:
+            prepare_schema(db)
+            seed(db, args.rows)
+
+            # Control: una consulta por una columna sin índice debe marcarse como full scan
+            control = query_plan_service.explain_query(db, select(Payment.id).where(Payment.amount == 10))
+            if not control["full_scan"]:
+                failures.append(f"shard {shard_id}: el detector no marcó la consulta de control ({control['plan']})")
+
+            for name, result in query_plan_service.explain_hot_queries(db).items():
+                if result["full_scan"]:
+                    failures.append(f"shard {shard_id}: {name} recorre una tabla completa: {result['plan']}")
+                else:
+                    print(f"✓ {name}")
+        finally:
+            db.close()
+
+    for failure in failures:
+        print(f"✗ {failure}")
+    if not failures:
+        print("\n✓ Todas las consultas frecuentes usan índices")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
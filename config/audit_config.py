@@ -0,0 +1,19 @@
+import os
+from dotenv import load_dotenv
+
+load_dotenv()
+
+class AuditConfig:
+    """Configuración del registro de auditoría de pagos (services/audit_service.py)"""
+    ENABLED = os.getenv("AUDIT_ENABLED", "true").lower() == "true"
+
+    # Los eventos se juntan en memoria y se insertan en lote al llegar a BATCH_SIZE
+    # o cada FLUSH_INTERVAL_SECONDS, lo que pase primero
+    BATCH_SIZE = int(os.getenv("AUDIT_BATCH_SIZE", "500"))
+    FLUSH_INTERVAL_SECONDS = float(os.getenv("AUDIT_FLUSH_INTERVAL_SECONDS", "2"))
+
+    # Si la base de datos no responde, los eventos se guardan en archivos NDJSON
+    # (uno por proceso: <dir>/audit_spool.<pid>.ndjson) y se vuelven a insertar en
+    # el siguiente flush exitoso. Los de procesos que murieron los adopta otro worker
+    SPOOL_DIR = os.getenv("AUDIT_SPOOL_DIR", "audit_spool")
+    ORPHAN_SPOOL_SECONDS = int(os.getenv("AUDIT_ORPHAN_SPOOL_SECONDS", "300"))
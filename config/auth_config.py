@@ -0,0 +1,23 @@
+import os
+from dotenv import load_dotenv
+
+load_dotenv()
+
+class AuthConfig:
+    """Configuración del hash de contraseñas y del acceso de administración"""
+    # Costo de bcrypt (2^rounds iteraciones); calibrar en el host con calibrate_bcrypt.py
+    BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+
+    # Rango aceptado: los hashes fuera de él se rehashean con BCRYPT_ROUNDS al hacer login.
+    # Por defecto sólo se acepta exactamente BCRYPT_ROUNDS
+    BCRYPT_MIN_ROUNDS = int(os.getenv("BCRYPT_MIN_ROUNDS", str(BCRYPT_ROUNDS)))
+    BCRYPT_MAX_ROUNDS = int(os.getenv("BCRYPT_MAX_ROUNDS", str(BCRYPT_ROUNDS)))
+
+    # Presupuesto de latencia por hash que usa calibrate_bcrypt.py (milisegundos)
+    BCRYPT_TARGET_MS = int(os.getenv("BCRYPT_TARGET_MS", "250"))
+    # Nunca recomendar menos de este costo aunque el host sea lento
+    BCRYPT_FLOOR_ROUNDS = int(os.getenv("BCRYPT_FLOOR_ROUNDS", "10"))
+
+    # Token de los endpoints de administración (header X-Admin-Token); vacío = deshabilitados
+    ADMIN_API_TOKEN = os.getenv("ADMIN_API_TOKEN", "")
+    ADMIN_TOKEN_HEADER = os.getenv("ADMIN_TOKEN_HEADER", "X-Admin-Token")
@@ -0,0 +1,30 @@
+import os
+from dotenv import load_dotenv
+
+load_dotenv()
+
+class CacheConfig:
+    """Configuración del cache compartido"""
+    ENABLED = os.getenv("CACHE_ENABLED", "true").lower() == "true"
+
+    # Si se configura, el cache se comparte entre workers (ej: redis://localhost:6379/0)
+    REDIS_URL = os.getenv("CACHE_REDIS_URL") or os.getenv("REDIS_URL")
+    KEY_PREFIX = os.getenv("CACHE_KEY_PREFIX", "tudi")
+    INVALIDATION_CHANNEL = os.getenv("CACHE_INVALIDATION_CHANNEL", "tudi:cache:invalidate")
+
+    # Cache local (LRU + TTL) de cada worker
+    LOCAL_MAX_ENTRIES = int(os.getenv("CACHE_LOCAL_MAX_ENTRIES", "10000"))
+    # Con Redis, la copia local vive poco para acotar lo viejo si se pierde una invalidación
+    LOCAL_TTL_SECONDS = int(os.getenv("CACHE_LOCAL_TTL_SECONDS", "10"))
+
+    # TTLs por tipo de dato (segundos)
+    USER_TTL_SECONDS = int(os.getenv("CACHE_USER_TTL_SECONDS", "300"))
+    PRODUCT_TTL_SECONDS = int(os.getenv("CACHE_PRODUCT_TTL_SECONDS", "600"))
+    CUSTOMER_TTL_SECONDS = int(os.getenv("CACHE_CUSTOMER_TTL_SECONDS", "3600"))
+    ENTITLEMENT_TTL_SECONDS = int(os.getenv("CACHE_ENTITLEMENT_TTL_SECONDS", "60"))
+
+    # Índice de productos en memoria (services/product_catalog.py): recarga completa periódica.
+    # Con Redis los cambios llegan por el bus y la recarga sólo cubre invalidaciones perdidas;
+    # sin Redis es la única forma en que los demás workers ven un cambio de precio
+    PRODUCT_INDEX_REFRESH_SECONDS = int(os.getenv("PRODUCT_INDEX_REFRESH_SECONDS", "300"))
+    PRODUCT_INDEX_LOCAL_REFRESH_SECONDS = int(os.getenv("PRODUCT_INDEX_LOCAL_REFRESH_SECONDS", "5"))
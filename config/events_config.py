@@ -0,0 +1,19 @@
+import os
+from dotenv import load_dotenv
+
+load_dotenv()
+
+class EventsConfig:
+    """Configuración del stream de eventos de pagos (SSE)"""
+    # Si se configura, los eventos se reparten entre workers (ej: redis://localhost:6379/0)
+    REDIS_URL = os.getenv("EVENTS_REDIS_URL") or os.getenv("REDIS_URL")
+    CHANNEL = os.getenv("EVENTS_CHANNEL", "tudi:payments:events")
+
+    # Eventos pendientes por conexión; si el cliente no los lee se descartan los más viejos
+    QUEUE_SIZE = int(os.getenv("EVENTS_QUEUE_SIZE", "32"))
+    # Comentario periódico para que proxies y balanceadores no cierren la conexión inactiva
+    HEARTBEAT_SECONDS = int(os.getenv("EVENTS_HEARTBEAT_SECONDS", "20"))
+    # Pestañas abiertas por usuario en un mismo worker
+    MAX_SUBSCRIPTIONS_PER_USER = int(os.getenv("EVENTS_MAX_SUBSCRIPTIONS_PER_USER", "5"))
+    # Reintento sugerido al navegador si se corta la conexión (milisegundos)
+    CLIENT_RETRY_MS = int(os.getenv("EVENTS_CLIENT_RETRY_MS", "5000"))
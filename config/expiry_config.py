@@ -0,0 +1,34 @@
+import os
+from dotenv import load_dotenv
+
+load_dotenv()
+
+def _hours(name: str, default: str) -> float:
+    return float(os.getenv(name, default))
+
+class ExpiryConfig:
+    """Configuración del vencimiento de pagos sin pagar (services/expiry_service.py)"""
+    ENABLED = os.getenv("PAYMENT_EXPIRY_ENABLED", "true").lower() == "true"
+    INTERVAL_SECONDS = float(os.getenv("PAYMENT_EXPIRY_INTERVAL_SECONDS", "60"))
+    BATCH_SIZE = int(os.getenv("PAYMENT_EXPIRY_BATCH_SIZE", "100"))
+
+    # Cancelar el Payment Intent en Stripe antes de marcarlo expired (así ya no se
+    # puede pagar); si es false sólo se cambia el status local
+    CANCEL_IN_STRIPE = os.getenv("PAYMENT_EXPIRY_CANCEL_IN_STRIPE", "true").lower() == "true"
+    CONCURRENCY = int(os.getenv("PAYMENT_EXPIRY_CONCURRENCY", "2"))  # <= STRIPE_BULKHEAD_PAYMENT_INTENT_CANCEL
+    RATE_PER_SECOND = float(os.getenv("PAYMENT_EXPIRY_RATE_PER_SECOND", "5"))
+
+    # Un OXXO pagado antes de vencer se confirma hasta el siguiente día hábil:
+    # se espera este margen después del expires_at de Stripe
+    OXXO_GRACE_HOURS = _hours("PAYMENT_EXPIRY_OXXO_GRACE_HOURS", "48")
+    # Vida de un pago pendiente por método (0 = no vence). Para OXXO sólo se usa
+    # si Stripe no regresó expires_at (por defecto el voucher dura 3 días)
+    TTL_HOURS = {
+        "oxxo": _hours("PAYMENT_EXPIRY_OXXO_TTL_HOURS", "72"),
+        "customer_balance": _hours("PAYMENT_EXPIRY_TRANSFER_TTL_HOURS", "168"),
+        "bank_transfer": _hours("PAYMENT_EXPIRY_TRANSFER_TTL_HOURS", "168"),
+        "card": _hours("PAYMENT_EXPIRY_CARD_TTL_HOURS", "24"),
+    }
+
+    # Un intent que Stripe reporta en "processing" se vuelve a revisar después de esto
+    RECHECK_MINUTES = float(os.getenv("PAYMENT_EXPIRY_RECHECK_MINUTES", "30"))
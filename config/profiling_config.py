@@ -0,0 +1,22 @@
+import os
+from dotenv import load_dotenv
+
+load_dotenv()
+
+class ProfilingConfig:
+    """Configuración del profiler por petición (utils/profiling.py)"""
+    ENABLED = os.getenv("PROFILING_ENABLED", "false").lower() == "true"
+
+    # Las peticiones con este header y token se perfilan (vacío = sólo por toggle de admin)
+    HEADER = os.getenv("PROFILING_HEADER", "X-Profile-Token")
+    TOKEN = os.getenv("PROFILING_TOKEN", "")
+
+    # Intervalo entre muestras de stack (milisegundos)
+    SAMPLE_INTERVAL_MS = float(os.getenv("PROFILING_SAMPLE_INTERVAL_MS", "5"))
+
+    # Límites para poder dejarlo activo con tráfico real
+    MAX_PROFILES_PER_MINUTE = int(os.getenv("PROFILING_MAX_PER_MINUTE", "10"))
+    MAX_CONCURRENT = int(os.getenv("PROFILING_MAX_CONCURRENT", "2"))
+
+    # Un archivo .folded por ruta (formato de flamegraph.pl / speedscope)
+    OUTPUT_DIR = os.getenv("PROFILING_OUTPUT_DIR", "profiles")
@@ -0,0 +1,33 @@
+import os
+from dotenv import load_dotenv
+
+load_dotenv()
+
+def _rule(name: str, default: str):
+    """Leer una regla "limite/segundos" (ej: "5/60" = 5 peticiones por minuto)"""
+    limit, window = os.getenv(name, default).split("/")
+    return int(limit), int(window)
+
+class RateLimitConfig:
+    """Configuración del rate limiting de los endpoints de autenticación"""
+    ENABLED = os.getenv("RATE_LIMIT_ENABLED", "true").lower() == "true"
+
+    # Si se configura, el estado se comparte entre workers (ej: redis://localhost:6379/0)
+    REDIS_URL = os.getenv("RATE_LIMIT_REDIS_URL") or os.getenv("REDIS_URL")
+
+    # Sólo confiar en X-Forwarded-For si la API está detrás de un proxy propio
+    TRUST_FORWARDED_FOR = os.getenv("RATE_LIMIT_TRUST_FORWARDED_FOR", "false").lower() == "true"
+
+    # Memoria acotada del backend en proceso
+    MEMORY_SHARDS = int(os.getenv("RATE_LIMIT_MEMORY_SHARDS", "64"))
+    MEMORY_MAX_KEYS_PER_SHARD = int(os.getenv("RATE_LIMIT_MEMORY_MAX_KEYS_PER_SHARD", "4096"))
+
+    # Reglas por endpoint: (limite, ventana en segundos)
+    RULES = {
+        "login:ip": _rule("RATE_LIMIT_LOGIN_IP", "20/60"),
+        "login:email": _rule("RATE_LIMIT_LOGIN_EMAIL", "5/60"),
+        "register:ip": _rule("RATE_LIMIT_REGISTER_IP", "10/60"),
+        "register:email": _rule("RATE_LIMIT_REGISTER_EMAIL", "3/60"),
+        "password_reset:ip": _rule("RATE_LIMIT_PASSWORD_RESET_IP", "5/60"),
+        "password_reset:email": _rule("RATE_LIMIT_PASSWORD_RESET_EMAIL", "3/900"),
+    }
@@ -0,0 +1,18 @@
+import os
+from dotenv import load_dotenv
+
+load_dotenv()
+
+class RefundConfig:
+    """Configuración de los reembolsos masivos (services/refund_service.py)"""
+    # Reembolsos en paralelo; debe quedar en o debajo de STRIPE_BULKHEAD_REFUND_CREATE
+    CONCURRENCY = int(os.getenv("REFUND_CONCURRENCY", "4"))
+    # Tope de llamadas a Stripe por segundo del job (el límite de la cuenta se
+    # comparte con los checkouts: dejar margen)
+    RATE_PER_SECOND = float(os.getenv("REFUND_RATE_PER_SECOND", "10"))
+
+    # Pagos por bloque: cada bloque se guarda (items + status de los pagos) en una transacción
+    PAGE_SIZE = int(os.getenv("REFUND_PAGE_SIZE", "100"))
+
+    # Un job "running" sin latido en este tiempo se considera huérfano y se puede reanudar
+    STALE_SECONDS = int(os.getenv("REFUND_STALE_SECONDS", "300"))
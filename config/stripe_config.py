@@ -14,6 +14,52 @@ class StripeConfig:
     # URLs del frontend (ajusta según tu aplicación)
     SUCCESS_URL = os.getenv("STRIPE_SUCCESS_URL", "http://localhost:3000/success")
     CANCEL_URL = os.getenv("STRIPE_CANCEL_URL", "http://localhost:3000/cancel")
+
+    # Cliente HTTP compartido (conexiones reutilizadas con keep-alive)
+    HTTP_POOL_SIZE = int(os.getenv("STRIPE_HTTP_POOL_SIZE", "40"))  # >= hilos del threadpool
+    HTTP_TIMEOUT_SECONDS = float(os.getenv("STRIPE_HTTP_TIMEOUT_SECONDS", "30"))
+    # Timeouts por operación (las del checkout deben fallar rápido)
+    OPERATION_TIMEOUTS = {
+        "customer.create": float(os.getenv("STRIPE_TIMEOUT_CUSTOMER_CREATE", "10")),
+        "payment_intent.create": float(os.getenv("STRIPE_TIMEOUT_PAYMENT_INTENT_CREATE", "15")),
+        "payment_intent.retrieve": float(os.getenv("STRIPE_TIMEOUT_PAYMENT_INTENT_RETRIEVE", "8")),
+        "product.create": float(os.getenv("STRIPE_TIMEOUT_PRODUCT_CREATE", "20")),
+        "price.create": float(os.getenv("STRIPE_TIMEOUT_PRICE_CREATE", "20")),
+        "refund.create": float(os.getenv("STRIPE_TIMEOUT_REFUND_CREATE", "20")),
+        "payment_intent.cancel": float(os.getenv("STRIPE_TIMEOUT_PAYMENT_INTENT_CANCEL", "15")),
+    }
+
+    # Reintentos de la librería de Stripe: todos los POST llevan Idempotency-Key,
+    # así que reintentar es seguro. Backoff exponencial con jitter.
+    MAX_NETWORK_RETRIES = int(os.getenv("STRIPE_MAX_NETWORK_RETRIES", "2"))
+    RETRY_INITIAL_DELAY_SECONDS = float(os.getenv("STRIPE_RETRY_INITIAL_DELAY_SECONDS", "0.25"))
+    RETRY_MAX_DELAY_SECONDS = float(os.getenv("STRIPE_RETRY_MAX_DELAY_SECONDS", "2"))
+
+    # Circuit breaker: tras N fallas seguidas de red/5xx se falla rápido con 503
+    BREAKER_FAILURE_THRESHOLD = int(os.getenv("STRIPE_BREAKER_FAILURE_THRESHOLD", "5"))
+    BREAKER_RECOVERY_SECONDS = float(os.getenv("STRIPE_BREAKER_RECOVERY_SECONDS", "30"))
+
+    # Bulkheads: llamadas concurrentes por operación (la suma debe quedar debajo
+    # de los hilos del threadpool para que las rutas sin Stripe sigan respondiendo)
+    BULKHEAD_LIMITS = {
+        "customer.create": int(os.getenv("STRIPE_BULKHEAD_CUSTOMER_CREATE", "5")),
+        "payment_intent.create": int(os.getenv("STRIPE_BULKHEAD_PAYMENT_INTENT_CREATE", "10")),
+        "payment_intent.retrieve": int(os.getenv("STRIPE_BULKHEAD_PAYMENT_INTENT_RETRIEVE", "5")),
+        "product.create": int(os.getenv("STRIPE_BULKHEAD_PRODUCT_CREATE", "2")),
+        "price.create": int(os.getenv("STRIPE_BULKHEAD_PRICE_CREATE", "2")),
+        "refund.create": int(os.getenv("STRIPE_BULKHEAD_REFUND_CREATE", "4")),
+        "payment_intent.cancel": int(os.getenv("STRIPE_BULKHEAD_PAYMENT_INTENT_CANCEL", "2")),
+    }
+    BULKHEAD_DEFAULT_LIMIT = int(os.getenv("STRIPE_BULKHEAD_DEFAULT_LIMIT", "5"))
+    BULKHEAD_MAX_WAIT_SECONDS = float(os.getenv("STRIPE_BULKHEAD_MAX_WAIT_SECONDS", "0.5"))
+
+    # Checkout por lotes
+    BATCH_MAX_ITEMS = int(os.getenv("STRIPE_BATCH_MAX_ITEMS", "20"))
+    BATCH_PARALLELISM = int(os.getenv("STRIPE_BATCH_PARALLELISM", "5"))  # <= bulkhead de payment_intent.create
+
+    # Creación anticipada de customers (registro y backfill); menor que el bulkhead de
+    # customer.create para dejar cupo a los checkouts
+    CUSTOMER_PRECREATE_CONCURRENCY = int(os.getenv("STRIPE_CUSTOMER_PRECREATE_CONCURRENCY", "2"))
     
     @classmethod
     def validate_config(cls):
@@ -0,0 +1,26 @@
+import os
+from dotenv import load_dotenv
+
+load_dotenv()
+
+class TracingConfig:
+    """Configuración del tracing distribuido (utils/tracing.py)"""
+    ENABLED = os.getenv("TRACING_ENABLED", "false").lower() == "true"
+    SERVICE_NAME = os.getenv("TRACING_SERVICE_NAME", "tudi-backend")
+
+    # Fracción de trazas nuevas que se guardan (0.0 - 1.0). Si la petición trae un
+    # traceparent se respeta la decisión del llamador
+    SAMPLE_RATE = float(os.getenv("TRACING_SAMPLE_RATE", "0.1"))
+
+    # Destino de los spans: "file" (NDJSON local), "otlp" (OTLP/HTTP JSON) o "none"
+    EXPORTER = os.getenv("TRACING_EXPORTER", "file")
+    FILE_PATH = os.getenv("TRACING_FILE_PATH", "traces.ndjson")
+    OTLP_ENDPOINT = os.getenv("TRACING_OTLP_ENDPOINT", "http://localhost:4318/v1/traces")
+
+    # Los spans se exportan en lotes desde un hilo aparte
+    EXPORT_BATCH_SIZE = int(os.getenv("TRACING_EXPORT_BATCH_SIZE", "256"))
+    EXPORT_INTERVAL_SECONDS = float(os.getenv("TRACING_EXPORT_INTERVAL_SECONDS", "2"))
+    MAX_QUEUE_SIZE = int(os.getenv("TRACING_MAX_QUEUE_SIZE", "4096"))
+
+    # Longitud máxima del SQL que se guarda en los spans de base de datos
+    MAX_STATEMENT_LENGTH = int(os.getenv("TRACING_MAX_STATEMENT_LENGTH", "500"))
@@ -0,0 +1,21 @@
+import os
+from dotenv import load_dotenv
+
+load_dotenv()
+
+class WarmupConfig:
+    """Configuración del calentamiento de cada worker al arrancar (ver /health/ready)"""
+    ENABLED = os.getenv("WARMUP_ENABLED", "true").lower() == "true"
+
+    # Conexiones a abrir por base de datos; 0 = el pool_size del engine
+    DB_CONNECTIONS = int(os.getenv("WARMUP_DB_CONNECTIONS", "0"))
+    # Petición autenticada y barata a Stripe para abrir la conexión TLS del pool
+    STRIPE = os.getenv("WARMUP_STRIPE", "true").lower() == "true"
+    # Si es false, una falla de Stripe sólo se registra (el worker queda listo igual)
+    REQUIRE_STRIPE = os.getenv("WARMUP_REQUIRE_STRIPE", "false").lower() == "true"
+
+    # Reintentos de los pasos obligatorios (ej: la base de datos todavía no acepta conexiones)
+    MAX_ATTEMPTS = int(os.getenv("WARMUP_MAX_ATTEMPTS", "5"))
+    RETRY_SECONDS = float(os.getenv("WARMUP_RETRY_SECONDS", "2"))
+    # Después de agotar MAX_ATTEMPTS el paso queda "failed" y se reintenta con este intervalo
+    RECOVERY_RETRY_SECONDS = float(os.getenv("WARMUP_RECOVERY_RETRY_SECONDS", "30"))
@@ -1,6 +1,5 @@
 Create database Tudi;
 
-//agregar columna payment_method_types a la tabla payments
-ALTER TABLE payments ADD COLUMN payment_method_types VARCHAR(50);
-
-
+//Los cambios de esquema e índices están versionados en migrations/
+//  python migrate.py status     # ver qué falta aplicar
+//  python migrate.py upgrade    # aplicar las migraciones pendientes
@@ -0,0 +1,162 @@
+"""
+Script para importar usuarios en bloque (ej: desde la plataforma anterior)
+
+Lee un CSV (con encabezados) o NDJSON con los campos:
+    name, last_name, email y password (texto plano) o password_hash (bcrypt)
+
+- Las contraseñas en texto plano se hashean en un pool de procesos
+- Los hashes bcrypt existentes ($2a$/$2b$/$2y$) se guardan tal cual
+- Los emails que ya existen (en la base de datos o repetidos en el archivo) se omiten
+- Los ids se reservan en el directorio global y cada bloque se inserta con un
+  INSERT de varias filas por shard
+
+Uso:
+    python import_users.py usuarios.csv
+    python import_users.py usuarios.ndjson --batch-size 5000 --workers 8
+    python import_users.py usuarios.csv --dry-run
+"""
+
+import sys
+import os
+import argparse
+import csv
+import json
+import re
+import time
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from sqlalchemy import insert, select
+
+from database import SessionLocal, shard_for_user
+from models import User, UserDirectory
+from services import user_directory
+from services.auth_service import hash_password
+
+BCRYPT_HASH = re.compile(r"^\$2[aby]\$\d{2}\$[./A-Za-z0-9]{53}$")
+
+def read_rows(path: str, file_format: str):
+    """Generador de dicts desde CSV o NDJSON"""
+    with open(path, encoding="utf-8-sig", newline="") as f:
+        if file_format == "csv":
+            yield from csv.DictReader(f)
+        else:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+
+def load_existing_emails(db) -> set:
+    """Emails ya registrados (en minúsculas) para detectar duplicados sin una consulta por fila"""
+    emails = set()
+    # El directorio global y los usuarios de todos los shards (por si falta alguno en el directorio)
+    for model in (UserDirectory, User):
+        result = db.execute(select(model.email).execution_options(yield_per=10000))
+        emails.update(email.lower() for (email,) in result if email)
+    return emails
+
+def prepare_batch(rows, seen_emails: set, pool, workers: int, stats: dict):
+    """Validar, descartar duplicados y hashear contraseñas de un bloque"""
+    users = []
+    to_hash = []
+    for row in rows:
+        email = (row.get("email") or "").strip().lower()
+        password_hash = (row.get("password_hash") or "").strip()
+        password = row.get("password") or ""
+        if not email or not (password_hash or password):
+            stats["invalid"] += 1
+            continue
+        if email in seen_emails:
+            stats["duplicates"] += 1
+            continue
+        if password_hash and not BCRYPT_HASH.match(password_hash):
+            stats["invalid"] += 1
+            continue
+        seen_emails.add(email)
+        user = {
+            "name": (row.get("name") or "").strip(),
+            "last_name": (row.get("last_name") or "").strip(),
+            "email": email,
+            "password": password_hash or None,
+        }
+        if not password_hash:
+            to_hash.append((user, password))
+        users.append(user)
+
+    if to_hash:
+        chunksize = max(1, len(to_hash) // (workers * 4))
+        hashes = pool.map(hash_password, [password for _, password in to_hash], chunksize=chunksize)
+        for (user, _), hashed in zip(to_hash, hashes):
+            user["password"] = hashed
+        stats["hashed"] += len(to_hash)
+    return users
+
+def insert_batch(db, users: list) -> int:
+    """
+    Reservar los emails en el directorio (asigna los ids) y hacer un INSERT de varias filas por shard
+    Los emails que otro proceso registró mientras tanto se omiten
+    """
+    if not users:
+        return 0
+    allocated = user_directory.allocate_user_ids(db, [user["email"] for user in users])
+    by_shard = defaultdict(list)
+    for user in users:
+        if user["email"] in allocated:
+            user_id = allocated[user["email"]]
+            by_shard[shard_for_user(user_id)].append(dict(user, id=user_id))
+    try:
+        for shard_id, rows in by_shard.items():
+            db.execute(insert(User.__table__), rows, bind_arguments={"shard_id": shard_id})
+        db.commit()
+    except Exception:
+        db.rollback()
+        user_directory.release(db, *allocated)
+        raise
+    return len(allocated)
+
+def main():
+    parser = argparse.ArgumentParser(description="Importar usuarios desde CSV o NDJSON")
+    parser.add_argument("path", help="Archivo .csv o .ndjson")
+    parser.add_argument("--format", choices=["csv", "ndjson"], help="Por defecto se deduce de la extensión")
+    parser.add_argument("--batch-size", type=int, default=2000, help="Usuarios por INSERT")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 2, help="Procesos para hashear")
+    parser.add_argument("--dry-run", action="store_true", help="Validar y hashear sin insertar")
+    args = parser.parse_args()
+
+    file_format = args.format or ("csv" if args.path.lower().endswith(".csv") else "ndjson")
+    stats = {"read": 0, "inserted": 0, "hashed": 0, "duplicates": 0, "invalid": 0}
+    db = SessionLocal()
+    started = time.perf_counter()
+
+    try:
+        seen_emails = load_existing_emails(db)
+        print(f"✓ {len(seen_emails)} emails existentes cargados ({time.perf_counter() - started:.2f}s)")
+
+        rows = read_rows(args.path, file_format)
+        with ProcessPoolExecutor(max_workers=args.workers) as pool:
+            while True:
+                batch = list(islice(rows, args.batch_size))
+                if not batch:
+                    break
+                stats["read"] += len(batch)
+                users = prepare_batch(batch, seen_emails, pool, args.workers, stats)
+                if not args.dry_run:
+                    stats["inserted"] += insert_batch(db, users)
+                elapsed = time.perf_counter() - started
+                print(f"  {stats['read']} leídos, {stats['inserted']} insertados "
+                      f"({stats['read'] / elapsed:.0f} filas/s)")
+    except Exception as e:
+        db.rollback()
+        print(f"✗ Error importando usuarios: {e}")
+        sys.exit(1)
+    finally:
+        db.close()
+
+    elapsed = time.perf_counter() - started
+    print(f"\n✓ Importación terminada en {elapsed:.2f}s ({stats['read'] / elapsed if elapsed else 0:.0f} filas/s)")
+    print(f"  Insertados: {stats['inserted']}  Hasheados: {stats['hashed']}  "
+          f"Duplicados: {stats['duplicates']}  Inválidos: {stats['invalid']}")
+
+if __name__ == "__main__":
+    main()
@@ -1,11 +1,42 @@
 
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 import models
-from database import engine
-from routers import auth, payments
+from database import database_engines
+from routers import auth, payments, metrics, profiling, health
+from services.warmup_service import warmup
+from services.audit_service import audit_writer
+from services.refund_service import refund_runner
+from services.expiry_service import expiry_sweeper
+from services.stripe_service import stripe_service
+from config.expiry_config import ExpiryConfig
+from config.warmup_config import WarmupConfig
+from utils.tracing import tracer, TracingMiddleware, instrument_engine
+from utils.profiling import profiler, ProfilingMiddleware
+from config.profiling_config import ProfilingConfig
 
-app = FastAPI(title="Tudi Backend API", version="1.0.0")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Warm-up en segundo plano: /health/ready responde 503 hasta que termina
+    if WarmupConfig.ENABLED:
+        warmup.start()
+    else:
+        warmup.skip()
+    # Barrido de pagos OXXO / transferencias vencidos (no depende de los webhooks)
+    if ExpiryConfig.ENABLED:
+        expiry_sweeper.start()
+    yield
+    warmup.stop()
+    expiry_sweeper.stop()
+    # Los reembolsos masivos terminan su bloque en curso y quedan en pausa
+    refund_runner.stop()
+    # Terminar de crear los customers de Stripe encolados por el registro
+    stripe_service.shutdown()
+    # Escribir los eventos de auditoría que quedan en memoria antes de salir
+    audit_writer.shutdown()
+
+app = FastAPI(title="Tudi Backend API", version="1.0.0", lifespan=lifespan)
 
 # Configuración de CORS simplificada
 app.add_middleware(
@@ -16,11 +47,26 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-models.Base.metadata.create_all(bind=engine)
+# Tracing: un span por petición (con traceparent W3C) y uno por sentencia SQL
+app.add_middleware(TracingMiddleware, tracer=tracer)
+if tracer.enabled:
+    for shard_engine in database_engines().values():
+        instrument_engine(shard_engine, tracer)
+
+# Profiling bajo demanda (header con token o toggle de admin en /api/admin/profiling)
+app.add_middleware(ProfilingMiddleware, profiler=profiler, header=ProfilingConfig.HEADER)
+
+# Mismo esquema en cada shard y en la base global (ver migrate.py para cambios)
+for shard_engine in database_engines().values():
+    models.Base.metadata.create_all(bind=shard_engine)
 
 # Incluir routers
 app.include_router(auth.router, prefix="/api")
 app.include_router(payments.router, prefix="/api")
+app.include_router(metrics.router, prefix="/api")
+app.include_router(profiling.router, prefix="/api")
+# Sondas del orquestador / balanceador (sin prefijo /api)
+app.include_router(health.router)
 
 
 
@@ -0,0 +1,105 @@
+"""
+Script para aplicar las migraciones de migrations/ y revisar los planes de las consultas frecuentes
+
+Uso:
+    python migrate.py status              # Migraciones aplicadas / pendientes
+    python migrate.py upgrade             # Aplicar las pendientes
+    python migrate.py upgrade --to 0003   # Aplicar hasta una versión
+    python migrate.py baseline            # Marcar todas como aplicadas sin ejecutarlas
+    python migrate.py baseline --to 0003  # (bases creadas con create_all o con los ALTER ya corridos)
+    python migrate.py explain             # EXPLAIN de las consultas frecuentes; sale con 1 si
+                                          # alguna recorre una tabla completa (usar en CI / deploy)
+    python migrate.py upgrade --shard 1   # Sólo una base de datos (por defecto todas: cada
+                                          # shard y la base global si está aparte)
+"""
+
+import sys
+import os
+import argparse
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from database import database_engines, shard_session
+from services import migration_service, query_plan_service
+
+STATE_ICONS = {"applied": "✓", "pending": "·", "modified": "✗"}
+
+def cmd_status(db, args):
+    rows = migration_service.status(db)
+    for row in rows:
+        print(f"{STATE_ICONS[row['state']]} {row['version']}_{row['name']}  ({row['state']})")
+    if any(row["state"] == "modified" for row in rows):
+        print("\n✗ Hay migraciones modificadas después de aplicarse")
+        sys.exit(1)
+
+def cmd_upgrade(db, args):
+    try:
+        done = migration_service.upgrade(db, args.to)
+    except RuntimeError as e:
+        print(f"✗ {e}")
+        sys.exit(1)
+    for migration in done:
+        print(f"✓ {migration.version}_{migration.name}")
+    print(f"\n{len(done)} migraciones aplicadas" if done else "✓ La base de datos está al día")
+
+def cmd_baseline(db, args):
+    marked = migration_service.baseline(db, args.to)
+    for migration in marked:
+        print(f"✓ {migration.version}_{migration.name} marcada como aplicada")
+    if not marked:
+        print("✓ No hay migraciones pendientes")
+
+def cmd_explain(db, args):
+    results = query_plan_service.explain_hot_queries(db)
+    failures = 0
+    for name, result in results.items():
+        icon = "✗" if result["full_scan"] else "✓"
+        print(f"{icon} {name}")
+        for step in result["plan"]:
+            details = f"access={step['access']}"
+            if step["index"] is not None or step["table"] is not None:
+                details = f"table={step['table']} {details} index={step['index']} rows={step['rows']}"
+            print(f"    {details}")
+        if result["full_scan"]:
+            failures += 1
+            print(f"    SQL: {result['sql']}")
+    if failures:
+        print(f"\n✗ {failures} consultas recorren una tabla completa")
+        sys.exit(1)
+    print("\n✓ Todas las consultas frecuentes usan índices")
+
+def main():
+    parser = argparse.ArgumentParser(description="Migraciones de esquema y revisión de índices")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    shard_parser = argparse.ArgumentParser(add_help=False)
+    shard_parser.add_argument("--shard", help="Sólo esta base de datos (0, 1, ... o global)")
+
+    subparsers.add_parser("status", parents=[shard_parser], help="Ver el estado de las migraciones")
+    upgrade_parser = subparsers.add_parser("upgrade", parents=[shard_parser], help="Aplicar migraciones pendientes")
+    upgrade_parser.add_argument("--to", help="Versión máxima a aplicar (ej: 0003)")
+    baseline_parser = subparsers.add_parser("baseline", parents=[shard_parser],
+                                            help="Marcar migraciones como aplicadas sin ejecutarlas")
+    baseline_parser.add_argument("--to", help="Versión máxima a marcar (ej: 0003)")
+    subparsers.add_parser("explain", parents=[shard_parser], help="Revisar con EXPLAIN las consultas frecuentes")
+
+    args = parser.parse_args()
+    commands = {"status": cmd_status, "upgrade": cmd_upgrade, "baseline": cmd_baseline, "explain": cmd_explain}
+
+    shards = list(database_engines())
+    if args.shard is not None:
+        if args.shard not in shards:
+            print(f"✗ Shard desconocido: {args.shard} (disponibles: {', '.join(shards)})")
+            sys.exit(1)
+        shards = [args.shard]
+
+    for shard_id in shards:
+        if len(shards) > 1:
+            print(f"\n== Shard {shard_id} ==")
+        db = shard_session(shard_id)
+        try:
+            commands[args.command](db, args)
+        finally:
+            db.close()
+
+if __name__ == "__main__":
+    main()
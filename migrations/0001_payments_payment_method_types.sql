@@ -0,0 +1,2 @@
+-- Método de pago de cada pago (oxxo, customer_balance, card, ...)
+ALTER TABLE payments ADD COLUMN payment_method_types VARCHAR(50) NULL;
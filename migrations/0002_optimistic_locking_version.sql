@@ -0,0 +1,3 @@
+-- Control de concurrencia optimista (ver services/concurrency.py)
+ALTER TABLE payments ADD COLUMN version INT NOT NULL DEFAULT 1;
+ALTER TABLE products ADD COLUMN version INT NOT NULL DEFAULT 1;
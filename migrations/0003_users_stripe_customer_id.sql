@@ -0,0 +1,3 @@
+-- Customer de Stripe creado al registrarse; después correr backfill_stripe_customers.py
+ALTER TABLE users ADD COLUMN stripe_customer_id VARCHAR(255) NULL;
+CREATE UNIQUE INDEX ix_users_stripe_customer_id ON users (stripe_customer_id);
@@ -0,0 +1,10 @@
+-- Índices de las consultas frecuentes (verificar con: python migrate.py explain)
+
+-- has-paid: WHERE user_id = ? AND status = 'succeeded'
+CREATE INDEX ix_payments_user_status ON payments (user_id, status);
+
+-- payment-history y create_or_get_customer: WHERE user_id = ? ORDER BY created_at
+CREATE INDEX ix_payments_user_created ON payments (user_id, created_at);
+
+-- reset-password: WHERE reset_token = ?
+CREATE INDEX ix_users_reset_token ON users (reset_token);
@@ -0,0 +1,14 @@
+-- Directorio global email -> usuario/shard (ver database.py y services/user_directory.py)
+-- Sólo se usa en la base global (DATABASE_DIRECTORY_URL, por defecto el shard 0)
+CREATE TABLE IF NOT EXISTS user_directory (
+    id INT NOT NULL AUTO_INCREMENT PRIMARY KEY,
+    email VARCHAR(100) NOT NULL,
+    shard VARCHAR(20) NULL,
+    created_at DATETIME NULL,
+    UNIQUE KEY ix_user_directory_email (email)
+);
+-- Usuarios existentes: hasta ahora todos viven en el shard 0. El AUTO_INCREMENT
+-- queda después del id más alto, así los ids nuevos no chocan con los existentes.
+-- Si la base global está aparte, copiar estas filas del shard 0 a la global
+INSERT IGNORE INTO user_directory (id, email, shard, created_at)
+SELECT id, email, '0', NOW() FROM users WHERE email IS NOT NULL;
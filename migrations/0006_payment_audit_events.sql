@@ -0,0 +1,15 @@
+-- Historial de status de los pagos (ver services/audit_service.py); en cada shard
+CREATE TABLE IF NOT EXISTS payment_audit_events (
+    id INT NOT NULL AUTO_INCREMENT PRIMARY KEY,
+    event_id VARCHAR(36) NOT NULL,
+    stripe_payment_intent_id VARCHAR(255) NOT NULL,
+    user_id INT NOT NULL,
+    from_status VARCHAR(50) NULL,
+    to_status VARCHAR(50) NOT NULL,
+    amount FLOAT NULL,
+    currency VARCHAR(3) NULL,
+    source VARCHAR(100) NOT NULL,
+    occurred_at DATETIME NOT NULL,
+    UNIQUE KEY ix_payment_audit_events_event_id (event_id),
+    KEY ix_payment_audit_events_intent (stripe_payment_intent_id, occurred_at)
+);
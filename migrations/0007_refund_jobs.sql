@@ -0,0 +1,32 @@
+-- Reembolsos masivos (ver services/refund_service.py)
+-- refund_jobs vive en la base global; refund_job_items en cada shard
+CREATE TABLE IF NOT EXISTS refund_jobs (
+    id INT NOT NULL AUTO_INCREMENT PRIMARY KEY,
+    status VARCHAR(20) NOT NULL,
+    filters TEXT NOT NULL,
+    reason VARCHAR(50) NULL,
+    total INT NOT NULL DEFAULT 0,
+    refunded_count INT NOT NULL DEFAULT 0,
+    failed_count INT NOT NULL DEFAULT 0,
+    error TEXT NULL,
+    created_at DATETIME NULL,
+    started_at DATETIME NULL,
+    heartbeat_at DATETIME NULL,
+    finished_at DATETIME NULL
+);
+
+CREATE TABLE IF NOT EXISTS refund_job_items (
+    id INT NOT NULL AUTO_INCREMENT PRIMARY KEY,
+    job_id INT NOT NULL,
+    payment_id INT NOT NULL,
+    user_id INT NOT NULL,
+    stripe_payment_intent_id VARCHAR(255) NOT NULL,
+    amount FLOAT NULL,
+    currency VARCHAR(3) NULL,
+    status VARCHAR(20) NOT NULL DEFAULT 'pending',
+    stripe_refund_id VARCHAR(255) NULL,
+    error VARCHAR(255) NULL,
+    updated_at DATETIME NULL,
+    UNIQUE KEY ix_refund_job_items_job_payment (job_id, stripe_payment_intent_id),
+    KEY ix_refund_job_items_job_status (job_id, status, id)
+);
@@ -0,0 +1,16 @@
+-- Vencimiento de pagos sin pagar (ver services/expiry_service.py)
+ALTER TABLE payments ADD COLUMN expires_at DATETIME NULL;
+
+-- Barrido: WHERE status IN (...) AND expires_at <= ? ORDER BY expires_at
+CREATE INDEX ix_payments_status_expires ON payments (status, expires_at);
+
+-- Pagos pendientes que ya existían: mismo plazo por método que los nuevos
+UPDATE payments SET expires_at = DATE_ADD(created_at, INTERVAL 5 DAY)
+WHERE expires_at IS NULL AND status IN ('pending', 'requires_payment_method', 'requires_confirmation', 'requires_action')
+AND payment_method_types = 'oxxo';
+UPDATE payments SET expires_at = DATE_ADD(created_at, INTERVAL 7 DAY)
+WHERE expires_at IS NULL AND status IN ('pending', 'requires_payment_method', 'requires_confirmation', 'requires_action')
+AND payment_method_types IN ('customer_balance', 'bank_transfer');
+UPDATE payments SET expires_at = DATE_ADD(created_at, INTERVAL 1 DAY)
+WHERE expires_at IS NULL AND status IN ('pending', 'requires_payment_method', 'requires_confirmation', 'requires_action')
+AND payment_method_types = 'card';
@@ -1,10 +1,12 @@
-from sqlalchemy import Boolean, Column, Integer, String, DateTime, Float, Text, ForeignKey
+from sqlalchemy import Boolean, Column, Integer, String, DateTime, Date, Float, Numeric, Text, ForeignKey, Index
 from sqlalchemy.orm import relationship
 from database import Base
 from datetime import datetime
 
 class User(Base):
     __tablename__ = "users"
+    # Shard del usuario: shard_for_user(id) (ver database.py)
+    __shard_key__ = "id"
 
     id = Column(Integer, primary_key=True, index=True)
     # username = Column(String(50), unique=True, index=True)
@@ -12,32 +14,125 @@ class User(Base):
     last_name = Column(String(100))
     email = Column(String(100), unique=True, index=True)
     password = Column(String(255))
-    reset_token = Column(String(255), nullable=True)
+    reset_token = Column(String(255), nullable=True, index=True)
     reset_token_expires = Column(DateTime, nullable=True)
+    # Customer de Stripe creado al registrarse (ver StripeService.precreate_customer)
+    stripe_customer_id = Column(String(255), unique=True, index=True, nullable=True)
     
     # Relación con pagos
     payments = relationship("Payment", back_populates="user")
 
 class Payment(Base):
     __tablename__ = "payments"
+    # Los pagos viven en el shard de su usuario
+    __shard_key__ = "user_id"
 
+    # Con `archive_payments.py partition` (MySQL) la PK pasa a (id, created_at), se
+    # quita la FK de user_id y la unicidad del intent la mantiene payment_intent_keys
+    # (ver services/partition_service.py); create_all y migrations/ crean la tabla sin particionar
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"))
     stripe_payment_intent_id = Column(String(255), unique=True, index=True)
     stripe_customer_id = Column(String(255), nullable=True)
     amount = Column(Float)  # Cantidad en la moneda base (ej: 10.50 para $10.50)
     currency = Column(String(3), default="usd")  # usd, eur, etc.
-    status = Column(String(50))  # pending, succeeded, failed, canceled
+    status = Column(String(50))  # pending, succeeded, failed, canceled, refunded, expired
     description = Column(String(255), nullable=True)
     payment_method_types = Column(String(50), nullable=True)  # oxxo, bank_transfer, card, etc.
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    # Control de concurrencia optimista (ver services/concurrency.py)
+    version = Column(Integer, nullable=False, default=1, server_default="1")
+    # Si sigue sin pagarse a esta hora se cancela y queda "expired" (services/expiry_service.py);
+    # para OXXO es el vencimiento del voucher más un margen
+    expires_at = Column(DateTime, nullable=True)
     
     # Relación con usuario
     user = relationship("User", back_populates="payments")
 
+    # Índices de las consultas frecuentes; deben coincidir con migrations/
+    __table_args__ = (
+        Index("ix_payments_user_status", "user_id", "status"),
+        Index("ix_payments_user_created", "user_id", "created_at"),
+        Index("ix_payments_status_expires", "status", "expires_at"),
+    )
+    __mapper_args__ = {"version_id_col": version}
+
+class PaymentAuditEvent(Base):
+    """
+    Historial de status de un pago (sólo se agregan filas, nunca se modifican)
+    Se escribe en lotes desde services/audit_service.py
+    """
+    __tablename__ = "payment_audit_events"
+    # En el shard del usuario, junto a sus pagos
+    __shard_key__ = "user_id"
+
+    id = Column(Integer, primary_key=True)
+    # Generado al registrar el evento: reinsertar desde el spool no duplica filas
+    event_id = Column(String(36), unique=True, nullable=False)
+    stripe_payment_intent_id = Column(String(255), nullable=False)
+    user_id = Column(Integer, nullable=False)
+    from_status = Column(String(50), nullable=True)  # None al crear el pago
+    to_status = Column(String(50), nullable=False)
+    amount = Column(Float, nullable=True)
+    currency = Column(String(3), nullable=True)
+    source = Column(String(100), nullable=False)  # api:create, webhook:payment_intent.succeeded, refund_job:12, ...
+    occurred_at = Column(DateTime, nullable=False)
+
+    __table_args__ = (
+        Index("ix_payment_audit_events_intent", "stripe_payment_intent_id", "occurred_at"),
+    )
+
+class RefundJob(Base):
+    """
+    Reembolso masivo de pagos (services/refund_service.py)
+    El avance se guarda por item, así un job interrumpido continúa donde se quedó
+    """
+    __tablename__ = "refund_jobs"
+    # Un job recorre todos los shards: vive en la base global
+    __global__ = True
+
+    id = Column(Integer, primary_key=True)
+    # preparing, pending, running, paused, completed, failed, canceled
+    status = Column(String(20), nullable=False, default="preparing")
+    filters = Column(Text, nullable=False)  # JSON con el filtro sobre payments
+    reason = Column(String(50), nullable=True)  # duplicate, fraudulent, requested_by_customer
+    total = Column(Integer, nullable=False, default=0)
+    refunded_count = Column(Integer, nullable=False, default=0)
+    failed_count = Column(Integer, nullable=False, default=0)
+    error = Column(Text, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    started_at = Column(DateTime, nullable=True)
+    # Se actualiza en cada bloque; un job "running" sin latido quedó huérfano
+    heartbeat_at = Column(DateTime, nullable=True)
+    finished_at = Column(DateTime, nullable=True)
+
+class RefundJobItem(Base):
+    """Un pago de un RefundJob (en el shard del pago, se actualiza junto con él)"""
+    __tablename__ = "refund_job_items"
+    __shard_key__ = "user_id"
+
+    id = Column(Integer, primary_key=True)
+    job_id = Column(Integer, nullable=False)  # refund_jobs.id (base global, sin llave foránea)
+    payment_id = Column(Integer, nullable=False)
+    user_id = Column(Integer, nullable=False)
+    stripe_payment_intent_id = Column(String(255), nullable=False)
+    amount = Column(Float, nullable=True)
+    currency = Column(String(3), nullable=True)
+    status = Column(String(20), nullable=False, default="pending")  # pending, refunded, failed
+    stripe_refund_id = Column(String(255), nullable=True)
+    error = Column(String(255), nullable=True)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    __table_args__ = (
+        Index("ix_refund_job_items_job_payment", "job_id", "stripe_payment_intent_id", unique=True),
+        Index("ix_refund_job_items_job_status", "job_id", "status", "id"),
+    )
+
 class Product(Base):
     __tablename__ = "products"
+    # Catálogo compartido: vive en la base global, no en los shards
+    __global__ = True
 
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String(255))
@@ -49,5 +144,38 @@ class Product(Base):
     is_active = Column(Boolean, default=True)
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    # Control de concurrencia optimista (ver services/concurrency.py)
+    version = Column(Integer, nullable=False, default=1, server_default="1")
+
+    __mapper_args__ = {"version_id_col": version}
 
+class UserDirectory(Base):
+    """
+    Directorio global email -> usuario/shard (en la base global)
+    Su id autoincremental asigna el id de cada usuario nuevo en todos los shards
+    """
+    __tablename__ = "user_directory"
+    __global__ = True
 
+    id = Column(Integer, primary_key=True)
+    email = Column(String(100), unique=True, nullable=False)
+    shard = Column(String(20), nullable=True)  # Se llena al asignar el id
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+class PaymentDailyRollup(Base):
+    """Totales de pagos por día, moneda y método de pago (mantenidos incrementalmente)"""
+    __tablename__ = "payment_daily_rollups"
+    # Cada shard guarda los totales de sus pagos (mismo commit que el pago);
+    # los reportes suman los de todos los shards (rollup_service.get_daily_rollups)
+
+    # La llave primaria compuesta permite leer un día completo por prefijo
+    day = Column(Date, primary_key=True)  # Día (UTC) de created_at del pago
+    currency = Column(String(3), primary_key=True)
+    payment_method = Column(String(50), primary_key=True)  # oxxo, customer_balance, card, etc.
+    payments_count = Column(Integer, default=0, nullable=False)
+    amount_total = Column(Numeric(14, 2), default=0, nullable=False)
+    succeeded_count = Column(Integer, default=0, nullable=False)
+    succeeded_amount = Column(Numeric(14, 2), default=0, nullable=False)
+    failed_count = Column(Integer, default=0, nullable=False)
+    failed_amount = Column(Numeric(14, 2), default=0, nullable=False)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
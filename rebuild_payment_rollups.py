@@ -0,0 +1,69 @@
+"""
+Script para recalcular la tabla payment_daily_rollups desde cero
+Lee `payments` en bloques (yield_per) para no cargar toda la tabla en memoria
+
+Uso:
+    python rebuild_payment_rollups.py            # Reconstruir
+    python rebuild_payment_rollups.py --verify   # Sólo comparar contra la tabla actual
+
+Si ya se archivaron meses de payments (archive_payments.py), usar --hot-only
+para no borrar los totales de los meses que ya no están en la tabla
+
+Cada shard tiene sus propios pagos y rollups: se procesan uno por uno
+(o sólo uno con --shard)
+"""
+
+import sys
+import os
+import argparse
+import time
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from database import shard_ids, shard_session
+from services import rollup_service, partition_service
+
+def main():
+    parser = argparse.ArgumentParser(description="Recalcular payment_daily_rollups")
+    parser.add_argument("--chunk-size", type=int, default=5000, help="Pagos leídos por bloque")
+    parser.add_argument("--verify", action="store_true", help="Sólo verificar, no escribir")
+    parser.add_argument("--hot-only", action="store_true",
+                        help="Sólo recalcular desde el pago más antiguo que sigue en la tabla")
+    parser.add_argument("--shard", choices=shard_ids(), help="Sólo este shard")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    shards = [args.shard] if args.shard else shard_ids()
+    total_differences = 0
+
+    for shard_id in shards:
+        if len(shards) > 1:
+            print(f"\n== Shard {shard_id} ==")
+        db = shard_session(shard_id)
+        try:
+            since = partition_service.oldest_payment_day(db) if args.hot_only else None
+            if since:
+                print(f"Recalculando desde {since}")
+
+            if args.verify:
+                differences = rollup_service.verify_rollups(db, args.chunk_size, since)
+                for diff in differences:
+                    print(f"✗ {diff['day']} {diff['currency']} {diff['payment_method']} "
+                          f"{diff['column']}: esperado={diff['expected']} guardado={diff['stored']}")
+                if differences:
+                    print(f"\n{len(differences)} diferencias encontradas")
+                    total_differences += len(differences)
+                else:
+                    print("✓ Los rollups coinciden con la tabla payments")
+            else:
+                rows = rollup_service.rebuild_rollups(db, args.chunk_size, since)
+                print(f"✓ Rollups reconstruidos: {rows} filas")
+        finally:
+            db.close()
+
+    if total_differences:
+        sys.exit(1)
+
+    print(f"Tiempo: {time.perf_counter() - started:.2f}s")
+
+if __name__ == "__main__":
+    main()
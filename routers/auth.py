@@ -1,27 +1,37 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, status
 from sqlalchemy.orm import Session
 from schemas.user import UserCreate, UserLogin, UserOut, PasswordResetRequest, PasswordReset
 from services import auth_service
 from database import get_db
 from fastapi import Request
+from utils.rate_limit import auth_rate_limiter
+from services.stripe_service import stripe_service
+from utils.profiling import ProfiledRoute
 
 router = APIRouter(
     prefix="/auth",
-    tags=["auth"]
+    tags=["auth"],
+    route_class=ProfiledRoute
 )
 
 #Register
 @router.post("/register", response_model=UserOut)
-def register(user: UserCreate, db: Session = Depends(get_db)):
+def register(user: UserCreate, request: Request, db: Session = Depends(get_db)):
+    auth_rate_limiter.check_request("register", request, user.email)
     db_user = auth_service.get_user_by_email(db, user.email)
     if db_user:
         raise HTTPException(status_code=400, detail="Email already registered")
-    return auth_service.create_user(db, user)
+    db_user = auth_service.create_user(db, user)
+    # Crear el customer de Stripe en segundo plano para que el primer checkout no lo espere
+    stripe_service.schedule_customer_precreate(db_user.id)
+    return db_user
 
 #Login
 @router.post("/login")
-def login(user: UserLogin, db: Session = Depends(get_db)):
-    db_user = auth_service.authenticate_user(db, user.email, user.password)
+def login(user: UserLogin, request: Request, background_tasks: BackgroundTasks, db: Session = Depends(get_db)):
+    # Rechazar antes de bcrypt para no gastar CPU en ataques de fuerza bruta
+    auth_rate_limiter.check_request("login", request, user.email)
+    db_user = auth_service.authenticate_user(db, user.email, user.password, background_tasks)
     if not db_user:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid credentials")
     token = auth_service.create_access_token(db_user)
@@ -29,10 +39,11 @@ def login(user: UserLogin, db: Session = Depends(get_db)):
 
 #Request Password Reset
 @router.post("/request-password-reset")
-def request_password_reset(request: PasswordResetRequest, db: Session = Depends(get_db)):
+def request_password_reset(request: PasswordResetRequest, http_request: Request, db: Session = Depends(get_db)):
     """
     Solicitar reset de contraseña por email
     """
+    auth_rate_limiter.check_request("password_reset", http_request, request.email)
     user = auth_service.get_user_by_email(db, request.email)
     if not user:
         # Por seguridad, no revelamos si el email existe o no
@@ -0,0 +1,25 @@
+from fastapi import APIRouter
+from fastapi.responses import JSONResponse
+from services.warmup_service import warmup
+
+router = APIRouter(
+    prefix="/health",
+    tags=["health"]
+)
+
+@router.get("/live")
+def liveness():
+    """
+    El proceso responde (no revisa dependencias: si falla, hay que reiniciar el worker)
+    """
+    return {"status": "alive"}
+
+@router.get("/ready")
+def readiness():
+    """
+    El worker terminó el warm-up y puede recibir tráfico
+    Responde 503 mientras calienta, mientras se apaga o si un paso obligatorio del
+    warm-up falló (se sigue reintentando en segundo plano hasta que se recupere)
+    """
+    state = warmup.snapshot()
+    return JSONResponse(status_code=200 if warmup.ready else 503, content=state)
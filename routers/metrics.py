@@ -0,0 +1,14 @@
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+from utils.metrics import metrics
+
+router = APIRouter(
+    tags=["metrics"]
+)
+
+@router.get("/metrics", response_class=PlainTextResponse)
+def get_metrics():
+    """
+    Métricas del worker en formato de texto de Prometheus
+    """
+    return metrics.render()
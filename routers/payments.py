@@ -1,24 +1,45 @@
 from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
-from typing import List
+from typing import List, Optional
+from datetime import date, datetime
 from database import get_db
 from models import User, Payment, Product
 from schemas.stripe_schemas import (
-    PaymentIntentCreate, PaymentIntentResponse, PaymentResponse,
+    PaymentIntentCreate, PaymentIntentResponse, PaymentResponse, PaymentAuditEventResponse,
+    BatchPaymentIntentCreate, BatchPaymentIntentResponse,
     ProductCreate, ProductUpdate, ProductResponse,
-    StripeConfigResponse
+    StripeConfigResponse, DailyRevenueRollupResponse, RefundJobCreate, RefundJobResponse
 )
 from services.stripe_service import stripe_service
-from utils.dependencies import get_current_user
+from services import rollup_service, concurrency, export_service, audit_service, refund_service
+from services.product_catalog import product_catalog, list_active_products
+from services.payment_events import payment_events, format_sse
+from config.events_config import EventsConfig
+from utils.dependencies import get_current_user, get_current_user_id, require_admin
+from utils.cache import cache
+from utils.profiling import ProfiledRoute
+from config.cache_config import CacheConfig
+from config.stripe_config import StripeConfig
+import asyncio
 import logging
 
 logger = logging.getLogger(__name__)
 
 router = APIRouter(
     prefix="/payments",
-    tags=["payments"]
+    tags=["payments"],
+    route_class=ProfiledRoute
 )
 
+def _resolve_price(payment_data: PaymentIntentCreate):
+    """Monto, moneda y descripción del pago; con product_id el precio lo pone el servidor"""
+    if payment_data.product_id is None:
+        return payment_data.amount, payment_data.currency, payment_data.description
+    product = product_catalog.get_active(payment_data.product_id)
+    return product.price, product.currency, payment_data.description or product.name
+
 # Configuración
 @router.get("/config", response_model=StripeConfigResponse)
 def get_stripe_config():
@@ -48,15 +69,18 @@ def create_payment_intent_transfer(
             detail="Este endpoint solo acepta pagos por customer_balance"
         )
     
+    amount, currency, description = _resolve_price(payment_data)
     try:
         return stripe_service.create_payment_intent_transfer(
             db=db,
             user=current_user,
-            amount=payment_data.amount,
-            currency=payment_data.currency,
-            description=payment_data.description,
+            amount=amount,
+            currency=currency,
+            description=description,
             return_url=getattr(payment_data, 'return_url', None)
         )
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error creating transfer payment intent: {e}")
         raise HTTPException(status_code=400, detail=str(e))
@@ -72,17 +96,53 @@ def create_payment_intent(
     """
     Crear un Payment Intent para un pago único
     Usar con Stripe Elements en el frontend
+    Con product_id el precio sale del índice de productos, no del cliente
     """
+    amount, currency, description = _resolve_price(payment_data)
     return stripe_service.create_payment_intent(
         db=db,
         user=current_user,
-        amount=payment_data.amount,
-        currency=payment_data.currency,
-        description=payment_data.description,
+        amount=amount,
+        currency=currency,
+        description=description,
         payment_method_types=payment_data.payment_method_types
         
     )
 
+@router.post("/create-payment-intents/batch", response_model=BatchPaymentIntentResponse)
+def create_payment_intents_batch(
+    batch_data: BatchPaymentIntentCreate,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """
+    Crear varios Payment Intents (ej: un carrito) en una sola petición
+    Cada item usa product_id (precio del producto) o amount; los errores se reportan por item
+    """
+    if len(batch_data.items) > StripeConfig.BATCH_MAX_ITEMS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Máximo {StripeConfig.BATCH_MAX_ITEMS} items por lote"
+        )
+    
+    items = []
+    for item in batch_data.items:
+        method_type = item.payment_method_types[0].lower()
+        if item.product_id is None:
+            items.append({"amount": item.amount, "currency": item.currency,
+                          "description": item.description, "method_type": method_type})
+            continue
+        product = product_catalog.get(item.product_id)
+        if product is None or not product.is_active:
+            items.append({"error": f"Producto {item.product_id} no encontrado o inactivo"})
+            continue
+        items.append({"amount": product.price, "currency": product.currency,
+                      "description": item.description or product.name, "method_type": method_type})
+    
+    results = stripe_service.create_payment_intents_batch(db, current_user, items)
+    succeeded = sum(1 for result in results if result["success"])
+    return {"results": results, "succeeded": succeeded, "failed": len(results) - succeeded}
+
 @router.get("/payment-history", response_model=List[PaymentResponse])
 def get_payment_history(
     current_user: User = Depends(get_current_user),
@@ -91,8 +151,16 @@ def get_payment_history(
     """
     Obtener historial de pagos del usuario
     """
-    payments = db.query(Payment).filter(Payment.user_id == current_user.id).all()
-    return payments
+    return cache.get_or_set(
+        f"payment_history:{current_user.id}",
+        lambda: [
+            PaymentResponse.model_validate(payment).model_dump(mode="json")
+            for payment in db.query(Payment).filter(
+                Payment.user_id == current_user.id
+            ).order_by(Payment.created_at.desc()).all()
+        ],
+        CacheConfig.ENTITLEMENT_TTL_SECONDS
+    )
 
 @router.get("/payment/{payment_intent_id}", response_model=PaymentResponse)
 def get_payment_by_id(
@@ -103,6 +171,11 @@ def get_payment_by_id(
     """
     Obtener un pago específico por ID
     """
+    cache_key = f"payment:{current_user.id}:{payment_intent_id}"
+    cached_payment = cache.get(cache_key)
+    if cached_payment is not None:
+        return cached_payment
+
     payment = db.query(Payment).filter(
         Payment.stripe_payment_intent_id == payment_intent_id,
         Payment.user_id == current_user.id
@@ -111,7 +184,28 @@ def get_payment_by_id(
     if not payment:
         raise HTTPException(status_code=404, detail="Pago no encontrado")
     
-    return payment
+    payment_data = PaymentResponse.model_validate(payment).model_dump(mode="json")
+    cache.set(cache_key, payment_data, CacheConfig.ENTITLEMENT_TTL_SECONDS)
+    return payment_data
+
+@router.get("/payment/{payment_intent_id}/history", response_model=List[PaymentAuditEventResponse])
+def get_payment_status_history(
+    payment_intent_id: str,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """
+    Historial de cambios de status de un pago (auditoría), del más antiguo al más reciente
+    """
+    events = audit_service.get_payment_history(db, payment_intent_id, current_user.id)
+    if not events:
+        exists = db.query(Payment.id).filter(
+            Payment.stripe_payment_intent_id == payment_intent_id,
+            Payment.user_id == current_user.id
+        ).first()
+        if not exists:
+            raise HTTPException(status_code=404, detail="Pago no encontrado")
+    return events
 
 # Productos (para administradores)
 @router.post("/products", response_model=ProductResponse)
@@ -140,9 +234,14 @@ def create_product(
         db.add(db_product)
         db.commit()
         db.refresh(db_product)
+        product_catalog.refresh(db_product)
+        cache.invalidate(f"product:{db_product.id}", "products:active")
         
         return db_product
         
+    except HTTPException:
+        db.rollback()
+        raise
     except Exception as e:
         db.rollback()
         logger.error(f"Error creating product: {e}")
@@ -153,18 +252,27 @@ def list_products(db: Session = Depends(get_db)):
     """
     Listar todos los productos activos
     """
-    products = db.query(Product).filter(Product.is_active == True).all()
-    return products
+    return cache.get_or_set(
+        "products:active",
+        lambda: list_active_products(db),
+        CacheConfig.PRODUCT_TTL_SECONDS
+    )
 
 @router.get("/products/{product_id}", response_model=ProductResponse)
 def get_product(product_id: int, db: Session = Depends(get_db)):
     """
     Obtener un producto específico
     """
+    cached_product = cache.get(f"product:{product_id}")
+    if cached_product is not None:
+        return cached_product
+
     product = db.query(Product).filter(Product.id == product_id).first()
     if not product:
         raise HTTPException(status_code=404, detail="Producto no encontrado")
-    return product
+    product_data = ProductResponse.model_validate(product).model_dump(mode="json")
+    cache.set(f"product:{product_id}", product_data, CacheConfig.PRODUCT_TTL_SECONDS)
+    return product_data
 
 @router.put("/products/{product_id}", response_model=ProductResponse)
 def update_product(
@@ -176,19 +284,106 @@ def update_product(
     """
     Actualizar un producto (solo administradores)
     """
-    product = db.query(Product).filter(Product.id == product_id).first()
+    # Actualizar campos con compare-and-swap sobre la versión del producto
+    update_data = product_data.dict(exclude_unset=True)
+    expected_version = update_data.pop("version", None)
+    if update_data:
+        update_data["updated_at"] = datetime.utcnow()
+    
+    try:
+        product = concurrency.update_with_retry(
+            db, Product, [Product.id == product_id],
+            lambda product: update_data,
+            expected_version=expected_version
+        )
+    except concurrency.ConcurrencyConflict as e:
+        raise HTTPException(status_code=409, detail=f"Conflicto de versión: {str(e)}")
+    
     if not product:
         raise HTTPException(status_code=404, detail="Producto no encontrado")
     
-    # Actualizar campos
-    update_data = product_data.dict(exclude_unset=True)
-    for field, value in update_data.items():
-        setattr(product, field, value)
-    
-    db.commit()
-    db.refresh(product)
+    product_catalog.refresh(product)
+    cache.invalidate(f"product:{product_id}", "products:active")
     return product
 
+# Reportes (para administradores)
+@router.get("/reports/daily", response_model=List[DailyRevenueRollupResponse], dependencies=[Depends(require_admin)])
+def get_daily_revenue(
+    day: date,
+    db: Session = Depends(get_db)
+):
+    """
+    Totales de un día por moneda y método de pago (desde payment_daily_rollups)
+    """
+    return rollup_service.get_daily_rollups(db, day)
+
+@router.get("/admin/export", dependencies=[Depends(require_admin)])
+def export_payments(
+    format: str = "csv",
+    date_from: Optional[date] = None,
+    date_to: Optional[date] = None,
+    status: Optional[str] = None,
+):
+    """
+    Exportar pagos con datos del usuario como CSV o NDJSON (streaming)
+    Filtra por rango de fechas de creación (inclusivo) y status
+    """
+    if format not in export_service.EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail="Formato no soportado (usa csv o ndjson)")
+    
+    filename = f"payments-{date_from or 'inicio'}-{date_to or 'hoy'}.{format}"
+    return StreamingResponse(
+        export_service.iter_payments_export(format, date_from, date_to, status),
+        media_type=export_service.EXPORT_FORMATS[format],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
+
+# Reembolsos masivos (para administradores)
+@router.post("/admin/refund-jobs", response_model=RefundJobResponse, dependencies=[Depends(require_admin)])
+def create_refund_job(
+    refund_data: RefundJobCreate,
+    db: Session = Depends(get_db)
+):
+    """
+    Reembolsar en segundo plano los pagos exitosos que cumplan el filtro
+    Con dry_run sólo regresa cuántos pagos se reembolsarían
+    """
+    filters = refund_data.model_dump(mode="json", exclude={"reason", "dry_run"}, exclude_none=True)
+    if refund_data.dry_run:
+        total = refund_service.preview_refund(db, filters)
+        return RefundJobResponse(status="dry_run", reason=refund_data.reason, total=total)
+    return refund_service.create_refund_job(db, filters, refund_data.reason)
+
+@router.get("/admin/refund-jobs/{job_id}", response_model=RefundJobResponse, dependencies=[Depends(require_admin)])
+def get_refund_job(
+    job_id: int,
+    db: Session = Depends(get_db)
+):
+    """
+    Avance de un job de reembolso masivo
+    """
+    return refund_service.get_refund_job(db, job_id)
+
+@router.post("/admin/refund-jobs/{job_id}/resume", response_model=RefundJobResponse, dependencies=[Depends(require_admin)])
+def resume_refund_job(
+    job_id: int,
+    db: Session = Depends(get_db)
+):
+    """
+    Reanudar un job pausado o fallido desde los pagos que faltan
+    """
+    return refund_service.resume_refund_job(db, job_id)
+
+@router.post("/admin/refund-jobs/{job_id}/cancel", response_model=RefundJobResponse, dependencies=[Depends(require_admin)])
+def cancel_refund_job(
+    job_id: int,
+    db: Session = Depends(get_db)
+):
+    """
+    Detener un job de reembolso masivo (los pagos que faltan no se reembolsan)
+    """
+    return refund_service.cancel_refund_job(db, job_id)
+
 # Verificar si el usuario tiene un pago activo
 @router.get("/has-paid")
 def has_paid(
@@ -200,12 +395,14 @@ def has_paid(
     """
     try:
         # Buscar si el usuario tiene al menos un pago con status 'succeeded'
-        payment = db.query(Payment).filter(
-            Payment.user_id == current_user.id,
-            Payment.status == "succeeded"
-        ).first()
-        
-        has_active_payment = payment is not None
+        has_active_payment = cache.get_or_set(
+            f"has_paid:{current_user.id}",
+            lambda: db.query(Payment.id).filter(
+                Payment.user_id == current_user.id,
+                Payment.status == "succeeded"
+            ).first() is not None,
+            CacheConfig.ENTITLEMENT_TTL_SECONDS
+        )
         
         logger.info(f"User {current_user.email} payment check: {has_active_payment}")
         
@@ -222,6 +419,41 @@ def has_paid(
             detail="Error verificando estado de pago"
         )
 
+# Stream de eventos (reemplaza el polling de has-paid / payment/{id})
+@router.get("/events")
+async def payment_events_stream(user_id: int = Depends(get_current_user_id)):
+    """
+    Server-Sent Events con los cambios de status de los pagos del usuario
+    Usar con EventSource: /api/payments/events?access_token=...
+    Después del evento "ready" conviene consultar una vez el estado actual;
+    a partir de ahí cada cambio llega por aquí
+    No usa sesión de base de datos mientras la conexión está abierta
+    """
+    subscription = payment_events.subscribe(user_id)
+    if subscription is None:
+        raise HTTPException(status_code=429, detail="Demasiadas conexiones abiertas para este usuario")
+
+    async def stream():
+        try:
+            yield f"retry: {EventsConfig.CLIENT_RETRY_MS}\n\n"
+            yield format_sse({"type": "ready", "user_id": user_id})
+            # Si el cliente se desconecta, StreamingResponse cancela este generador
+            while True:
+                try:
+                    event = await asyncio.wait_for(subscription.queue.get(), EventsConfig.HEARTBEAT_SECONDS)
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"
+                    continue
+                yield format_sse(event)
+        finally:
+            payment_events.unsubscribe(subscription)
+
+    return StreamingResponse(
+        stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
 # Webhook de Stripe
 @router.post("/stripe-webhook")
 async def stripe_webhook(
@@ -238,7 +470,9 @@ async def stripe_webhook(
         raise HTTPException(status_code=400, detail="Missing stripe-signature header")
     
     try:
-        return stripe_service.handle_webhook_event(db, payload, sig_header)
+        # El manejo es síncrono (base de datos, reintentos, Stripe): fuera del event loop
+        # para no detener los streams de /events mientras se procesa
+        return await run_in_threadpool(stripe_service.handle_webhook_event, db, payload, sig_header)
     except Exception as e:
         logger.error(f"Webhook error: {e}")
         raise HTTPException(status_code=400, detail=str(e))
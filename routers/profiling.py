@@ -0,0 +1,44 @@
+from fastapi import APIRouter, Depends, HTTPException
+from pydantic import BaseModel, Field
+from typing import Optional
+from utils.dependencies import require_admin
+from utils.profiling import profiler
+
+router = APIRouter(
+    prefix="/admin/profiling",
+    tags=["profiling"],
+    dependencies=[Depends(require_admin)]
+)
+
+class ProfilingToggle(BaseModel):
+    route: str = Field(..., description='Ruta como "METHOD /path", ej: "POST /api/payments/create-payment-intent"')
+    requests: int = Field(default=20, ge=0, le=1000, description="Peticiones a perfilar (0 = desactivar)")
+
+@router.get("")
+def get_profiling_status():
+    """
+    Estado del profiler y rutas con muestras acumuladas
+    """
+    return profiler.status()
+
+@router.post("")
+def toggle_route_profiling(
+    toggle: ProfilingToggle
+):
+    """
+    Perfilar las siguientes N peticiones de una ruta (sujeto al rate limit del profiler)
+    """
+    if not profiler.enabled:
+        raise HTTPException(status_code=400, detail="El profiler está desactivado (PROFILING_ENABLED)")
+    profiler.enable_route(toggle.route, toggle.requests)
+    return profiler.status()
+
+@router.delete("")
+def reset_profiles(
+    route: Optional[str] = None
+):
+    """
+    Borrar las muestras acumuladas de una ruta (o de todas)
+    """
+    profiler.reset(route)
+    return profiler.status()
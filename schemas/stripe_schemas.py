@@ -1,16 +1,23 @@
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, model_validator
 from typing import Optional
-from datetime import datetime
+from datetime import datetime, date
 from typing import List
 
 # Schemas para pagos únicos
 class PaymentIntentCreate(BaseModel):
-    amount: float = Field(..., gt=0, description="Monto en la moneda base (ej: 10.50)")
+    product_id: Optional[int] = None  # Si se envía, el precio y la moneda salen del producto
+    amount: Optional[float] = Field(default=None, gt=0, description="Monto en la moneda base (ej: 10.50)")
     currency: str = Field(default="usd", description="Código de moneda (usd, eur, etc.)")
     description: Optional[str] = None
     payment_method_types: List[str] = ["card"]
     return_url: Optional[str] = None  # Para transferencias
     confirm: Optional[bool] = False   
+
+    @model_validator(mode="after")
+    def check_amount_or_product(self):
+        if self.product_id is None and self.amount is None:
+            raise ValueError("Se necesita product_id o amount")
+        return self
     
 class PaymentIntentResponse(BaseModel):
     client_secret: str
@@ -36,6 +43,35 @@ class PaymentIntentResponse(BaseModel):
     
 
 
+# Schemas para checkout por lotes
+class BatchPaymentItem(BaseModel):
+    product_id: Optional[int] = None  # Si se envía, el precio sale del producto
+    amount: Optional[float] = Field(default=None, gt=0, description="Monto en la moneda base (ej: 10.50)")
+    currency: str = Field(default="usd", description="Código de moneda (usd, eur, etc.)")
+    description: Optional[str] = None
+    payment_method_types: List[str] = ["card"]
+
+    @model_validator(mode="after")
+    def check_amount_or_product(self):
+        if self.product_id is None and self.amount is None:
+            raise ValueError("Cada item necesita product_id o amount")
+        return self
+
+class BatchPaymentIntentCreate(BaseModel):
+    items: List[BatchPaymentItem] = Field(..., min_length=1)
+
+class BatchPaymentItemResult(BaseModel):
+    index: int
+    success: bool
+    payment: Optional[PaymentIntentResponse] = None
+    error: Optional[str] = None
+
+class BatchPaymentIntentResponse(BaseModel):
+    results: List[BatchPaymentItemResult]
+    succeeded: int
+    failed: int
+
+
 class PaymentResponse(BaseModel):
     id: int
     stripe_payment_intent_id: str
@@ -48,6 +84,56 @@ class PaymentResponse(BaseModel):
     class Config:
         from_attributes = True
 
+class PaymentAuditEventResponse(BaseModel):
+    event_id: str
+    from_status: Optional[str]
+    to_status: str
+    amount: Optional[float]
+    currency: Optional[str]
+    source: str
+    occurred_at: datetime
+
+# Schemas para reembolsos masivos
+class RefundJobCreate(BaseModel):
+    """
+    Filtro sobre los pagos exitosos a reembolsar
+    Para crear el job se requiere al menos un criterio (valores vacíos no cuentan);
+    con dry_run se puede contar sin filtro
+    """
+    date_from: Optional[date] = None
+    date_to: Optional[date] = None
+    currency: Optional[str] = None
+    payment_method: Optional[str] = None  # oxxo, card, customer_balance, ...
+    description: Optional[str] = None
+    user_ids: Optional[List[int]] = None
+    payment_intent_ids: Optional[List[str]] = None
+    reason: Optional[str] = Field(default="requested_by_customer",
+                                  pattern="^(duplicate|fraudulent|requested_by_customer)$")
+    dry_run: bool = False  # Sólo contar los pagos, sin crear el job
+
+    @model_validator(mode="after")
+    def check_filter(self):
+        filters = self.model_dump(exclude={"reason", "dry_run"}, exclude_none=True)
+        if not self.dry_run and not any(value not in ("", []) for value in filters.values()):
+            raise ValueError("Se necesita al menos un filtro para el reembolso masivo")
+        return self
+
+class RefundJobResponse(BaseModel):
+    id: Optional[int] = None  # None con dry_run
+    status: str
+    reason: Optional[str] = None
+    total: int
+    refunded_count: int = 0
+    failed_count: int = 0
+    error: Optional[str] = None
+    created_at: Optional[datetime] = None
+    started_at: Optional[datetime] = None
+    heartbeat_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+
+    class Config:
+        from_attributes = True
+
 # Schemas para productos
 class ProductCreate(BaseModel):
     name: str = Field(..., max_length=255)
@@ -60,6 +146,8 @@ class ProductUpdate(BaseModel):
     description: Optional[str] = None
     price: Optional[float] = None
     is_active: Optional[bool] = None
+    # Si se envía, la actualización falla con 409 cuando el producto cambió desde que se leyó
+    version: Optional[int] = None
 
 class ProductResponse(BaseModel):
     id: int
@@ -71,10 +159,26 @@ class ProductResponse(BaseModel):
     stripe_price_id: Optional[str]
     is_active: bool
     created_at: datetime
+    version: int = 1
     
     class Config:
         from_attributes = True
 
+# Schemas para reportes
+class DailyRevenueRollupResponse(BaseModel):
+    day: date
+    currency: str
+    payment_method: str
+    payments_count: int
+    amount_total: float
+    succeeded_count: int
+    succeeded_amount: float
+    failed_count: int
+    failed_amount: float
+
+    class Config:
+        from_attributes = True
+
 # Schema para el webhook de Stripe
 class StripeWebhookPayload(BaseModel):
     """Payload recibido desde Stripe webhook"""
@@ -0,0 +1,265 @@
+import atexit
+import glob
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from collections import defaultdict
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import exc, insert, select
+from sqlalchemy.orm import Session
+
+from config.audit_config import AuditConfig
+from database import SessionLocal, shard_for_user
+from models import PaymentAuditEvent
+from utils.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# Auditoría de los cambios de status de los pagos. Un INSERT por transición
+# agregaría latencia al checkout y a los webhooks: los eventos se juntan en
+# memoria y un hilo los inserta en lote (un INSERT de varias filas por shard).
+# Si la base de datos falla, el lote se guarda en un spool NDJSON y se reintenta;
+# event_id es único, así que reinsertar un lote parcialmente escrito no duplica.
+# Un spool que falla por algo que no es la conexión (línea corrupta, dato que la
+# tabla rechaza) se renombra a *.bad para revisarlo a mano en vez de reintentarlo
+# para siempre.
+
+# Errores de conexión con la base de datos: el spool se conserva y se reintenta
+CONNECTIVITY_ERRORS = (exc.OperationalError, exc.InterfaceError, exc.DisconnectionError, exc.TimeoutError)
+
+audit_events_written = metrics.counter(
+    "payment_audit_events_written_total", "Eventos de auditoría de pagos insertados en la base de datos"
+)
+audit_events_spooled = metrics.counter(
+    "payment_audit_events_spooled_total", "Eventos de auditoría guardados en el spool porque falló el INSERT"
+)
+audit_spools_quarantined = metrics.counter(
+    "payment_audit_spools_quarantined_total", "Archivos del spool apartados (.bad) porque no se pueden reinsertar"
+)
+
+
+def _to_json(event: Dict[str, Any]) -> str:
+    return json.dumps({**event, "occurred_at": event["occurred_at"].isoformat()})
+
+
+def _from_json(line: str) -> Dict[str, Any]:
+    event = json.loads(line)
+    event["occurred_at"] = datetime.fromisoformat(event["occurred_at"])
+    return event
+
+
+class AuditWriter:
+    """
+    Escritor de eventos de auditoría en lotes
+
+    - record() sólo agrega a una lista en memoria (no toca la base de datos)
+    - Flush al llegar a batch_size eventos o cada `interval` segundos
+    - shutdown() (lifespan y atexit) hace el último flush antes de salir
+    """
+
+    def __init__(self, enabled: bool, batch_size: int, interval: float, spool_dir: str,
+                 orphan_spool_seconds: int):
+        self.enabled = enabled
+        self.batch_size = batch_size
+        self.interval = interval
+        self.spool_dir = spool_dir
+        self.orphan_spool_seconds = orphan_spool_seconds
+        self._buffer: List[Dict[str, Any]] = []
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stopped = False
+        self._thread: Optional[threading.Thread] = None
+        metrics.callback_gauge(
+            "payment_audit_events_buffered", "Eventos de auditoría en memoria esperando el siguiente flush",
+            lambda: [({}, len(self._buffer))]
+        )
+        atexit.register(self.shutdown)
+
+    @property
+    def spool_path(self) -> str:
+        return os.path.join(self.spool_dir, f"audit_spool.{os.getpid()}.ndjson")
+
+    def record(self, payment_intent_id: str, user_id: int, from_status: Optional[str], to_status: str,
+               amount: Optional[float], currency: Optional[str], source: str):
+        """Registrar una transición de status (se escribe en el siguiente flush)"""
+        if not self.enabled:
+            return
+        event = {
+            "event_id": str(uuid.uuid4()),
+            "stripe_payment_intent_id": payment_intent_id,
+            "user_id": user_id,
+            "from_status": from_status,
+            "to_status": to_status,
+            "amount": amount,
+            "currency": currency,
+            "source": source,
+            "occurred_at": datetime.utcnow(),
+        }
+        with self._lock:
+            self._buffer.append(event)
+            size = len(self._buffer)
+            if self._thread is None and not self._stopped:
+                self._thread = threading.Thread(target=self._run, name="audit-writer", daemon=True)
+                self._thread.start()
+        if size >= self.batch_size:
+            self._wake.set()
+
+    def pending(self, payment_intent_id: str) -> List[Dict[str, Any]]:
+        """Eventos de un pago que todavía no se escriben (para leer lo propio)"""
+        with self._lock:
+            return [dict(event) for event in self._buffer if event["stripe_payment_intent_id"] == payment_intent_id]
+
+    def _run(self):
+        while not self._stopped:
+            self._wake.wait(self.interval)
+            self._wake.clear()
+            self.flush()
+
+    # Escritura
+    def _insert(self, events: List[Dict[str, Any]], replayed: bool) -> int:
+        """INSERT de varias filas por shard; con replayed se omiten los event_id ya escritos"""
+        by_shard: Dict[str, List[Dict[str, Any]]] = defaultdict(list)
+        for event in events:
+            by_shard[shard_for_user(event["user_id"])].append(event)
+
+        table = PaymentAuditEvent.__table__
+        written = 0
+        db = SessionLocal()
+        try:
+            for shard_id, rows in by_shard.items():
+                if replayed:
+                    existing = set(db.scalars(
+                        select(table.c.event_id).where(table.c.event_id.in_([row["event_id"] for row in rows])),
+                        bind_arguments={"shard_id": shard_id}
+                    ))
+                    rows = [row for row in rows if row["event_id"] not in existing]
+                if rows:
+                    db.execute(insert(table), rows, bind_arguments={"shard_id": shard_id})
+                    db.commit()
+                    written += len(rows)
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+        return written
+
+    def _spool(self, events: List[Dict[str, Any]]):
+        os.makedirs(self.spool_dir, exist_ok=True)
+        with open(self.spool_path, "a", encoding="utf-8") as f:
+            f.write("".join(_to_json(event) + "\n" for event in events))
+            f.flush()
+            os.fsync(f.fileno())
+        audit_events_spooled.inc(len(events))
+
+    def _claim_spools(self) -> List[str]:
+        """El spool propio y los de procesos que ya no escriben (renombrados para que nadie más los tome)"""
+        claimed = []
+        now = time.time()
+        for path in glob.glob(os.path.join(self.spool_dir, "audit_spool.*.ndjson")):
+            if path != self.spool_path and now - os.path.getmtime(path) < self.orphan_spool_seconds:
+                continue
+            claim = f"{path}.{os.getpid()}.replay"
+            try:
+                os.replace(path, claim)
+            except FileNotFoundError:
+                continue  # Otro worker lo tomó primero
+            claimed.append(claim)
+        return claimed + glob.glob(os.path.join(self.spool_dir, f"*.{os.getpid()}.replay"))
+
+    def _quarantine(self, path: str, error: Exception):
+        bad_path = f"{path}.{time.time_ns()}.bad"
+        os.replace(path, bad_path)
+        audit_spools_quarantined.inc()
+        logger.error(f"Audit spool {path} cannot be replayed, moved to {bad_path}: {error}")
+
+    def _replay_spools(self):
+        """Reinsertar los spools; un error de conexión detiene el replay hasta el siguiente flush"""
+        if not os.path.isdir(self.spool_dir):
+            return
+        for path in sorted(set(self._claim_spools())):
+            try:
+                with open(path, encoding="utf-8") as f:
+                    events = [_from_json(line) for line in f if line.strip()]
+            except (ValueError, KeyError, TypeError) as e:
+                self._quarantine(path, e)
+                continue
+            try:
+                written = self._insert(events, replayed=True)
+            except CONNECTIVITY_ERRORS:
+                raise
+            except exc.SQLAlchemyError as e:
+                self._quarantine(path, e)
+                continue
+            os.remove(path)
+            audit_events_written.inc(written)
+            logger.info(f"Replayed {len(events)} spooled audit events from {path} ({written} new)")
+
+    def flush(self) -> int:
+        """
+        Insertar los eventos pendientes; si falla quedan en el spool. Regresa los escritos
+        Después reintenta los spools: una falla del replay no afecta a los eventos nuevos
+        """
+        with self._flush_lock:
+            with self._lock:
+                events, self._buffer = self._buffer, []
+            written = 0
+            if events:
+                try:
+                    written = self._insert(events, replayed=False)
+                except Exception as e:
+                    self._spool(events)
+                    logger.error(f"Audit flush failed, {len(events)} events spooled to {self.spool_path}: {e}")
+                    return 0
+                audit_events_written.inc(written)
+            try:
+                self._replay_spools()
+            except Exception as e:
+                logger.warning(f"Audit spool replay failed, retrying on the next flush: {e}")
+            return written
+
+    def shutdown(self):
+        """Último flush antes de salir (lifespan / atexit)"""
+        self._stopped = True
+        self._wake.set()
+        thread = self._thread
+        if thread is not None and thread is not threading.current_thread():
+            thread.join(timeout=self.interval + 5)
+        self.flush()
+
+
+def get_payment_history(db: Session, payment_intent_id: str, user_id: int) -> List[Dict[str, Any]]:
+    """
+    Historial de status de un pago, del más antiguo al más reciente
+    Usa el índice (stripe_payment_intent_id, occurred_at); user_id enruta al shard
+    Incluye los eventos de este worker que todavía no se escriben
+    """
+    rows = db.query(PaymentAuditEvent).filter(
+        PaymentAuditEvent.stripe_payment_intent_id == payment_intent_id,
+        PaymentAuditEvent.user_id == user_id
+    ).order_by(PaymentAuditEvent.occurred_at, PaymentAuditEvent.id).all()
+
+    columns = [column.name for column in PaymentAuditEvent.__table__.columns if column.name != "id"]
+    events = [{column: getattr(row, column) for column in columns} for row in rows]
+    written = {event["event_id"] for event in events}
+    events += [
+        event for event in audit_writer.pending(payment_intent_id)
+        if event["user_id"] == user_id and event["event_id"] not in written
+    ]
+    return sorted(events, key=lambda event: event["occurred_at"])
+
+
+# Instancia global del escritor de auditoría
+audit_writer = AuditWriter(
+    enabled=AuditConfig.ENABLED,
+    batch_size=AuditConfig.BATCH_SIZE,
+    interval=AuditConfig.FLUSH_INTERVAL_SECONDS,
+    spool_dir=AuditConfig.SPOOL_DIR,
+    orphan_spool_seconds=AuditConfig.ORPHAN_SPOOL_SECONDS,
+)
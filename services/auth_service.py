@@ -1,7 +1,16 @@
 from passlib.context import CryptContext
+from sqlalchemy import update
 from sqlalchemy.orm import Session
+from fastapi import BackgroundTasks
+from typing import Optional
 from models import User
 from schemas.user import UserCreate
+from database import SessionLocal
+from services import user_directory
+from config.auth_config import AuthConfig
+from utils.cache import cache
+from utils.tracing import tracer
+import logging
 from jose import jwt, JWTError
 from datetime import datetime, timedelta
 import secrets
@@ -12,7 +21,15 @@ from email.mime.multipart import MIMEMultipart
 SECRET_KEY = "your_secret_key"
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 720
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+pwd_context = CryptContext(
+    schemes=["bcrypt"],
+    deprecated="auto",
+    bcrypt__rounds=AuthConfig.BCRYPT_ROUNDS,
+    bcrypt__min_rounds=AuthConfig.BCRYPT_MIN_ROUNDS,
+    bcrypt__max_rounds=AuthConfig.BCRYPT_MAX_ROUNDS,
+)
+
+logger = logging.getLogger(__name__)
 
 # Configuración de email - Hostinger SMTP
 SMTP_SERVER = "smtp.hostinger.com"
@@ -23,22 +40,65 @@ FRONTEND_URL = "http://localhost:4200"
 
 # User helpers
 def get_user_by_email(db: Session, email: str):
+    # El directorio global dice el id (y con él el shard) del usuario
+    entry = user_directory.lookup(db, email)
+    if entry is not None:
+        return db.query(User).filter(User.id == entry.id, User.email == email).first()
+    # Usuarios que todavía no están en el directorio: buscar en todos los shards
     return db.query(User).filter(User.email == email).first()
 
 def create_user(db: Session, user: UserCreate):
     hashed_password = pwd_context.hash(user.password)
-    db_user = User(name=user.name, last_name=user.last_name, email=user.email, password=hashed_password)
+    # El id lo asigna el directorio global; el usuario se guarda en el shard de ese id
+    user_id = user_directory.allocate_user_id(db, user.email)
+    db_user = User(id=user_id, name=user.name, last_name=user.last_name, email=user.email, password=hashed_password)
     db.add(db_user)
-    db.commit()
+    try:
+        db.commit()
+    except Exception:
+        db.rollback()
+        user_directory.release(db, user.email)
+        raise
     db.refresh(db_user)
     return db_user
 
-def authenticate_user(db: Session, email: str, password: str):
+def authenticate_user(db: Session, email: str, password: str,
+                      background_tasks: Optional[BackgroundTasks] = None):
     user = get_user_by_email(db, email)
     if not user or not pwd_context.verify(password, user.password):
         return None
+    # Si el costo del hash no cumple la política, rehashear después de responder
+    if background_tasks is not None and pwd_context.needs_update(user.password):
+        background_tasks.add_task(rehash_password, user.id, user.password, password)
     return user
 
+def rehash_password(user_id: int, old_hash: str, password: str):
+    """
+    Volver a hashear la contraseña con el costo configurado (se ejecuta fuera de la petición)
+    Sólo se escribe si el hash no cambió mientras tanto (ej: un reset de contraseña)
+    """
+    db = SessionLocal()
+    try:
+        new_hash = pwd_context.hash(password)
+        result = db.execute(
+            update(User)
+            .where(User.id == user_id, User.password == old_hash)
+            .values(password=new_hash)
+        )
+        db.commit()
+        if result.rowcount == 1:
+            invalidate_user_cache(user_id)
+            logger.info(f"Password rehashed for user {user_id} with {AuthConfig.BCRYPT_ROUNDS} rounds")
+    except Exception as e:
+        db.rollback()
+        logger.error(f"Error rehashing password for user {user_id}: {e}")
+    finally:
+        db.close()
+
+def invalidate_user_cache(user_id: int):
+    """Llamar después de cada escritura en users (get_current_user cachea al usuario)"""
+    cache.invalidate(f"user:{user_id}")
+
 def verify_access_token(token: str, db: Session):
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
@@ -98,6 +158,7 @@ def create_password_reset_token(db: Session, email: str):
     user.reset_token = token
     user.reset_token_expires = expires_at
     db.commit()
+    invalidate_user_cache(user.id)
     
     return token
 
@@ -116,8 +177,10 @@ def reset_user_password(db: Session, token: str, new_password: str):
     user.reset_token = None
     user.reset_token_expires = None
     db.commit()
+    invalidate_user_cache(user.id)
     return True
 
+@tracer.traced("smtp send_password_reset_email", kind="client")
 def send_password_reset_email(email: str, token: str):
     """
     Envía un email con el enlace para resetear la contraseña
@@ -0,0 +1,73 @@
+import logging
+from typing import Any, Callable, Dict, Optional, Sequence
+
+from sqlalchemy import inspect, update
+from sqlalchemy.orm import Session
+
+logger = logging.getLogger(__name__)
+
+# Control de concurrencia optimista: cada fila versionada tiene una columna
+# `version` y las escrituras son UPDATE ... WHERE id = ? AND version = ?.
+# Si otra petición ganó la carrera el UPDATE no afecta filas y se reintenta
+# con una lectura nueva, sin SELECT ... FOR UPDATE ni locks retenidos.
+
+
+class ConcurrencyConflict(Exception):
+    """La fila cambió entre la lectura y la escritura"""
+
+
+def compare_and_swap(db: Session, model, row_id: int, expected_version: int,
+                     values: Dict[str, Any], shard_id: Optional[str] = None) -> bool:
+    """
+    Aplicar `values` sólo si la fila sigue en `expected_version`
+    shard_id: shard de donde se leyó la fila (el UPDATE no trae filtro por usuario)
+    """
+    result = db.execute(
+        update(model)
+        .where(model.id == row_id, model.version == expected_version)
+        .values(**values, version=model.version + 1)
+        .execution_options(synchronize_session=False),
+        bind_arguments={"shard_id": shard_id} if shard_id else None
+    )
+    return result.rowcount == 1
+
+
+def update_with_retry(db: Session, model, criteria: Sequence[Any],
+                      build_values: Callable[[Any], Optional[Dict[str, Any]]],
+                      after_swap: Optional[Callable[[Session, Any, Dict[str, Any]], None]] = None,
+                      expected_version: Optional[int] = None,
+                      max_attempts: int = 5):
+    """
+    Leer la fila, calcular los cambios y escribirlos con compare-and-swap
+
+    - build_values(row) regresa los campos a cambiar, o None si no hay nada que hacer
+    - after_swap(db, row, values) corre en la misma transacción que el UPDATE
+      (row todavía tiene los valores anteriores)
+    - con expected_version no se reintenta: el cliente debe volver a leer
+
+    Hace commit y regresa la fila, o None si no existe
+    """
+    for attempt in range(1, max_attempts + 1):
+        row = db.query(model).filter(*criteria).populate_existing().first()
+        if row is None:
+            return None
+        if expected_version is not None and row.version != expected_version:
+            raise ConcurrencyConflict(f"{model.__name__} {row.id} está en la versión {row.version}")
+
+        values = build_values(row)
+        if not values:
+            return row
+
+        if compare_and_swap(db, model, row.id, row.version, values, inspect(row).identity_token):
+            if after_swap is not None:
+                after_swap(db, row, values)
+            db.commit()
+            return row
+
+        # Otro escritor ganó: terminar la transacción para leer la versión nueva
+        db.rollback()
+        if expected_version is not None:
+            raise ConcurrencyConflict(f"{model.__name__} {row.id} fue modificado por otra petición")
+        logger.info(f"Optimistic lock conflict on {model.__name__} {row.id} (attempt {attempt})")
+
+    raise ConcurrencyConflict(f"{model.__name__}: demasiados conflictos de concurrencia")
@@ -0,0 +1,180 @@
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+import stripe
+from fastapi import HTTPException
+from sqlalchemy import bindparam, select, update
+from sqlalchemy.orm import Session
+
+from config.expiry_config import ExpiryConfig
+from database import shard_ids, shard_session
+from models import Payment
+from services import payment_state
+from services.resilience import TokenBucket
+from services.stripe_service import STRIPE_OUTAGE_ERRORS, stripe_service
+from utils.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# Los OXXO que nadie paga y las transferencias abandonadas se quedaban en
+# "pending" para siempre. Cada pago guarda su expires_at y un hilo barre por
+# bloques el índice (status, expires_at): cancela el intent en Stripe y marca los
+# pagos como "expired" con un UPDATE por bloque. No depende de que lleguen
+# webhooks: si Stripe dice que el intent ya se pagó, el pago queda "succeeded".
+
+payments_expired = metrics.counter(
+    "payment_expiry_processed_total", "Pagos vencidos revisados por el barrido, por resultado"
+)
+
+
+class ExpirySweeper:
+    """
+    Barrido periódico de pagos vencidos
+
+    - Cada `interval` segundos recorre los shards por bloques de `batch_size`
+    - Las cancelaciones en Stripe van en paralelo con un tope por segundo
+    - Si Stripe no está disponible el bloque se deja para el siguiente barrido
+    """
+
+    def __init__(self, interval: float, batch_size: int, concurrency: int, rate_per_second: float,
+                 cancel_in_stripe: bool):
+        self.interval = interval
+        self.batch_size = batch_size
+        self.concurrency = concurrency
+        self.cancel_in_stripe = cancel_in_stripe
+        self.limiter = TokenBucket(rate_per_second)
+        self.last_sweep_at: Optional[datetime] = None
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._run, name="payment-expiry", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.interval)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.sweep()
+            except Exception:
+                logger.exception("Payment expiry sweep failed")
+
+    def sweep(self) -> Dict[str, int]:
+        """Vencer todos los pagos atrasados; regresa cuántos hubo por resultado"""
+        started = time.perf_counter()
+        totals: Dict[str, int] = {}
+        with ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="payment-expiry") as executor:
+            for shard_id in shard_ids():
+                while not self._stop.is_set():
+                    db = shard_session(shard_id)
+                    try:
+                        counts = self._sweep_batch(db, executor)
+                    finally:
+                        db.close()
+                    for result, count in counts.items():
+                        totals[result] = totals.get(result, 0) + count
+                    # Un bloque incompleto o con Stripe caído: seguir en el siguiente barrido
+                    if sum(counts.values()) < self.batch_size or counts.get("retry"):
+                        break
+        self.last_sweep_at = datetime.utcnow()
+        if totals:
+            logger.info(f"Payment expiry sweep in {time.perf_counter() - started:.2f}s: {totals}")
+        return totals
+
+    def _sweep_batch(self, db: Session, executor: ThreadPoolExecutor) -> Dict[str, int]:
+        now = datetime.utcnow()
+        rows = db.execute(
+            select(Payment.stripe_payment_intent_id)
+            .where(Payment.status.in_(payment_state.OPEN_STATUSES), Payment.expires_at <= now)
+            .order_by(Payment.expires_at)
+            .limit(self.batch_size)
+        ).all()
+        if not rows:
+            return {}
+
+        intent_ids = [intent_id for (intent_id,) in rows]
+        if self.cancel_in_stripe:
+            outcomes = list(executor.map(self._cancel, intent_ids))
+        else:
+            outcomes = ["expired"] * len(intent_ids)
+
+        by_outcome: Dict[str, List[str]] = {}
+        for intent_id, outcome in zip(intent_ids, outcomes):
+            by_outcome.setdefault(outcome, []).append(intent_id)
+
+        for outcome in ("expired", "succeeded"):
+            if by_outcome.get(outcome):
+                payment_state.transition_payments_status(db, by_outcome[outcome], outcome, "expiry_sweep")
+        if by_outcome.get("recheck"):
+            self._postpone(db, by_outcome["recheck"])
+
+        counts = {outcome: len(ids) for outcome, ids in by_outcome.items()}
+        for outcome, count in counts.items():
+            payments_expired.inc(count, result=outcome)
+        return counts
+
+    def _cancel(self, payment_intent_id: str) -> str:
+        """
+        Cancelar el intent en Stripe; regresa el status local que le toca:
+        expired, succeeded, recheck (en proceso o error de Stripe que no es una caída)
+        o retry (Stripe no disponible; detiene el barrido del shard hasta el siguiente)
+        """
+        self.limiter.acquire()
+        try:
+            stripe_service.cancel_payment_intent(payment_intent_id)
+            return "expired"
+        except (HTTPException, *STRIPE_OUTAGE_ERRORS) as e:
+            logger.warning(f"Could not cancel expired intent {payment_intent_id}: {e}")
+            return "retry"
+        except stripe.error.StripeError as e:
+            # Ya no se puede cancelar (ej: se pagó o ya estaba cancelado): ver cómo quedó
+            logger.info(f"Expired intent {payment_intent_id} not cancelable ({getattr(e, 'code', None)}), checking status")
+
+        try:
+            status = stripe_service.retrieve_payment_intent(payment_intent_id).status
+        except (HTTPException, *STRIPE_OUTAGE_ERRORS) as e:
+            logger.warning(f"Could not retrieve expired intent {payment_intent_id}: {e}")
+            return "retry"
+        except stripe.error.StripeError as e:
+            # Errores permanentes: no deben detener el barrido del shard
+            if getattr(e, "code", None) == "resource_missing":
+                logger.warning(f"Expired intent {payment_intent_id} does not exist in Stripe, expiring it")
+                return "expired"
+            logger.warning(f"Could not retrieve expired intent {payment_intent_id}, rechecking later: {e}")
+            return "recheck"
+        if status == "succeeded":
+            return "succeeded"
+        if status == "canceled":
+            return "expired"
+        return "recheck"
+
+    def _postpone(self, db: Session, payment_intent_ids: List[str]):
+        """Intents que Stripe todavía procesa: revisarlos más tarde"""
+        table = Payment.__table__
+        db.execute(
+            update(table).where(table.c.stripe_payment_intent_id == bindparam("intent_id"))
+            .values(expires_at=datetime.utcnow() + timedelta(minutes=ExpiryConfig.RECHECK_MINUTES)),
+            [{"intent_id": intent_id} for intent_id in payment_intent_ids]
+        )
+        db.commit()
+
+
+# Instancia global; cada worker barre (las transiciones usan compare-and-swap,
+# así que dos barridos al mismo tiempo no pisan los cambios del otro)
+expiry_sweeper = ExpirySweeper(
+    interval=ExpiryConfig.INTERVAL_SECONDS,
+    batch_size=ExpiryConfig.BATCH_SIZE,
+    concurrency=ExpiryConfig.CONCURRENCY,
+    rate_per_second=ExpiryConfig.RATE_PER_SECOND,
+    cancel_in_stripe=ExpiryConfig.CANCEL_IN_STRIPE,
+)
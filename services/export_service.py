@@ -0,0 +1,97 @@
+import csv
+import io
+import json
+import logging
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from typing import Iterator, Optional
+
+from sqlalchemy import select
+
+from database import SessionLocal, shard_ids
+from models import Payment, User
+
+logger = logging.getLogger(__name__)
+
+EXPORT_FORMATS = {
+    "csv": "text/csv",
+    "ndjson": "application/x-ndjson",
+}
+
+EXPORT_COLUMNS = [
+    Payment.id, Payment.stripe_payment_intent_id, Payment.stripe_customer_id,
+    Payment.amount, Payment.currency, Payment.status, Payment.description,
+    Payment.payment_method_types, Payment.created_at, Payment.updated_at,
+    Payment.user_id, User.email.label("user_email"), User.name.label("user_name"),
+    User.last_name.label("user_last_name"),
+]
+
+
+def _export_statement(date_from: Optional[date], date_to: Optional[date], status: Optional[str]):
+    stmt = select(*EXPORT_COLUMNS).join(User, User.id == Payment.user_id).order_by(Payment.id)
+    if date_from is not None:
+        stmt = stmt.where(Payment.created_at >= date_from)
+    if date_to is not None:
+        stmt = stmt.where(Payment.created_at < date_to + timedelta(days=1))
+    if status is not None:
+        stmt = stmt.where(Payment.status == status)
+    return stmt
+
+
+def _json_value(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return str(value)
+    return value
+
+
+def iter_payments_export(export_format: str, date_from: Optional[date] = None,
+                         date_to: Optional[date] = None, status: Optional[str] = None,
+                         chunk_size: int = 1000) -> Iterator[str]:
+    """
+    Generar el export de pagos por bloques de texto
+
+    Usa su propia conexión con cursor del lado del servidor (stream_results),
+    así la memoria depende de chunk_size y no del número de filas. No usa la
+    sesión de la petición porque el generador sigue corriendo después de que
+    el endpoint regresa. Los shards se exportan uno después del otro (cada
+    uno ordenado por id).
+    """
+    stmt = _export_statement(date_from, date_to, status)
+    names = [column.name for column in EXPORT_COLUMNS]
+    exported = 0
+
+    db = SessionLocal()
+
+    def partitions():
+        for shard_id in shard_ids():
+            connection = db.connection(
+                bind_arguments={"shard_id": shard_id},
+                execution_options={"stream_results": True, "yield_per": chunk_size}
+            )
+            yield from connection.execute(stmt).partitions(chunk_size)
+
+    try:
+        if export_format == "csv":
+            buffer = io.StringIO()
+            writer = csv.writer(buffer)
+            writer.writerow(names)
+            for rows in partitions():
+                writer.writerows(rows)
+                exported += len(rows)
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate(0)
+            if buffer.tell():
+                yield buffer.getvalue()
+        else:
+            for rows in partitions():
+                exported += len(rows)
+                yield "".join(
+                    json.dumps({name: _json_value(value) for name, value in zip(names, row)}) + "\n"
+                    for row in rows
+                )
+    finally:
+        db.close()
+        logger.info(f"Payments export ({export_format}) finished: {exported} rows")
@@ -0,0 +1,135 @@
+import hashlib
+import logging
+import os
+import re
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+logger = logging.getLogger(__name__)
+
+# Migraciones SQL versionadas: migrations/NNNN_descripcion.sql (sintaxis MySQL).
+# Las aplicadas se registran en schema_migrations. MySQL hace commit implícito
+# con cada DDL, así que una migración que falla a la mitad se corrige a mano y
+# se vuelve a correr; por eso cada archivo debe ser pequeño.
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "migrations")
+MIGRATION_FILE = re.compile(r"^(\d{4})_([a-z0-9_]+)\.sql$")
+
+
+class Migration:
+    def __init__(self, version: str, name: str, path: str):
+        self.version = version
+        self.name = name
+        self.path = path
+
+    @property
+    def sql(self) -> str:
+        with open(self.path, encoding="utf-8") as f:
+            return f.read()
+
+    @property
+    def checksum(self) -> str:
+        return hashlib.sha256(self.sql.encode("utf-8")).hexdigest()
+
+    def statements(self) -> List[str]:
+        """Sentencias del archivo (separadas por ';' al final de línea, sin comentarios --)"""
+        lines = [line for line in self.sql.splitlines() if not line.strip().startswith("--")]
+        return [statement.strip() for statement in re.split(r";\s*$", "\n".join(lines), flags=re.M)
+                if statement.strip()]
+
+
+def list_migrations(directory: str = MIGRATIONS_DIR) -> List[Migration]:
+    migrations = []
+    for filename in sorted(os.listdir(directory)):
+        match = MIGRATION_FILE.match(filename)
+        if match:
+            migrations.append(Migration(match.group(1), match.group(2), os.path.join(directory, filename)))
+    versions = [migration.version for migration in migrations]
+    if len(versions) != len(set(versions)):
+        raise RuntimeError("Hay dos migraciones con el mismo número de versión")
+    return migrations
+
+
+def ensure_migrations_table(db: Session):
+    db.execute(text(
+        "CREATE TABLE IF NOT EXISTS schema_migrations ("
+        " version VARCHAR(20) NOT NULL PRIMARY KEY,"
+        " name VARCHAR(255) NOT NULL,"
+        " checksum VARCHAR(64) NOT NULL,"
+        " applied_at DATETIME NOT NULL)"
+    ))
+    db.commit()
+
+
+def applied_migrations(db: Session) -> Dict[str, Dict[str, str]]:
+    ensure_migrations_table(db)
+    rows = db.execute(text("SELECT version, name, checksum FROM schema_migrations")).all()
+    return {version: {"name": name, "checksum": checksum} for version, name, checksum in rows}
+
+
+def _record(db: Session, migration: Migration):
+    db.execute(
+        text("INSERT INTO schema_migrations (version, name, checksum, applied_at) "
+             "VALUES (:version, :name, :checksum, :applied_at)"),
+        {"version": migration.version, "name": migration.name,
+         "checksum": migration.checksum, "applied_at": datetime.utcnow()}
+    )
+    db.commit()
+
+
+def status(db: Session) -> List[Dict[str, object]]:
+    """Estado de cada migración: aplicada, pendiente o modificada después de aplicarse"""
+    applied = applied_migrations(db)
+    result = []
+    for migration in list_migrations():
+        record = applied.get(migration.version)
+        if record is None:
+            state = "pending"
+        elif record["checksum"] != migration.checksum:
+            state = "modified"
+        else:
+            state = "applied"
+        result.append({"version": migration.version, "name": migration.name, "state": state})
+    return result
+
+
+def upgrade(db: Session, target: Optional[str] = None) -> List[Migration]:
+    """Aplicar en orden las migraciones pendientes (hasta `target` inclusive)"""
+    applied = applied_migrations(db)
+    done = []
+    for migration in list_migrations():
+        if target is not None and migration.version > target:
+            break
+        if migration.version in applied:
+            continue
+        for statement in migration.statements():
+            try:
+                db.execute(text(statement))
+            except Exception as e:
+                db.rollback()
+                raise RuntimeError(f"Migración {migration.version}_{migration.name} falló en:\n"
+                                   f"{statement}\n{e}") from e
+        db.commit()
+        _record(db, migration)
+        logger.info(f"Applied migration {migration.version}_{migration.name}")
+        done.append(migration)
+    return done
+
+
+def baseline(db: Session, target: Optional[str] = None) -> List[Migration]:
+    """
+    Marcar como aplicadas, sin ejecutarlas, las migraciones hasta `target`
+    Para bases creadas con create_all o donde los ALTER de create.sql ya se corrieron a mano
+    """
+    applied = applied_migrations(db)
+    marked = []
+    for migration in list_migrations():
+        if target is not None and migration.version > target:
+            break
+        if migration.version not in applied:
+            _record(db, migration)
+            marked.append(migration)
+    return marked
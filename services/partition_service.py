@@ -0,0 +1,322 @@
+import gzip
+import hashlib
+import json
+import logging
+import os
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import delete, func, insert, select, text
+from sqlalchemy.orm import Session
+
+from models import Payment
+
+logger = logging.getLogger(__name__)
+
+# Particionado mensual de `payments` por RANGE COLUMNS(created_at) en MySQL.
+# La partición pYYYYMM contiene los pagos de ese mes; pmax recibe los futuros.
+# Restricciones de MySQL para tablas particionadas que el DDL resuelve:
+#   - toda llave única debe incluir created_at: la PK pasa a (id, created_at) y
+#     el índice de stripe_payment_intent_id deja de ser UNIQUE. La unicidad se
+#     conserva con la tabla payment_intent_keys (PK = stripe_payment_intent_id,
+#     sin particionar) que mantienen triggers de payments: un intent repetido
+#     falla el INSERT igual que con el índice único
+#   - InnoDB no soporta llaves foráneas en tablas particionadas: se quita la
+#     FK payments.user_id -> users.id (los usuarios nunca se borran; los pagos
+#     se crean siempre para un usuario que ya existe en el mismo shard)
+#   - created_at pasa a NOT NULL: antes se llenan los NULL con updated_at
+# models.py sigue describiendo la tabla sin particionar (create_all y migrations/)
+
+PAYMENTS_TABLE = Payment.__tablename__
+INTENT_KEYS_TABLE = "payment_intent_keys"
+MAX_PARTITION = "pmax"
+
+
+def _month_start(year: int, month: int) -> date:
+    return date(year, month, 1)
+
+
+def _next_month(day: date) -> date:
+    return date(day.year + 1, 1, 1) if day.month == 12 else date(day.year, day.month + 1, 1)
+
+
+def partition_name(month_start: date) -> str:
+    return f"p{month_start.year:04d}{month_start.month:02d}"
+
+
+def _partition_clause(month_start: date) -> str:
+    return (f"PARTITION {partition_name(month_start)} "
+            f"VALUES LESS THAN ('{_next_month(month_start).isoformat()}')")
+
+
+def _months(first: date, last: date) -> List[date]:
+    months, current = [], first
+    while current <= last:
+        months.append(current)
+        current = _next_month(current)
+    return months
+
+
+def _require_mysql(db: Session):
+    dialect = db.get_bind(Payment).dialect.name
+    if dialect != "mysql":
+        raise RuntimeError(f"El particionado sólo está soportado en MySQL (dialecto actual: {dialect})")
+
+
+def list_partitions(db: Session) -> List[Dict[str, Any]]:
+    """Particiones actuales de payments (vacío si la tabla no está particionada)"""
+    _require_mysql(db)
+    rows = db.execute(text(
+        "SELECT PARTITION_NAME, PARTITION_DESCRIPTION, TABLE_ROWS "
+        "FROM information_schema.PARTITIONS "
+        "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = :table AND PARTITION_NAME IS NOT NULL "
+        "ORDER BY PARTITION_ORDINAL_POSITION"
+    ), {"table": PAYMENTS_TABLE}).all()
+    return [{"name": name, "less_than": description, "approx_rows": table_rows}
+            for name, description, table_rows in rows]
+
+
+def partitioning_ddl(db: Session, months_ahead: int = 3) -> List[str]:
+    """
+    Sentencias para convertir payments en tabla particionada por mes
+    Crea una partición por cada mes desde el pago más antiguo hasta months_ahead
+    """
+    _require_mysql(db)
+    oldest = db.query(func.min(func.coalesce(Payment.created_at, Payment.updated_at))).scalar() or datetime.utcnow()
+    first = _month_start(oldest.year, oldest.month)
+    last = _month_start(datetime.utcnow().year, datetime.utcnow().month)
+    for _ in range(months_ahead):
+        last = _next_month(last)
+
+    statements = []
+    foreign_keys = db.execute(text(
+        "SELECT CONSTRAINT_NAME FROM information_schema.REFERENTIAL_CONSTRAINTS "
+        "WHERE CONSTRAINT_SCHEMA = DATABASE() AND TABLE_NAME = :table"
+    ), {"table": PAYMENTS_TABLE}).scalars().all()
+    for constraint in foreign_keys:
+        statements.append(f"ALTER TABLE {PAYMENTS_TABLE} DROP FOREIGN KEY {constraint}")
+
+    statements.extend(_intent_keys_ddl())
+    statements.append(
+        f"UPDATE {PAYMENTS_TABLE} SET created_at = COALESCE(updated_at, UTC_TIMESTAMP()) "
+        "WHERE created_at IS NULL"
+    )
+    statements.append(
+        f"ALTER TABLE {PAYMENTS_TABLE} "
+        "MODIFY created_at DATETIME NOT NULL, "
+        "DROP PRIMARY KEY, ADD PRIMARY KEY (id, created_at), "
+        "DROP INDEX ix_payments_stripe_payment_intent_id, "
+        "ADD INDEX ix_payments_stripe_payment_intent_id (stripe_payment_intent_id)"
+    )
+    partitions = [_partition_clause(month) for month in _months(first, last)]
+    partitions.append(f"PARTITION {MAX_PARTITION} VALUES LESS THAN (MAXVALUE)")
+    statements.append(
+        f"ALTER TABLE {PAYMENTS_TABLE} PARTITION BY RANGE COLUMNS(created_at) (\n    "
+        + ",\n    ".join(partitions) + "\n)"
+    )
+    return statements
+
+
+def _intent_keys_ddl() -> List[str]:
+    """
+    Tabla y triggers que mantienen único stripe_payment_intent_id sin índice UNIQUE
+    Los triggers se crean antes de copiar las llaves existentes para no perder
+    los pagos que se inserten mientras tanto
+    """
+    key = "stripe_payment_intent_id"
+    return [
+        f"CREATE TABLE IF NOT EXISTS {INTENT_KEYS_TABLE} ("
+        f"{key} VARCHAR(255) NOT NULL PRIMARY KEY, "
+        "created_at DATETIME NOT NULL, "
+        f"INDEX ix_{INTENT_KEYS_TABLE}_created (created_at))",
+        f"CREATE TRIGGER trg_{PAYMENTS_TABLE}_intent_key_insert AFTER INSERT ON {PAYMENTS_TABLE} "
+        f"FOR EACH ROW BEGIN IF NEW.{key} IS NOT NULL THEN "
+        f"INSERT INTO {INTENT_KEYS_TABLE} ({key}, created_at) "
+        f"VALUES (NEW.{key}, COALESCE(NEW.created_at, UTC_TIMESTAMP())); END IF; END",
+        f"CREATE TRIGGER trg_{PAYMENTS_TABLE}_intent_key_update AFTER UPDATE ON {PAYMENTS_TABLE} "
+        f"FOR EACH ROW BEGIN IF NOT (NEW.{key} <=> OLD.{key}) THEN "
+        f"DELETE FROM {INTENT_KEYS_TABLE} WHERE {key} = OLD.{key}; "
+        f"IF NEW.{key} IS NOT NULL THEN INSERT INTO {INTENT_KEYS_TABLE} ({key}, created_at) "
+        f"VALUES (NEW.{key}, COALESCE(NEW.created_at, UTC_TIMESTAMP())); END IF; END IF; END",
+        f"CREATE TRIGGER trg_{PAYMENTS_TABLE}_intent_key_delete AFTER DELETE ON {PAYMENTS_TABLE} "
+        f"FOR EACH ROW DELETE FROM {INTENT_KEYS_TABLE} WHERE {key} = OLD.{key}",
+        f"INSERT IGNORE INTO {INTENT_KEYS_TABLE} ({key}, created_at) "
+        f"SELECT {key}, COALESCE(created_at, updated_at, UTC_TIMESTAMP()) FROM {PAYMENTS_TABLE} "
+        f"WHERE {key} IS NOT NULL",
+    ]
+
+
+def _has_intent_keys(db: Session) -> bool:
+    return db.execute(text(
+        "SELECT COUNT(*) FROM information_schema.TABLES "
+        "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = :table"
+    ), {"table": INTENT_KEYS_TABLE}).scalar() > 0
+
+
+def ensure_future_partitions(db: Session, months_ahead: int = 3) -> List[str]:
+    """Separar de pmax las particiones de los próximos meses; regresa las creadas"""
+    existing = {partition["name"] for partition in list_partitions(db)}
+    if MAX_PARTITION not in existing:
+        raise RuntimeError("payments no está particionada (ejecuta el comando partition primero)")
+
+    month = _month_start(datetime.utcnow().year, datetime.utcnow().month)
+    missing = []
+    for _ in range(months_ahead + 1):
+        if partition_name(month) not in existing:
+            missing.append(month)
+        month = _next_month(month)
+
+    # Sólo se puede separar de pmax hacia adelante del último mes existente
+    existing_months = sorted(name for name in existing if name != MAX_PARTITION)
+    if existing_months:
+        missing = [m for m in missing if partition_name(m) > existing_months[-1]]
+    if not missing:
+        return []
+
+    clauses = [_partition_clause(month) for month in missing]
+    clauses.append(f"PARTITION {MAX_PARTITION} VALUES LESS THAN (MAXVALUE)")
+    db.execute(text(
+        f"ALTER TABLE {PAYMENTS_TABLE} REORGANIZE PARTITION {MAX_PARTITION} INTO ("
+        + ", ".join(clauses) + ")"
+    ))
+    return [partition_name(month) for month in missing]
+
+
+def _json_default(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return str(value)
+    raise TypeError(f"Tipo no serializable: {type(value).__name__}")
+
+
+def _month_filter(month_start: date):
+    return (Payment.created_at >= month_start, Payment.created_at < _next_month(month_start))
+
+
+def _count_lines(path: str) -> int:
+    with gzip.open(path, "rt", encoding="utf-8") as archive:
+        return sum(1 for _ in archive)
+
+
+def archive_month(db: Session, year: int, month: int, out_dir: str,
+                  drop: bool = True, chunk_size: int = 5000) -> Dict[str, Any]:
+    """
+    Exportar un mes cerrado de payments a NDJSON comprimido y quitarlo de la tabla
+
+    1. Cuenta las filas del mes
+    2. Las escribe con un cursor del lado del servidor (stream_results + yield_per)
+    3. Verifica que el archivo tenga exactamente esas filas y escribe un manifest
+    4. Elimina la partición del mes (o borra por lotes si no hay particiones)
+    """
+    month_start = _month_start(year, month)
+    if _next_month(month_start) > datetime.utcnow().date():
+        raise ValueError(f"{month_start:%Y-%m} no es un mes cerrado")
+
+    columns = [column.name for column in Payment.__table__.columns]
+    expected = db.query(func.count(Payment.id)).filter(*_month_filter(month_start)).scalar()
+
+    os.makedirs(out_dir, exist_ok=True)
+    base_name = os.path.join(out_dir, f"payments-{month_start:%Y-%m}")
+    data_path = f"{base_name}.ndjson.gz"
+    temp_path = f"{data_path}.tmp"
+
+    written = 0
+    stmt = (
+        select(*Payment.__table__.columns)
+        .where(*_month_filter(month_start))
+        .order_by(Payment.id)
+    )
+    with db.get_bind(Payment).connect() as connection:
+        result = connection.execution_options(stream_results=True, yield_per=chunk_size).execute(stmt)
+        with gzip.open(temp_path, "wt", encoding="utf-8") as archive:
+            for row in result:
+                archive.write(json.dumps(dict(zip(columns, row)), default=_json_default) + "\n")
+                written += 1
+
+    if written != expected or _count_lines(temp_path) != expected:
+        os.remove(temp_path)
+        raise RuntimeError(f"Verificación fallida para {month_start:%Y-%m}: "
+                           f"esperadas {expected}, escritas {written}")
+    os.replace(temp_path, data_path)
+
+    sha256 = hashlib.sha256()
+    with open(data_path, "rb") as archive:
+        for block in iter(lambda: archive.read(1 << 20), b""):
+            sha256.update(block)
+    manifest = {
+        "table": PAYMENTS_TABLE,
+        "month": f"{month_start:%Y-%m}",
+        "rows": expected,
+        "columns": columns,
+        "file": os.path.basename(data_path),
+        "sha256": sha256.hexdigest(),
+        "archived_at": datetime.utcnow().isoformat(),
+    }
+    with open(f"{base_name}.manifest.json", "w", encoding="utf-8") as manifest_file:
+        json.dump(manifest, manifest_file, indent=2)
+
+    if drop:
+        manifest["removed_with"] = _remove_month(db, month_start, chunk_size)
+        logger.info(f"Archived and removed {expected} payments for {month_start:%Y-%m}")
+    return manifest
+
+
+def _remove_month(db: Session, month_start: date, chunk_size: int) -> str:
+    if db.get_bind(Payment).dialect.name == "mysql":
+        partitions = {partition["name"]: partition for partition in list_partitions(db)}
+        name = partition_name(month_start)
+        if name in partitions:
+            # Una partición sólo contiene su mes: DROP es instantáneo y libera las páginas.
+            # DROP PARTITION no dispara los triggers: quitar también las llaves del mes
+            db.execute(text(f"ALTER TABLE {PAYMENTS_TABLE} DROP PARTITION {name}"))
+            if _has_intent_keys(db):
+                db.execute(text(
+                    f"DELETE FROM {INTENT_KEYS_TABLE} WHERE created_at >= :start AND created_at < :end"
+                ), {"start": month_start, "end": _next_month(month_start)})
+                db.commit()
+            return f"DROP PARTITION {name}"
+
+    removed = 0
+    while True:
+        ids = db.execute(
+            select(Payment.id).where(*_month_filter(month_start)).limit(chunk_size)
+        ).scalars().all()
+        if not ids:
+            break
+        db.execute(delete(Payment).where(Payment.id.in_(ids)).execution_options(synchronize_session=False))
+        db.commit()
+        removed += len(ids)
+    return f"DELETE ({removed} filas)"
+
+
+def restore_archive(db: Session, data_path: str, chunk_size: int = 5000) -> int:
+    """Volver a insertar en payments un archivo generado por archive_month"""
+    datetime_columns = {"created_at", "updated_at"}
+    restored = 0
+    batch: List[Dict[str, Any]] = []
+
+    def flush():
+        db.execute(insert(Payment.__table__), batch)
+        db.commit()
+        batch.clear()
+
+    with gzip.open(data_path, "rt", encoding="utf-8") as archive:
+        for line in archive:
+            row = json.loads(line)
+            for column in datetime_columns:
+                if row.get(column):
+                    row[column] = datetime.fromisoformat(row[column])
+            batch.append(row)
+            restored += 1
+            if len(batch) >= chunk_size:
+                flush()
+    if batch:
+        flush()
+    return restored
+
+
+def oldest_payment_day(db: Session) -> Optional[date]:
+    oldest = db.query(func.min(Payment.created_at)).scalar()
+    return oldest.date() if oldest else None
@@ -0,0 +1,151 @@
+import asyncio
+import json
+import logging
+import threading
+import time
+import uuid
+from typing import Any, Dict, Optional, Set
+
+from config.events_config import EventsConfig
+from utils.metrics import metrics
+
+try:
+    import redis
+except ImportError:  # redis es opcional: sin él los eventos sólo llegan al mismo worker
+    redis = None
+
+logger = logging.getLogger(__name__)
+
+events_published = metrics.counter(
+    "payment_events_published_total", "Eventos de pagos publicados a los suscriptores"
+)
+events_dropped = metrics.counter(
+    "payment_events_dropped_total", "Eventos descartados porque el suscriptor no los leía"
+)
+
+
+class Subscription:
+    """Cola de eventos de una conexión; vive en el event loop que la creó"""
+
+    def __init__(self, user_id: int, loop: asyncio.AbstractEventLoop, queue_size: int):
+        self.user_id = user_id
+        self.loop = loop
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+
+    def _put(self, event: Dict[str, Any]):
+        # Se ejecuta dentro del loop: descartar el más viejo si la cola está llena
+        if self.queue.full():
+            self.queue.get_nowait()
+            events_dropped.inc()
+        self.queue.put_nowait(event)
+
+    def deliver(self, event: Dict[str, Any]):
+        """Entregar un evento desde cualquier hilo"""
+        try:
+            self.loop.call_soon_threadsafe(self._put, event)
+        except RuntimeError:
+            pass  # El loop ya se cerró
+
+
+class PaymentEventBroker:
+    """
+    Pub/sub en memoria de eventos de pagos por usuario
+
+    Cada suscripción es sólo una asyncio.Queue acotada (sin hilos ni sesiones de
+    base de datos), así que miles de conexiones inactivas cuestan poca memoria.
+    Con Redis, publish() además reparte el evento a los demás workers.
+    """
+
+    def __init__(self, redis_url: Optional[str] = None, channel: str = "tudi:payments:events",
+                 queue_size: int = 32, max_per_user: int = 5):
+        self._subscriptions: Dict[int, Set[Subscription]] = {}
+        self._lock = threading.Lock()
+        self._queue_size = queue_size
+        self._max_per_user = max_per_user
+        self._channel = channel
+        self._origin = uuid.uuid4().hex
+        self._client = None
+        self._thread = None
+        if redis_url:
+            if redis is None:
+                raise RuntimeError("El paquete 'redis' es necesario para repartir eventos entre workers")
+            self._client = redis.Redis.from_url(redis_url, socket_connect_timeout=0.2)
+        metrics.callback_gauge(
+            "payment_events_subscriptions", "Conexiones suscritas al stream de pagos en este worker",
+            lambda: [({}, self.subscription_count())]
+        )
+
+    def subscription_count(self) -> int:
+        with self._lock:
+            return sum(len(subscriptions) for subscriptions in self._subscriptions.values())
+
+    def subscribe(self, user_id: int) -> Optional[Subscription]:
+        """Crear una suscripción en el loop actual; None si el usuario llegó al límite"""
+        subscription = Subscription(user_id, asyncio.get_running_loop(), self._queue_size)
+        with self._lock:
+            subscriptions = self._subscriptions.setdefault(user_id, set())
+            if len(subscriptions) >= self._max_per_user:
+                return None
+            subscriptions.add(subscription)
+        self._start_listener()
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        with self._lock:
+            subscriptions = self._subscriptions.get(subscription.user_id)
+            if subscriptions is not None:
+                subscriptions.discard(subscription)
+                if not subscriptions:
+                    del self._subscriptions[subscription.user_id]
+
+    def _deliver_local(self, user_id: int, event: Dict[str, Any]):
+        with self._lock:
+            subscriptions = list(self._subscriptions.get(user_id, ()))
+        for subscription in subscriptions:
+            subscription.deliver(event)
+
+    def publish(self, user_id: int, event: Dict[str, Any]):
+        """Publicar un evento para un usuario (se puede llamar desde cualquier hilo)"""
+        events_published.inc(type=event.get("type", "unknown"))
+        self._deliver_local(user_id, event)
+        if self._client is not None:
+            try:
+                message = json.dumps({"origin": self._origin, "user_id": user_id, "event": event}, default=str)
+                self._client.publish(self._channel, message)
+            except Exception as e:
+                logger.warning(f"Payment event publish to shared broker failed: {e}")
+
+    def _start_listener(self):
+        if self._client is None or self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._listen, name="payment-events", daemon=True)
+                self._thread.start()
+
+    def _listen(self):
+        while True:
+            try:
+                pubsub = self._client.pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(self._channel)
+                for message in pubsub.listen():
+                    payload = json.loads(message["data"])
+                    if payload.get("origin") != self._origin:
+                        self._deliver_local(int(payload["user_id"]), payload["event"])
+            except Exception as e:
+                logger.warning(f"Payment events listener error, reconnecting: {e}")
+                time.sleep(1)
+
+
+def format_sse(event: Dict[str, Any]) -> str:
+    """Serializar un evento en formato text/event-stream"""
+    return f"event: {event.get('type', 'message')}\ndata: {json.dumps(event, default=str)}\n\n"
+
+
+# Instancia global del broker de eventos
+payment_events = PaymentEventBroker(
+    redis_url=EventsConfig.REDIS_URL,
+    channel=EventsConfig.CHANNEL,
+    queue_size=EventsConfig.QUEUE_SIZE,
+    max_per_user=EventsConfig.MAX_SUBSCRIPTIONS_PER_USER,
+)
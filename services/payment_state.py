@@ -0,0 +1,165 @@
+import logging
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import bindparam, update
+from sqlalchemy.orm import Session
+
+from config.expiry_config import ExpiryConfig
+from models import Payment
+from services import concurrency, rollup_service
+from services.audit_service import audit_writer
+from services.payment_events import payment_events
+from utils.cache import cache
+
+logger = logging.getLogger(__name__)
+
+# Desde estos status sólo se permiten las transiciones listadas; el resto
+# (pending, requires_action, processing, failed, ...) puede cambiar libremente.
+# Evita que un webhook atrasado regrese un pago exitoso a "failed".
+FINAL_STATUS_TRANSITIONS = {
+    "succeeded": {"refunded"},
+    "canceled": set(),
+    "refunded": set(),
+    # Si Stripe confirma el pago después de vencer localmente, gana Stripe
+    "expired": {"succeeded"},
+}
+
+# Pagos esperando al cliente: son los que vencen (processing ya tiene el pago en curso)
+OPEN_STATUSES = ("pending", "requires_payment_method", "requires_confirmation", "requires_action")
+
+
+def expiry_for(method_type: Optional[str], now: Optional[datetime] = None) -> Optional[datetime]:
+    """Vencimiento de un pago nuevo según su método (None si el método no vence)"""
+    hours = ExpiryConfig.TTL_HOURS.get((method_type or "").lower())
+    if not hours:
+        return None
+    if method_type.lower() == "oxxo":
+        hours += ExpiryConfig.OXXO_GRACE_HOURS
+    return (now or datetime.utcnow()) + timedelta(hours=hours)
+
+
+def oxxo_expiry(voucher_expires_at: int) -> datetime:
+    """Vencimiento de un OXXO a partir del expires_at (unix) del voucher de Stripe"""
+    return datetime.utcfromtimestamp(voucher_expires_at) + timedelta(hours=ExpiryConfig.OXXO_GRACE_HOURS)
+
+
+def can_transition(old_status: Optional[str], new_status: str) -> bool:
+    if old_status == new_status:
+        return False
+    allowed = FINAL_STATUS_TRANSITIONS.get(old_status)
+    return allowed is None or new_status in allowed
+
+
+def invalidate_payment_cache(user_id: int, payment_intent_id: str):
+    """Borrar del cache lo que depende de los pagos del usuario"""
+    cache.invalidate(
+        f"has_paid:{user_id}",
+        f"payment_history:{user_id}",
+        f"payment:{user_id}:{payment_intent_id}"
+    )
+
+
+def transition_payment_status(db: Session, payment_intent_id: str, new_status: str,
+                              source: str = "webhook") -> Optional[Payment]:
+    """
+    Cambiar el status de un pago con compare-and-swap sobre `version`
+    El rollup diario se actualiza en la misma transacción que el cambio
+    La transición queda en la auditoría con su origen (`source`)
+    Regresa el pago, o None si no existe
+    """
+    return _transition(db, payment_intent_id, new_status, source)[0]
+
+
+def _transition(db: Session, payment_intent_id: str, new_status: str,
+                source: str) -> Tuple[Optional[Payment], bool]:
+    """transition_payment_status que además indica si el status cambió"""
+    changed = {}
+
+    def build_values(payment: Payment):
+        if not can_transition(payment.status, new_status):
+            return None
+        return {"status": new_status, "updated_at": datetime.utcnow()}
+
+    def after_swap(db: Session, payment: Payment, values):
+        changed["from"] = payment.status
+        changed["user_id"] = payment.user_id
+        changed["amount"] = payment.amount
+        changed["currency"] = payment.currency
+        rollup_service.record_status_change(db, payment, payment.status, new_status)
+
+    payment = concurrency.update_with_retry(
+        db, Payment, [Payment.stripe_payment_intent_id == payment_intent_id],
+        build_values, after_swap=after_swap
+    )
+
+    if payment is not None and changed:
+        _after_transition(
+            payment_intent_id, changed["user_id"], changed["from"], new_status,
+            changed["amount"], changed["currency"], source
+        )
+    return payment, bool(changed)
+
+
+def transition_payments_status(db: Session, payment_intent_ids: List[str], new_status: str,
+                               source: str) -> int:
+    """
+    Cambiar el status de varios pagos de un shard con un solo UPDATE (executemany)
+    Cada fila lleva su compare-and-swap sobre `version`; si alguna cambió entre la
+    lectura y la escritura se descarta el lote y se aplica pago por pago
+    La sesión debe estar fijada al shard de los pagos (shard_session / pin_shard)
+    Hace commit y regresa cuántos pagos cambiaron
+    """
+    payments = db.query(Payment).filter(
+        Payment.stripe_payment_intent_id.in_(payment_intent_ids)
+    ).populate_existing().all()
+    changing = [payment for payment in payments if can_transition(payment.status, new_status)]
+    if not changing:
+        return 0
+
+    table = Payment.__table__
+    result = db.execute(
+        update(table)
+        .where(table.c.id == bindparam("payment_id"), table.c.version == bindparam("expected_version"))
+        .values(status=new_status, updated_at=datetime.utcnow(), version=table.c.version + 1),
+        [{"payment_id": payment.id, "expected_version": payment.version} for payment in changing]
+    )
+    if result.rowcount != len(changing):
+        conflicted = [payment.stripe_payment_intent_id for payment in changing]
+        db.rollback()
+        logger.info(f"Optimistic lock conflict in batch of {len(conflicted)} payments, applying one by one")
+        return sum(_transition(db, payment_intent_id, new_status, source)[1] for payment_intent_id in conflicted)
+
+    by_status: Dict[str, List[Payment]] = defaultdict(list)
+    for payment in changing:
+        by_status[payment.status].append(payment)
+    for old_status, group in by_status.items():
+        rollup_service.record_status_changes(db, group, old_status, new_status)
+    db.commit()
+
+    for old_status, group in by_status.items():
+        for payment in group:
+            _after_transition(
+                payment.stripe_payment_intent_id, payment.user_id, old_status, new_status,
+                payment.amount, payment.currency, source
+            )
+    logger.info(f"{len(changing)} payments -> {new_status} ({source})")
+    return len(changing)
+
+
+def _after_transition(payment_intent_id: str, user_id: int, old_status: Optional[str], new_status: str,
+                      amount: Optional[float], currency: Optional[str], source: str):
+    """Efectos de un cambio de status ya confirmado: cache, auditoría y eventos"""
+    logger.info(f"Payment {payment_intent_id}: {old_status} -> {new_status}")
+    invalidate_payment_cache(user_id, payment_intent_id)
+    audit_writer.record(payment_intent_id, user_id, old_status, new_status, amount, currency, source)
+    # Avisar a las conexiones del usuario (/payments/events) en vez de que hagan polling
+    payment_events.publish(user_id, {
+        "type": "payment.status",
+        "payment_intent_id": payment_intent_id,
+        "status": new_status,
+        "previous_status": old_status,
+        "amount": amount,
+        "currency": currency,
+    })
@@ -0,0 +1,162 @@
+import logging
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, Iterable, List, Optional, Set
+
+from fastapi import HTTPException
+from sqlalchemy.orm import Session
+
+from config.cache_config import CacheConfig
+from database import SessionLocal
+from models import Product
+from schemas.stripe_schemas import ProductResponse
+from utils.cache import cache
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class ProductSnapshot:
+    """Copia inmutable de los campos de un producto necesarios para cobrar"""
+    id: int
+    name: str
+    price: float
+    currency: str
+    stripe_price_id: Optional[str]
+    is_active: bool
+    version: int
+
+    @classmethod
+    def from_model(cls, product: Product) -> "ProductSnapshot":
+        return cls(
+            id=product.id,
+            name=product.name,
+            price=product.price,
+            currency=product.currency,
+            stripe_price_id=product.stripe_price_id,
+            is_active=bool(product.is_active),
+            version=product.version or 1,
+        )
+
+
+class ProductIndex:
+    """
+    Índice en memoria id -> ProductSnapshot para calcular precios en el servidor
+
+    - La tabla completa se carga una vez por worker (es un catálogo pequeño); desde
+      ahí cada consulta es un lookup en un dict, sin ir a la base de datos
+    - Los endpoints que escriben productos actualizan el índice del worker con refresh()
+    - Los demás workers reciben la invalidación de "product:{id}" por el bus del cache
+      y recargan sólo ese producto la próxima vez que se pide
+    - Cada REFRESH_SECONDS se recarga todo por si se perdió alguna invalidación; sin
+      Redis no hay bus y el intervalo es de pocos segundos (LOCAL_REFRESH_SECONDS)
+    """
+
+    def __init__(self, refresh_seconds: int = 300):
+        self._refresh_seconds = refresh_seconds
+        self._products: Dict[int, ProductSnapshot] = {}
+        self._stale: Set[int] = set()
+        self._loaded_at: Optional[float] = None
+        self._lock = threading.Lock()
+        self._load_lock = threading.Lock()
+
+    def load(self):
+        """Cargar (o recargar) todos los productos"""
+        db = SessionLocal()
+        try:
+            products = {product.id: ProductSnapshot.from_model(product) for product in db.query(Product).all()}
+        finally:
+            db.close()
+        with self._lock:
+            self._products = products
+            self._stale.clear()
+            self._loaded_at = time.monotonic()
+        logger.info(f"Product index loaded with {len(products)} products")
+
+    def _reload_one(self, product_id: int):
+        db = SessionLocal()
+        try:
+            product = db.query(Product).filter(Product.id == product_id).first()
+        finally:
+            db.close()
+        with self._lock:
+            if product is None:
+                self._products.pop(product_id, None)
+            else:
+                self._products[product_id] = ProductSnapshot.from_model(product)
+            self._stale.discard(product_id)
+
+    def _is_stale(self) -> bool:
+        loaded_at = self._loaded_at
+        return loaded_at is None or time.monotonic() - loaded_at >= self._refresh_seconds
+
+    def _ensure_fresh(self):
+        """
+        Recargar el índice si ya venció; sólo una petición por worker hace la recarga
+        - Si el índice nunca se cargó, las demás esperan a que termine la primera carga
+        - Si ya hay datos, las demás siguen usando los anteriores mientras se recarga
+        """
+        if not self._is_stale():
+            return
+        if not self._load_lock.acquire(blocking=self._loaded_at is None):
+            return
+        try:
+            if self._is_stale():
+                self.load()
+        finally:
+            self._load_lock.release()
+
+    def get(self, product_id: int) -> Optional[ProductSnapshot]:
+        """Snapshot del producto o None si no existe"""
+        self._ensure_fresh()
+        if product_id in self._stale:
+            self._reload_one(product_id)
+        return self._products.get(product_id)
+
+    def get_active(self, product_id: int) -> ProductSnapshot:
+        """Snapshot de un producto activo; 404 si no existe y 400 si está inactivo"""
+        product = self.get(product_id)
+        if product is None:
+            raise HTTPException(status_code=404, detail="Producto no encontrado")
+        if not product.is_active:
+            raise HTTPException(status_code=400, detail="El producto no está activo")
+        return product
+
+    def refresh(self, product: Product):
+        """Aplicar en este worker un producto recién escrito (sin consultar la base de datos)"""
+        snapshot = ProductSnapshot.from_model(product)
+        with self._lock:
+            self._products[snapshot.id] = snapshot
+            self._stale.discard(snapshot.id)
+
+    def mark_stale(self, product_ids: Iterable[int]):
+        with self._lock:
+            self._stale.update(product_ids)
+
+    def handle_invalidation(self, keys: List[str]):
+        """Listener del bus del cache: marcar los productos que cambiaron en otro worker"""
+        product_ids = [
+            int(key.split(":", 1)[1]) for key in keys
+            if key.startswith("product:") and key.split(":", 1)[1].isdigit()
+        ]
+        if product_ids:
+            self.mark_stale(product_ids)
+
+
+def list_active_products(db: Session) -> List[Dict[str, Any]]:
+    """Productos activos tal como los regresa GET /payments/products (valor de "products:active")"""
+    return [
+        ProductResponse.model_validate(product).model_dump(mode="json")
+        for product in db.query(Product).filter(Product.is_active == True).all()
+    ]
+
+
+# Instancia global del índice de productos. Sin el bus de invalidación un cambio
+# de precio sólo llega a los demás workers con la recarga: se cobra con un precio
+# viejo a lo más PRODUCT_INDEX_LOCAL_REFRESH_SECONDS
+product_catalog = ProductIndex(refresh_seconds=(
+    CacheConfig.PRODUCT_INDEX_REFRESH_SECONDS if cache.invalidation_bus is not None and CacheConfig.ENABLED
+    else CacheConfig.PRODUCT_INDEX_LOCAL_REFRESH_SECONDS
+))
+cache.add_invalidation_listener(product_catalog.handle_invalidation)
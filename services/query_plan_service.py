@@ -0,0 +1,100 @@
+import logging
+from typing import Any, Callable, Dict, List
+
+from sqlalchemy import select, text
+from sqlalchemy.orm import Session
+
+from models import Payment, PaymentAuditEvent, User, UserDirectory
+
+logger = logging.getLogger(__name__)
+
+# Consultas frecuentes de la API, construidas igual que en los routers/servicios.
+# `migrate.py explain` corre EXPLAIN sobre cada una y falla si alguna recorre la
+# tabla completa (un índice que falta o que el optimizador dejó de usar);
+# check_query_plans.py hace lo mismo sobre una base de prueba migrada.
+HOT_QUERIES: Dict[str, Callable[[], Any]] = {
+    # routers/payments.py has_paid
+    "has_paid": lambda: select(Payment.id).where(
+        Payment.user_id == 1, Payment.status == "succeeded"
+    ).limit(1),
+    # routers/payments.py get_payment_history
+    "get_payment_history": lambda: select(Payment).where(
+        Payment.user_id == 1
+    ).order_by(Payment.created_at.desc()),
+    # routers/payments.py get_payment_by_id
+    "get_payment_by_id": lambda: select(Payment).where(
+        Payment.stripe_payment_intent_id == "pi_explain", Payment.user_id == 1
+    ).limit(1),
+    # services/stripe_service.py create_or_get_customer
+    "create_or_get_customer": lambda: select(Payment).where(
+        Payment.user_id == 1, Payment.stripe_customer_id.isnot(None)
+    ).limit(1),
+    # services/user_directory.py lookup (login / registro)
+    "user_directory_lookup": lambda: select(UserDirectory).where(
+        UserDirectory.email == "explain@example.com"
+    ).limit(1),
+    # services/audit_service.py get_payment_history (/payments/payment/{id}/history)
+    "payment_audit_history": lambda: select(PaymentAuditEvent).where(
+        PaymentAuditEvent.stripe_payment_intent_id == "pi_explain", PaymentAuditEvent.user_id == 1
+    ).order_by(PaymentAuditEvent.occurred_at, PaymentAuditEvent.id),
+    # services/auth_service.py verify_password_reset_token / reset_user_password
+    "reset_token_lookup": lambda: select(User).where(User.reset_token == "token_explain").limit(1),
+}
+
+
+def _compile(db: Session, statement) -> str:
+    return str(statement.compile(bind=db.get_bind(), compile_kwargs={"literal_binds": True}))
+
+
+def _mysql_plan(db: Session, sql: str) -> List[Dict[str, Any]]:
+    """
+    EXPLAIN de MySQL: type=ALL (tabla completa) o type=index (índice completo) sin
+    un índice elegido (key NULL). Cuenta aunque haya candidatos en possible_keys:
+    si el optimizador no usa ninguno la consulta recorre la tabla igual
+    """
+    result = db.execute(text(f"EXPLAIN {sql}"))
+    plan = []
+    for row in result.mappings():
+        full_scan = row.get("type") in ("ALL", "index") and row.get("key") is None
+        plan.append({
+            "table": row.get("table"),
+            "access": row.get("type"),
+            "index": row.get("key"),
+            "rows": row.get("rows"),
+            "full_scan": full_scan,
+        })
+    return plan
+
+
+def _sqlite_plan(db: Session, sql: str) -> List[Dict[str, Any]]:
+    """EXPLAIN QUERY PLAN de SQLite: "SCAN <tabla>" sin índice es un recorrido completo"""
+    plan = []
+    for row in db.execute(text(f"EXPLAIN QUERY PLAN {sql}")).all():
+        detail = row[-1]
+        full_scan = detail.startswith("SCAN") and "USING" not in detail
+        plan.append({"table": None, "access": detail, "index": None, "rows": None, "full_scan": full_scan})
+    return plan
+
+
+def explain_query(db: Session, statement) -> Dict[str, Any]:
+    """Plan de una consulta y si alguna de sus tablas se recorre completa"""
+    dialect = db.get_bind().dialect.name
+    if dialect == "mysql":
+        explain = _mysql_plan
+    elif dialect == "sqlite":
+        explain = _sqlite_plan
+    else:
+        raise RuntimeError(f"EXPLAIN no soportado para el dialecto {dialect}")
+
+    sql = _compile(db, statement)
+    plan = explain(db, sql)
+    return {
+        "sql": sql,
+        "plan": plan,
+        "full_scan": any(step["full_scan"] for step in plan),
+    }
+
+
+def explain_hot_queries(db: Session) -> Dict[str, Dict[str, Any]]:
+    """Plan de cada consulta frecuente (ver explain_query)"""
+    return {name: explain_query(db, build()) for name, build in HOT_QUERIES.items()}
@@ -0,0 +1,372 @@
+import json
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta
+from typing import Any, Dict, List, Optional
+
+import stripe
+from fastapi import HTTPException
+from sqlalchemy import and_, bindparam, delete, func, insert, literal, or_, select, update
+from sqlalchemy.orm import Session
+
+from config.refund_config import RefundConfig
+from database import SessionLocal, shard_ids, shard_session
+from models import Payment, RefundJob, RefundJobItem
+from services import payment_state
+from services.resilience import TokenBucket
+from services.stripe_service import STRIPE_OUTAGE_ERRORS, stripe_service
+from utils.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# Reembolsos masivos (ej: se cancela la generación de un curso). Un job toma un
+# filtro sobre `payments` y guarda la lista de pagos como items en el shard de
+# cada pago. Un hilo recorre los items pendientes por bloques: los reembolsos se
+# piden a Stripe en paralelo (RefundConfig.CONCURRENCY) con un tope de llamadas
+# por segundo, y cada bloque se guarda con un UPDATE por lote. Cada reembolso
+# lleva la llave de idempotencia refund-job-<job>-<intent>: reanudar un job
+# interrumpido no reembolsa dos veces el mismo pago.
+
+# Desde estos status se puede reanudar un job (running sólo si perdió el latido)
+RESUMABLE_STATUSES = ("pending", "paused", "failed")
+FINISHED_STATUSES = ("completed", "canceled")
+
+refunds_processed = metrics.counter(
+    "refunds_processed_total", "Pagos procesados por los jobs de reembolso masivo"
+)
+
+
+def _payment_criteria(filters: Dict[str, Any]) -> List[Any]:
+    """Condiciones sobre payments; sólo los pagos exitosos se pueden reembolsar"""
+    criteria = [Payment.status == "succeeded"]
+    if filters.get("date_from"):
+        criteria.append(Payment.created_at >= date.fromisoformat(filters["date_from"]))
+    if filters.get("date_to"):
+        criteria.append(Payment.created_at < date.fromisoformat(filters["date_to"]) + timedelta(days=1))
+    if filters.get("currency"):
+        criteria.append(Payment.currency == filters["currency"])
+    if filters.get("payment_method"):
+        criteria.append(Payment.payment_method_types == filters["payment_method"])
+    if filters.get("description"):
+        criteria.append(Payment.description == filters["description"])
+    if filters.get("user_ids"):
+        criteria.append(Payment.user_id.in_(filters["user_ids"]))
+    if filters.get("payment_intent_ids"):
+        criteria.append(Payment.stripe_payment_intent_id.in_(filters["payment_intent_ids"]))
+    return criteria
+
+
+def preview_refund(db: Session, filters: Dict[str, Any]) -> int:
+    """Cuántos pagos reembolsaría un job con este filtro (sin crearlo)"""
+    stmt = select(func.count()).select_from(Payment).where(*_payment_criteria(filters))
+    return sum(db.scalar(stmt, bind_arguments={"shard_id": shard_id}) for shard_id in shard_ids())
+
+
+def create_refund_job(db: Session, filters: Dict[str, Any], reason: Optional[str]) -> RefundJob:
+    """
+    Crear el job y su lista de pagos (un INSERT ... SELECT por shard) y arrancarlo
+    Los pagos que cumplan el filtro después de este momento no entran al job
+    """
+    job = RefundJob(status="preparing", filters=json.dumps(filters), reason=reason)
+    db.add(job)
+    db.commit()
+
+    item_columns = [
+        "job_id", "payment_id", "user_id", "stripe_payment_intent_id",
+        "amount", "currency", "status", "updated_at",
+    ]
+    payments = select(
+        literal(job.id), Payment.id, Payment.user_id, Payment.stripe_payment_intent_id,
+        Payment.amount, Payment.currency, literal("pending"), literal(datetime.utcnow())
+    ).where(*_payment_criteria(filters))
+    total = 0
+    try:
+        for shard_id in shard_ids():
+            result = db.execute(
+                insert(RefundJobItem.__table__).from_select(item_columns, payments),
+                bind_arguments={"shard_id": shard_id}
+            )
+            db.commit()
+            total += result.rowcount
+    except Exception:
+        # Un job "preparing" no se puede reanudar ni cancelar: quitarlo con sus items
+        db.rollback()
+        _discard_job(db, job.id)
+        raise
+
+    job.total = total
+    job.status = "pending"
+    db.commit()
+    logger.info(f"Refund job {job.id} created with {total} payments: {job.filters}")
+
+    if not refund_runner.claim(db, job.id):
+        raise HTTPException(status_code=409, detail="El job ya se está ejecutando")
+    refund_runner.start(job.id)
+    db.refresh(job)
+    return job
+
+
+def _discard_job(db: Session, job_id: int):
+    """
+    Borrar un job que no terminó de prepararse y los items que alcanzó a crear
+    Primero el job (es lo que quedaría atorado); los items sin job no se procesan nunca
+    """
+    try:
+        db.query(RefundJob).filter(RefundJob.id == job_id).delete(synchronize_session=False)
+        db.commit()
+    except Exception as e:
+        db.rollback()
+        logger.error(f"Could not discard refund job {job_id} left in preparing: {e}")
+        return
+    for shard_id in shard_ids():
+        try:
+            db.execute(
+                delete(RefundJobItem.__table__).where(RefundJobItem.__table__.c.job_id == job_id),
+                bind_arguments={"shard_id": shard_id}
+            )
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            logger.warning(f"Could not delete items of discarded refund job {job_id} in shard {shard_id}: {e}")
+    logger.warning(f"Refund job {job_id} discarded: preparing its items failed")
+
+
+def get_refund_job(db: Session, job_id: int) -> RefundJob:
+    job = db.query(RefundJob).filter(RefundJob.id == job_id).first()
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job de reembolso no encontrado")
+    return job
+
+
+def resume_refund_job(db: Session, job_id: int) -> RefundJob:
+    """Continuar un job pausado, fallido o huérfano desde sus items pendientes"""
+    job = get_refund_job(db, job_id)
+    if not refund_runner.claim(db, job_id):
+        raise HTTPException(status_code=409, detail=f"El job no se puede reanudar (status: {job.status})")
+    refund_runner.start(job_id)
+    db.refresh(job)
+    return job
+
+
+def cancel_refund_job(db: Session, job_id: int) -> RefundJob:
+    """
+    Detener un job; los reembolsos del bloque en curso se terminan y se guardan
+    Los items pendientes se quedan como están (no se reembolsan)
+    """
+    job = get_refund_job(db, job_id)
+    result = db.execute(
+        update(RefundJob)
+        .where(RefundJob.id == job_id, RefundJob.status.notin_(FINISHED_STATUSES + ("preparing",)))
+        .values(status="canceled", finished_at=datetime.utcnow())
+        .execution_options(synchronize_session=False)
+    )
+    db.commit()
+    if result.rowcount != 1:
+        raise HTTPException(status_code=409, detail=f"El job no se puede cancelar (status: {job.status})")
+    db.refresh(job)
+    return job
+
+
+class RefundRunner:
+    """
+    Ejecuta los jobs de reembolso en hilos de fondo (uno por job)
+
+    - claim() marca el job como running con un UPDATE condicional: dos workers
+      nunca procesan el mismo job
+    - Entre bloques se actualiza el latido y se revisa si el job se canceló
+    - Si Stripe no está disponible el job queda "failed" con sus items pendientes
+    - stop() (apagado) pausa los jobs al terminar su bloque en curso
+    """
+
+    def __init__(self, concurrency: int, rate_per_second: float, page_size: int, stale_seconds: int):
+        self.concurrency = concurrency
+        self.page_size = page_size
+        self.stale_seconds = stale_seconds
+        self.limiter = TokenBucket(rate_per_second)
+        self._threads: Dict[int, threading.Thread] = {}
+        self._lock = threading.Lock()
+        self._stopping = threading.Event()
+
+    def claim(self, db: Session, job_id: int) -> bool:
+        now = datetime.utcnow()
+        result = db.execute(
+            update(RefundJob)
+            .where(RefundJob.id == job_id, or_(
+                RefundJob.status.in_(RESUMABLE_STATUSES),
+                and_(RefundJob.status == "running",
+                     RefundJob.heartbeat_at < now - timedelta(seconds=self.stale_seconds))
+            ))
+            .values(status="running", started_at=func.coalesce(RefundJob.started_at, now),
+                    heartbeat_at=now, finished_at=None, error=None)
+            .execution_options(synchronize_session=False)
+        )
+        db.commit()
+        return result.rowcount == 1
+
+    def start(self, job_id: int):
+        with self._lock:
+            if job_id in self._threads:
+                return
+            thread = threading.Thread(target=self.run, args=(job_id,), name=f"refund-job-{job_id}", daemon=True)
+            self._threads[job_id] = thread
+            thread.start()
+
+    def stop(self, timeout: float = 10):
+        self._stopping.set()
+        for thread in list(self._threads.values()):
+            thread.join(timeout=timeout)
+
+    def run(self, job_id: int):
+        """Procesar un job ya reclamado con claim()"""
+        try:
+            self._process(job_id)
+        except Exception as e:
+            logger.exception(f"Refund job {job_id} failed")
+            self._finish(job_id, "failed", str(e))
+        finally:
+            with self._lock:
+                self._threads.pop(job_id, None)
+
+    def _process(self, job_id: int):
+        db = SessionLocal()
+        try:
+            reason = db.query(RefundJob.reason).filter(RefundJob.id == job_id).scalar()
+        finally:
+            db.close()
+
+        with ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix=f"refund-{job_id}") as executor:
+            for shard_id in shard_ids():
+                while True:
+                    if not self._heartbeat(job_id):
+                        logger.info(f"Refund job {job_id} is no longer running, stopping")
+                        return
+                    if self._stopping.is_set():
+                        self._finish(job_id, "paused")
+                        return
+
+                    db = shard_session(shard_id)
+                    try:
+                        items = db.execute(
+                            select(RefundJobItem.id, RefundJobItem.stripe_payment_intent_id, RefundJobItem.user_id)
+                            .where(RefundJobItem.job_id == job_id, RefundJobItem.status == "pending")
+                            .order_by(RefundJobItem.id)
+                            .limit(self.page_size)
+                        ).all()
+                        if not items:
+                            break
+                        results = list(executor.map(lambda item: self._refund(job_id, reason, item), items))
+                        refunded, failed = self._save_page(db, job_id, results)
+                    finally:
+                        db.close()
+
+                    self._add_progress(job_id, refunded, failed)
+                    if any(result["status"] == "pending" for result in results):
+                        self._finish(job_id, "failed", "Stripe no está disponible; reanudar el job más tarde")
+                        return
+
+        self._finish(job_id, "completed")
+
+    def _refund(self, job_id: int, reason: Optional[str], item) -> Dict[str, Any]:
+        """Pedir el reembolso de un item; status pending = reintentar al reanudar"""
+        result = {"item_id": item.id, "payment_intent_id": item.stripe_payment_intent_id,
+                  "status": "pending", "refund_id": None, "error": None}
+        self.limiter.acquire()
+        try:
+            refund = stripe_service.refund_payment_intent(
+                item.stripe_payment_intent_id,
+                idempotency_key=f"refund-job-{job_id}-{item.stripe_payment_intent_id}",
+                reason=reason,
+                metadata={"refund_job_id": str(job_id), "user_id": str(item.user_id)},
+            )
+            result.update(status="refunded", refund_id=refund.id)
+        except (HTTPException, *STRIPE_OUTAGE_ERRORS) as e:
+            # Circuito abierto, bulkhead lleno o Stripe caído: el item sigue pendiente
+            logger.warning(f"Refund of {item.stripe_payment_intent_id} postponed: {e}")
+        except stripe.error.StripeError as e:
+            if getattr(e, "code", None) == "charge_already_refunded":
+                result.update(status="refunded")
+            else:
+                result.update(status="failed", error=(e.user_message or str(e))[:255])
+        return result
+
+    def _save_page(self, db: Session, job_id: int, results: List[Dict[str, Any]]):
+        """
+        Guardar un bloque: primero el status de los pagos y después el de los items
+        Si el proceso muere entre los dos commits, al reanudar se vuelve a pedir el
+        reembolso con la misma llave de idempotencia y el pago ya no cambia
+        """
+        refunded = [result["payment_intent_id"] for result in results if result["status"] == "refunded"]
+        if refunded:
+            payment_state.transition_payments_status(db, refunded, "refunded", f"refund_job:{job_id}")
+
+        done = [result for result in results if result["status"] != "pending"]
+        if done:
+            table = RefundJobItem.__table__
+            db.execute(
+                update(table).where(table.c.id == bindparam("item_id")).values(
+                    status=bindparam("item_status"), stripe_refund_id=bindparam("refund_id"),
+                    error=bindparam("item_error"), updated_at=datetime.utcnow()
+                ),
+                [{"item_id": result["item_id"], "item_status": result["status"],
+                  "refund_id": result["refund_id"], "item_error": result["error"]} for result in done]
+            )
+            db.commit()
+
+        failed = len(done) - len(refunded)
+        refunds_processed.inc(len(refunded), result="refunded")
+        refunds_processed.inc(failed, result="failed")
+        return len(refunded), failed
+
+    def _heartbeat(self, job_id: int) -> bool:
+        """Actualizar el latido; False si el job ya no está running (ej: se canceló)"""
+        db = SessionLocal()
+        try:
+            result = db.execute(
+                update(RefundJob)
+                .where(RefundJob.id == job_id, RefundJob.status == "running")
+                .values(heartbeat_at=datetime.utcnow())
+                .execution_options(synchronize_session=False)
+            )
+            db.commit()
+            return result.rowcount == 1
+        finally:
+            db.close()
+
+    def _add_progress(self, job_id: int, refunded: int, failed: int):
+        db = SessionLocal()
+        try:
+            db.execute(
+                update(RefundJob)
+                .where(RefundJob.id == job_id)
+                .values(refunded_count=RefundJob.refunded_count + refunded,
+                        failed_count=RefundJob.failed_count + failed,
+                        heartbeat_at=datetime.utcnow())
+                .execution_options(synchronize_session=False)
+            )
+            db.commit()
+        finally:
+            db.close()
+
+    def _finish(self, job_id: int, status: str, error: Optional[str] = None):
+        db = SessionLocal()
+        try:
+            db.execute(
+                update(RefundJob)
+                .where(RefundJob.id == job_id, RefundJob.status == "running")
+                .values(status=status, error=error, finished_at=datetime.utcnow())
+                .execution_options(synchronize_session=False)
+            )
+            db.commit()
+        finally:
+            db.close()
+        logger.info(f"Refund job {job_id} {status}" + (f": {error}" if error else ""))
+
+
+# Instancia global (el tope de llamadas por segundo es por proceso)
+refund_runner = RefundRunner(
+    concurrency=RefundConfig.CONCURRENCY,
+    rate_per_second=RefundConfig.RATE_PER_SECOND,
+    page_size=RefundConfig.PAGE_SIZE,
+    stale_seconds=RefundConfig.STALE_SECONDS,
+)
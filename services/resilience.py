@@ -0,0 +1,151 @@
+import logging
+import threading
+import time
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+
+class CircuitOpenError(Exception):
+    """El circuito está abierto: la dependencia se considera caída"""
+
+    def __init__(self, name: str, retry_after: float):
+        super().__init__(f"Circuito {name} abierto")
+        self.retry_after = retry_after
+
+
+class BulkheadFullError(Exception):
+    """No hay cupo de concurrencia para la operación"""
+
+
+class CircuitBreaker:
+    """
+    Circuit breaker cerrado / abierto / medio abierto
+
+    - closed: las llamadas pasan; tras `failure_threshold` fallas seguidas se abre
+    - open: las llamadas fallan de inmediato durante `recovery_timeout` segundos
+    - half_open: se deja pasar una prueba; si funciona se cierra, si falla se reabre
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, name: str, failure_threshold: int = 5, recovery_timeout: float = 30,
+                 half_open_max_calls: int = 1):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self.half_open_max_calls = half_open_max_calls
+        self._state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._half_open_calls = 0
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self._state == self.OPEN and time.monotonic() - self._opened_at >= self.recovery_timeout:
+                return self.HALF_OPEN
+            return self._state
+
+    def before_call(self):
+        """Reservar el paso de una llamada o lanzar CircuitOpenError"""
+        with self._lock:
+            if self._state == self.OPEN:
+                remaining = self.recovery_timeout - (time.monotonic() - self._opened_at)
+                if remaining > 0:
+                    raise CircuitOpenError(self.name, remaining)
+                self._state = self.HALF_OPEN
+                self._half_open_calls = 0
+                logger.info(f"Circuit {self.name} half-open, probing")
+
+            if self._state == self.HALF_OPEN:
+                if self._half_open_calls >= self.half_open_max_calls:
+                    raise CircuitOpenError(self.name, 1)
+                self._half_open_calls += 1
+
+    def release(self):
+        """Devolver un paso reservado que no llegó a ejecutarse (no cambia el estado)"""
+        with self._lock:
+            if self._state == self.HALF_OPEN and self._half_open_calls > 0:
+                self._half_open_calls -= 1
+
+    def on_success(self):
+        with self._lock:
+            if self._state == self.HALF_OPEN:
+                logger.info(f"Circuit {self.name} closed")
+            self._state = self.CLOSED
+            self._failures = 0
+            self._half_open_calls = 0
+
+    def on_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                if self._state != self.OPEN:
+                    logger.error(f"Circuit {self.name} opened after {self._failures} failures")
+                self._state = self.OPEN
+                self._opened_at = time.monotonic()
+                self._half_open_calls = 0
+
+
+class Bulkhead:
+    """Límite de llamadas concurrentes para que una dependencia lenta no acapare los hilos"""
+
+    def __init__(self, name: str, max_concurrent: int, max_wait: float = 0.5):
+        self.name = name
+        self.max_concurrent = max_concurrent
+        self.max_wait = max_wait
+        self._semaphore = threading.BoundedSemaphore(max_concurrent)
+        self._in_flight = 0
+        self._lock = threading.Lock()
+
+    @property
+    def in_flight(self) -> int:
+        return self._in_flight
+
+    def __enter__(self):
+        if not self._semaphore.acquire(timeout=self.max_wait):
+            raise BulkheadFullError(f"Bulkhead {self.name} lleno ({self.max_concurrent} llamadas)")
+        with self._lock:
+            self._in_flight += 1
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        with self._lock:
+            self._in_flight -= 1
+        self._semaphore.release()
+        return False
+
+
+class TokenBucket:
+    """
+    Límite de llamadas por segundo para trabajos en lote (ej: reembolsos masivos)
+    acquire() espera hasta que haya un token; permite ráfagas de hasta `burst`
+    """
+
+    def __init__(self, rate: float, burst: Optional[int] = None):
+        self.rate = rate
+        self.capacity = burst or max(1, int(rate))
+        self._tokens = float(self.capacity)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+def retry_after_seconds(value: Optional[float]) -> str:
+    """Valor para el header Retry-After (entero, mínimo 1)"""
+    return str(max(1, int((value or 0) + 0.999)))
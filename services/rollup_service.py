@@ -0,0 +1,277 @@
+import logging
+from collections import defaultdict
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy import delete, insert, select
+from sqlalchemy.dialects.mysql import insert as mysql_insert
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+
+from database import shard_for_user, shard_ids
+from models import Payment, PaymentDailyRollup
+
+logger = logging.getLogger(__name__)
+
+# Columnas (conteo, monto) que se acumulan por cada status final
+STATUS_COLUMNS = {
+    "succeeded": ("succeeded_count", "succeeded_amount"),
+    "failed": ("failed_count", "failed_amount"),
+}
+
+COUNTER_COLUMNS = ["payments_count", "amount_total"] + [
+    column for columns in STATUS_COLUMNS.values() for column in columns
+]
+
+UNKNOWN_METHOD = "unknown"
+
+
+def _rollup_key(created_at: Optional[datetime], currency: Optional[str],
+                payment_method: Optional[str]) -> Tuple[date, str, str]:
+    day = (created_at or datetime.utcnow()).date()
+    return day, (currency or "usd").lower(), (payment_method or UNKNOWN_METHOD).lower()
+
+
+def _money(amount: Optional[float]) -> Decimal:
+    return Decimal(str(amount or 0)).quantize(Decimal("0.01"))
+
+
+def _upsert_increment(db: Session, key: Tuple[date, str, str], increments: Dict[str, Any], shard_id: str):
+    """
+    INSERT ... ON DUPLICATE KEY UPDATE col = col + incremento
+    Se ejecuta dentro de la transacción del llamador, en el shard de los pagos
+    """
+    table = PaymentDailyRollup.__table__
+    day, currency, payment_method = key
+    values = {column: 0 for column in COUNTER_COLUMNS}
+    values.update(increments)
+    values.update(day=day, currency=currency, payment_method=payment_method,
+                  updated_at=datetime.utcnow())
+
+    dialect = db.get_bind(PaymentDailyRollup, shard_id=shard_id).dialect.name
+    if dialect == "mysql":
+        stmt = mysql_insert(table).values(**values)
+        updates = {column: table.c[column] + stmt.inserted[column] for column in increments}
+        updates["updated_at"] = stmt.inserted.updated_at
+        stmt = stmt.on_duplicate_key_update(**updates)
+    elif dialect in ("sqlite", "postgresql"):
+        dialect_insert = sqlite_insert if dialect == "sqlite" else postgresql_insert
+        stmt = dialect_insert(table).values(**values)
+        updates = {column: table.c[column] + stmt.excluded[column] for column in increments}
+        updates["updated_at"] = stmt.excluded.updated_at
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[table.c.day, table.c.currency, table.c.payment_method],
+            set_=updates
+        )
+    else:
+        raise ValueError(f"Dialecto no soportado para rollups: {dialect}")
+
+    db.execute(stmt, bind_arguments={"shard_id": shard_id})
+
+
+def record_payment_created(db: Session, payment: Payment):
+    """
+    Sumar un pago recién creado al rollup de su día
+    Debe llamarse antes del commit que inserta el pago
+    """
+    if payment.created_at is None:
+        db.flush()  # Aplica el default de created_at
+
+    amount = _money(payment.amount)
+    increments = {"payments_count": 1, "amount_total": amount}
+    status_columns = STATUS_COLUMNS.get(payment.status)
+    if status_columns:
+        increments[status_columns[0]] = 1
+        increments[status_columns[1]] = amount
+
+    _upsert_increment(
+        db,
+        _rollup_key(payment.created_at, payment.currency, payment.payment_method_types),
+        increments,
+        shard_for_user(payment.user_id)
+    )
+
+
+def record_payments_created(db: Session, payments: List[Payment]):
+    """
+    Sumar varios pagos nuevos con un upsert por combinación shard/día/moneda/método
+    Los pagos deben traer created_at (ej: inserciones por lotes)
+    """
+    grouped: Dict[Tuple[str, Tuple[date, str, str]], Dict[str, Any]] = defaultdict(lambda: defaultdict(int))
+    for payment in payments:
+        amount = _money(payment.amount)
+        increments = grouped[(
+            shard_for_user(payment.user_id),
+            _rollup_key(payment.created_at, payment.currency, payment.payment_method_types)
+        )]
+        increments["payments_count"] += 1
+        increments["amount_total"] += amount
+        status_columns = STATUS_COLUMNS.get(payment.status)
+        if status_columns:
+            increments[status_columns[0]] += 1
+            increments[status_columns[1]] += amount
+
+    for (shard_id, key), increments in grouped.items():
+        _upsert_increment(db, key, dict(increments), shard_id)
+
+
+def record_status_change(db: Session, payment: Payment, old_status: Optional[str], new_status: str):
+    """
+    Mover el monto del pago entre los acumulados de status
+    No hace nada si el status no cambió (webhooks duplicados)
+    """
+    if old_status == new_status:
+        return
+
+    amount = _money(payment.amount)
+    increments: Dict[str, Any] = {}
+    old_columns = STATUS_COLUMNS.get(old_status)
+    if old_columns:
+        increments[old_columns[0]] = -1
+        increments[old_columns[1]] = -amount
+    new_columns = STATUS_COLUMNS.get(new_status)
+    if new_columns:
+        increments[new_columns[0]] = 1
+        increments[new_columns[1]] = amount
+
+    if increments:
+        _upsert_increment(
+            db,
+            _rollup_key(payment.created_at, payment.currency, payment.payment_method_types),
+            increments,
+            shard_for_user(payment.user_id)
+        )
+
+
+def record_status_changes(db: Session, payments: List[Payment], old_status: str, new_status: str):
+    """
+    Mover varios pagos de old_status a new_status con un upsert por combinación
+    shard/día/moneda/método (cambios de status por lotes)
+    """
+    old_columns = STATUS_COLUMNS.get(old_status)
+    new_columns = STATUS_COLUMNS.get(new_status)
+    if old_status == new_status or not (old_columns or new_columns):
+        return
+
+    grouped: Dict[Tuple[str, Tuple[date, str, str]], Dict[str, Any]] = defaultdict(lambda: defaultdict(int))
+    for payment in payments:
+        amount = _money(payment.amount)
+        increments = grouped[(
+            shard_for_user(payment.user_id),
+            _rollup_key(payment.created_at, payment.currency, payment.payment_method_types)
+        )]
+        if old_columns:
+            increments[old_columns[0]] -= 1
+            increments[old_columns[1]] -= amount
+        if new_columns:
+            increments[new_columns[0]] += 1
+            increments[new_columns[1]] += amount
+
+    for (shard_id, key), increments in grouped.items():
+        _upsert_increment(db, key, dict(increments), shard_id)
+
+
+def get_daily_rollups(db: Session, day: date) -> List[Dict[str, Any]]:
+    """
+    Obtener los totales de un día (lectura por prefijo de la llave primaria)
+    Cada shard tiene los totales de sus pagos: se suman por moneda y método
+    """
+    totals: Dict[Tuple[str, str], Dict[str, Any]] = {}
+    for shard_id in shard_ids():
+        rows = db.scalars(
+            select(PaymentDailyRollup).where(PaymentDailyRollup.day == day),
+            bind_arguments={"shard_id": shard_id}
+        )
+        for row in rows:
+            total = totals.setdefault((row.currency, row.payment_method), {
+                "day": row.day, "currency": row.currency, "payment_method": row.payment_method,
+                **{column: 0 for column in COUNTER_COLUMNS}
+            })
+            for column in COUNTER_COLUMNS:
+                total[column] += getattr(row, column)
+    return list(totals.values())
+
+
+def compute_rollups(db: Session, chunk_size: int = 5000,
+                    since: Optional[date] = None) -> Dict[Tuple[date, str, str], Dict[str, Any]]:
+    """
+    Recalcular los totales desde cero leyendo `payments` en bloques
+    Sólo se mantiene en memoria un bloque de pagos y el diccionario de totales
+    Con `since` sólo se consideran los días a partir de esa fecha
+    """
+    totals: Dict[Tuple[date, str, str], Dict[str, Any]] = defaultdict(
+        lambda: {column: 0 for column in COUNTER_COLUMNS}
+    )
+    stmt = select(
+        Payment.created_at, Payment.currency, Payment.payment_method_types,
+        Payment.status, Payment.amount
+    ).execution_options(yield_per=chunk_size)
+    if since is not None:
+        stmt = stmt.where(Payment.created_at >= since)
+
+    for created_at, currency, payment_method, status, amount in db.execute(stmt):
+        row = totals[_rollup_key(created_at, currency, payment_method)]
+        amount = _money(amount)
+        row["payments_count"] += 1
+        row["amount_total"] += amount
+        status_columns = STATUS_COLUMNS.get(status)
+        if status_columns:
+            row[status_columns[0]] += 1
+            row[status_columns[1]] += amount
+
+    return dict(totals)
+
+
+def verify_rollups(db: Session, chunk_size: int = 5000, since: Optional[date] = None) -> List[Dict[str, Any]]:
+    """Comparar la tabla de rollups contra un recálculo completo; regresa las diferencias"""
+    expected = compute_rollups(db, chunk_size, since)
+    query = db.query(PaymentDailyRollup)
+    if since is not None:
+        query = query.filter(PaymentDailyRollup.day >= since)
+    stored = {
+        (row.day, row.currency, row.payment_method): row
+        for row in query.all()
+    }
+
+    differences = []
+    for key in sorted(set(expected) | set(stored)):
+        expected_row = expected.get(key, {column: 0 for column in COUNTER_COLUMNS})
+        stored_row = stored.get(key)
+        for column in COUNTER_COLUMNS:
+            stored_value = getattr(stored_row, column) if stored_row is not None else 0
+            if _money(stored_value) != _money(expected_row[column]):
+                differences.append({
+                    "day": key[0], "currency": key[1], "payment_method": key[2],
+                    "column": column, "expected": expected_row[column], "stored": stored_value
+                })
+    return differences
+
+
+def rebuild_rollups(db: Session, chunk_size: int = 5000, since: Optional[date] = None) -> int:
+    """
+    Reemplazar la tabla de rollups con un recálculo completo; regresa las filas escritas
+    Con `since` se conservan los días anteriores (ej: meses ya archivados de payments)
+    """
+    totals = compute_rollups(db, chunk_size, since)
+    now = datetime.utcnow()
+    rows = [
+        {"day": day, "currency": currency, "payment_method": payment_method, "updated_at": now, **values}
+        for (day, currency, payment_method), values in totals.items()
+    ]
+
+    try:
+        stmt = delete(PaymentDailyRollup)
+        if since is not None:
+            stmt = stmt.where(PaymentDailyRollup.day >= since)
+        db.execute(stmt)
+        for start in range(0, len(rows), chunk_size):
+            db.execute(insert(PaymentDailyRollup.__table__), rows[start:start + chunk_size])
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+
+    logger.info(f"Payment rollups rebuilt: {len(rows)} rows")
+    return len(rows)
@@ -0,0 +1,133 @@
+import contextvars
+import logging
+import random
+import socket
+import time
+from contextlib import contextmanager
+from typing import Dict, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection
+
+from utils.metrics import metrics
+from utils.tracing import tracer
+
+try:
+    from stripe._http_client import RequestsClient
+except ImportError:  # versiones anteriores de stripe-python
+    from stripe.http_client import RequestsClient
+
+logger = logging.getLogger(__name__)
+
+# Operación de Stripe en curso en este hilo/petición (para timeout y métricas)
+_current_operation: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar(
+    "stripe_operation", default=None
+)
+
+stripe_attempts = metrics.counter(
+    "stripe_http_attempts_total", "Peticiones HTTP enviadas a Stripe (incluye reintentos)"
+)
+stripe_calls = metrics.counter(
+    "stripe_calls_total", "Llamadas lógicas a la API de Stripe por operación y resultado"
+)
+stripe_call_seconds = metrics.summary(
+    "stripe_call_seconds", "Duración de las llamadas a Stripe incluyendo reintentos"
+)
+
+
+class _KeepAliveAdapter(HTTPAdapter):
+    """HTTPAdapter con TCP keep-alive para que el pool no pierda conexiones inactivas"""
+
+    def init_poolmanager(self, *args, **kwargs):
+        kwargs["socket_options"] = HTTPConnection.default_socket_options + [
+            (socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1),
+        ]
+        super().init_poolmanager(*args, **kwargs)
+
+
+class StripeHttpClient(RequestsClient):
+    """
+    Cliente HTTP compartido por todas las llamadas a Stripe
+
+    - Una sola requests.Session con pool de conexiones persistentes
+    - Timeout por operación (ver StripeConfig.OPERATION_TIMEOUTS)
+    - Backoff exponencial con jitter configurable para los reintentos de la librería
+    - Conteo de conexiones nuevas (handshakes TLS) contra peticiones enviadas
+    """
+
+    def __init__(self, pool_size: int, default_timeout: float,
+                 operation_timeouts: Optional[Dict[str, float]] = None,
+                 retry_initial_delay: float = 0.25, retry_max_delay: float = 2):
+        self._adapter = _KeepAliveAdapter(
+            pool_connections=4, pool_maxsize=pool_size, max_retries=0
+        )
+        session = requests.Session()
+        session.mount("https://", self._adapter)
+        session.mount("http://", self._adapter)  # stripe-mock / proxies locales
+        self._default_timeout = default_timeout
+        self._operation_timeouts = operation_timeouts or {}
+        self._retry_initial_delay = retry_initial_delay
+        self._retry_max_delay = retry_max_delay
+        super().__init__(timeout=default_timeout, session=session)
+
+    # RequestsClient lee self._timeout en cada petición: se resuelve por operación
+    @property
+    def _timeout(self):
+        operation = _current_operation.get()
+        return self._operation_timeouts.get(operation, self._default_timeout)
+
+    @_timeout.setter
+    def _timeout(self, value):
+        self._default_timeout = value
+
+    def request(self, method, url, headers, post_data=None):
+        stripe_attempts.inc(operation=_current_operation.get() or "other")
+        headers = dict(headers or {})
+        tracer.inject(headers)
+        return super().request(method, url, headers, post_data)
+
+    def _sleep_time_seconds(self, num_retries, response=None):
+        sleep_seconds = min(self._retry_initial_delay * (2 ** (num_retries - 1)), self._retry_max_delay)
+        sleep_seconds *= 0.5 * (1 + random.uniform(0, 1))  # jitter en [50%, 100%]
+        retry_after = self._retry_after_header(response) or 0
+        if retry_after <= self.MAX_RETRY_AFTER:
+            sleep_seconds = max(retry_after, sleep_seconds)
+        return sleep_seconds
+
+    def connection_stats(self) -> Dict[str, int]:
+        """Conexiones abiertas (cada una es un handshake TLS) y peticiones del pool"""
+        connections = requests_sent = 0
+        pools = self._adapter.poolmanager.pools
+        for key in list(pools.keys()):
+            pool = pools.get(key)
+            if pool is not None:
+                connections += pool.num_connections
+                requests_sent += pool.num_requests
+        return {"connections": connections, "requests": requests_sent}
+
+
+@contextmanager
+def stripe_operation(name: str):
+    """Marcar una llamada a Stripe para aplicar su timeout y medirla"""
+    token = _current_operation.set(name)
+    started = time.perf_counter()
+    outcome = "error"
+    try:
+        yield
+        outcome = "ok"
+    finally:
+        _current_operation.reset(token)
+        stripe_calls.inc(operation=name, outcome=outcome)
+        stripe_call_seconds.observe(time.perf_counter() - started, operation=name)
+
+
+def register_connection_metrics(client: StripeHttpClient):
+    def collect():
+        stats = client.connection_stats()
+        return [({"kind": "connections"}, stats["connections"]),
+                ({"kind": "requests"}, stats["requests"])]
+
+    metrics.callback_gauge(
+        "stripe_http_pool", "Conexiones TLS abiertas contra peticiones enviadas por el pool de Stripe", collect
+    )
@@ -1,21 +1,146 @@
 import stripe
 import logging
-from typing import Optional, Dict, Any
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Optional, Dict, Any, List
+from sqlalchemy import bindparam, insert, update
 from sqlalchemy.orm import Session
 from fastapi import HTTPException
 from config.stripe_config import StripeConfig
 from models import Payment, Product, User
-from datetime import datetime
+from database import SessionLocal, SHARD_ENGINES, pin_shard
+from services import rollup_service, payment_state
+from services.audit_service import audit_writer
+from utils.cache import cache
+from config.cache_config import CacheConfig
+from services.stripe_http_client import StripeHttpClient, stripe_operation, register_connection_metrics
+from services.resilience import (
+    CircuitBreaker, CircuitOpenError, Bulkhead, BulkheadFullError, retry_after_seconds
+)
+from utils.metrics import metrics
+from utils.tracing import tracer
 
 # Configurar logging
 logger = logging.getLogger(__name__)
 
+# Errores que indican que Stripe no está disponible (abren el circuito).
+# Los errores de negocio (tarjeta rechazada, parámetros inválidos) no cuentan.
+STRIPE_OUTAGE_ERRORS = (
+    stripe.error.APIConnectionError,
+    stripe.error.APIError,
+    stripe.error.RateLimitError,
+)
+
+CIRCUIT_STATE_VALUES = {
+    CircuitBreaker.CLOSED: 0,
+    CircuitBreaker.HALF_OPEN: 1,
+    CircuitBreaker.OPEN: 2,
+}
+
+stripe_rejections = metrics.counter(
+    "stripe_calls_rejected_total", "Llamadas a Stripe rechazadas sin enviarse (circuito abierto o bulkhead lleno)"
+)
+
 class StripeService:
     def __init__(self):
         """Inicializar el servicio de Stripe"""
         StripeConfig.validate_config()
         stripe.api_key = StripeConfig.STRIPE_SECRET_KEY
+        # Cliente HTTP compartido: conexiones persistentes, timeouts y reintentos
+        self.http_client = StripeHttpClient(
+            pool_size=StripeConfig.HTTP_POOL_SIZE,
+            default_timeout=StripeConfig.HTTP_TIMEOUT_SECONDS,
+            operation_timeouts=StripeConfig.OPERATION_TIMEOUTS,
+            retry_initial_delay=StripeConfig.RETRY_INITIAL_DELAY_SECONDS,
+            retry_max_delay=StripeConfig.RETRY_MAX_DELAY_SECONDS,
+        )
+        stripe.default_http_client = self.http_client
+        stripe.max_network_retries = StripeConfig.MAX_NETWORK_RETRIES
+        register_connection_metrics(self.http_client)
+
+        # Circuit breaker compartido y un bulkhead por operación
+        self.circuit_breaker = CircuitBreaker(
+            "stripe",
+            failure_threshold=StripeConfig.BREAKER_FAILURE_THRESHOLD,
+            recovery_timeout=StripeConfig.BREAKER_RECOVERY_SECONDS,
+        )
+        self.bulkheads = {}
+        metrics.callback_gauge(
+            "stripe_circuit_state", "Estado del circuito de Stripe (0=closed, 1=half_open, 2=open)",
+            lambda: [({"circuit": "stripe"}, CIRCUIT_STATE_VALUES[self.circuit_breaker.state])]
+        )
+        metrics.callback_gauge(
+            "stripe_bulkhead_in_flight", "Llamadas a Stripe en curso por operación",
+            lambda: [({"operation": name}, bulkhead.in_flight) for name, bulkhead in list(self.bulkheads.items())]
+        )
+        # Hilos propios para crear customers por adelantado: no ocupan el threadpool
+        # de las peticiones ni compiten con los checkouts por el bulkhead
+        self._precreate_executor = ThreadPoolExecutor(
+            max_workers=StripeConfig.CUSTOMER_PRECREATE_CONCURRENCY, thread_name_prefix="stripe-customer"
+        )
+
+    def _get_bulkhead(self, operation: str) -> Bulkhead:
+        bulkhead = self.bulkheads.get(operation)
+        if bulkhead is None:
+            bulkhead = self.bulkheads.setdefault(operation, Bulkhead(
+                operation,
+                StripeConfig.BULKHEAD_LIMITS.get(operation, StripeConfig.BULKHEAD_DEFAULT_LIMIT),
+                max_wait=StripeConfig.BULKHEAD_MAX_WAIT_SECONDS,
+            ))
+        return bulkhead
+
+    def _call(self, operation: str, method, *args, **kwargs):
+        """
+        Ejecutar una llamada a la API de Stripe con el timeout y métricas de su operación,
+        protegida por el circuit breaker y el bulkhead de la operación
+        Si Stripe está caído o saturado responde 503 con Retry-After sin esperar el timeout
+        """
+        try:
+            self.circuit_breaker.before_call()
+        except CircuitOpenError as e:
+            stripe_rejections.inc(operation=operation, reason="circuit_open")
+            raise HTTPException(
+                status_code=503,
+                detail="El servicio de pagos no está disponible, intenta de nuevo en unos momentos",
+                headers={"Retry-After": retry_after_seconds(e.retry_after)},
+            )
+
+        try:
+            with self._get_bulkhead(operation), stripe_operation(operation), tracer.start_span(
+                f"stripe {operation}", kind="client", attributes={"stripe.operation": operation}
+            ):
+                result = method(*args, **kwargs)
+        except BulkheadFullError:
+            # No se llegó a llamar a Stripe: liberar el paso sin cambiar el estado
+            self.circuit_breaker.release()
+            stripe_rejections.inc(operation=operation, reason="bulkhead_full")
+            raise HTTPException(
+                status_code=503,
+                detail="El servicio de pagos está saturado, intenta de nuevo en unos momentos",
+                headers={"Retry-After": "1"},
+            )
+        except STRIPE_OUTAGE_ERRORS:
+            self.circuit_breaker.on_failure()
+            raise
+        except stripe.error.StripeError:
+            # Stripe respondió: el servicio está sano aunque la operación falló
+            self.circuit_breaker.on_success()
+            raise
+        except Exception:
+            self.circuit_breaker.release()
+            raise
+
+        self.circuit_breaker.on_success()
+        return result
         
+    def warm_up(self):
+        """
+        GET /v1/balance: autenticado, sin efectos y barato
+        Abre la conexión TLS del pool HTTP antes de la primera petición real
+        """
+        self._call("balance.retrieve", stripe.Balance.retrieve)
+
     def get_publishable_key(self) -> str:
         """Obtener la clave pública de Stripe"""
         return StripeConfig.STRIPE_PUBLISHABLE_KEY
@@ -25,6 +150,15 @@ class StripeService:
         Crear o obtener un customer de Stripe para el usuario
         """
         try:
+            # Normalmente ya se creó al registrarse
+            if user.stripe_customer_id:
+                return user.stripe_customer_id
+
+            cache_key = f"stripe_customer:{user.id}"
+            customer_id = cache.get(cache_key)
+            if customer_id:
+                return customer_id
+
             # Buscar si ya existe un customer
             payment = db.query(Payment).filter(
                 Payment.user_id == user.id,
@@ -32,21 +166,77 @@ class StripeService:
             ).first()
             
             if payment and payment.stripe_customer_id:
-                return payment.stripe_customer_id
-                
-            # Crear nuevo customer en Stripe
-            customer = stripe.Customer.create(
-                email=user.email,
-                name=f"{user.name} {user.last_name}",
-                metadata={"user_id": user.id}
-            )
+                customer_id = payment.stripe_customer_id
+            else:
+                # Crear nuevo customer en Stripe; la llave de idempotencia por usuario hace
+                # que el registro y el primer checkout reciban el mismo customer si lo crean
+                # al mismo tiempo (_store_customer_id guarda uno solo si aun así difieren)
+                customer = self._call(
+                    "customer.create",
+                    stripe.Customer.create,
+                    email=user.email,
+                    name=f"{user.name} {user.last_name}",
+                    metadata={"user_id": user.id},
+                    idempotency_key=f"customer-user-{user.id}"
+                )
+                customer_id = customer.id
             
-            return customer.id
+            customer_id = self._store_customer_id(db, user.id, customer_id)
+            cache.set(cache_key, customer_id, CacheConfig.CUSTOMER_TTL_SECONDS)
+            return customer_id
             
         except stripe.error.StripeError as e:
             logger.error(f"Error creating Stripe customer: {e}")
             raise HTTPException(status_code=400, detail=f"Error creando customer: {str(e)}")
 
+    def _store_customer_id(self, db: Session, user_id: int, customer_id: str) -> str:
+        """
+        Guardar el customer en users.stripe_customer_id si todavía no tiene uno
+        Regresa el customer que quedó guardado (el de otro proceso si ganó la carrera)
+        """
+        result = db.execute(
+            update(User)
+            .where(User.id == user_id, User.stripe_customer_id.is_(None))
+            .values(stripe_customer_id=customer_id)
+            .execution_options(synchronize_session=False)
+        )
+        db.commit()
+        cache.invalidate(f"user:{user_id}")
+        if result.rowcount == 1:
+            return customer_id
+        stored = db.query(User.stripe_customer_id).filter(User.id == user_id).scalar()
+        return stored or customer_id
+
+    def schedule_customer_precreate(self, user_id: int):
+        """
+        Encolar la creación anticipada del customer (registro)
+        Corre en los hilos propios de pre-creación; en una ráfaga de registros los
+        usuarios esperan en la cola en vez de quedarse sin customer
+        """
+        self._precreate_executor.submit(self.precreate_customer, user_id)
+
+    def shutdown(self):
+        """Esperar las creaciones de customers encoladas (lifespan)"""
+        self._precreate_executor.shutdown(wait=True)
+
+    def precreate_customer(self, user_id: int) -> Optional[str]:
+        """
+        Crear por adelantado el customer de Stripe de un usuario
+        Si falla no pasa nada: el primer checkout lo crea como antes
+        """
+        db = SessionLocal()
+        try:
+            user = db.query(User).filter(User.id == user_id).first()
+            if user is None:
+                return None
+            return self.create_or_get_customer(db, user)
+        except Exception as e:
+            db.rollback()
+            logger.warning(f"Could not pre-create Stripe customer for user {user_id}: {e}")
+            return None
+        finally:
+            db.close()
+
 
 
 
@@ -93,7 +283,7 @@ class StripeService:
             }
             
              # Crear Payment Intent
-            payment_intent = stripe.PaymentIntent.create(**intent_params)
+            payment_intent = self._call("payment_intent.create", stripe.PaymentIntent.create, **intent_params)
             
             payment = Payment(
                 user_id=user.id,
@@ -103,12 +293,17 @@ class StripeService:
                 currency=currency,
                 status=payment_intent.status,
                 payment_method_types='customer_balance',
-                description=description
+                description=description,
+                expires_at=payment_state.expiry_for('customer_balance')
             )
 
             db.add(payment)
+            rollup_service.record_payment_created(db, payment)
             db.commit()
             db.refresh(payment)
+            payment_state.invalidate_payment_cache(user.id, payment.stripe_payment_intent_id)
+            self._record_created(payment.user_id, payment.stripe_payment_intent_id, payment.status,
+                                 amount, currency, "api:transfer")
 
             # Preparar respuesta para el frontend
             response = {
@@ -151,76 +346,225 @@ class StripeService:
         except stripe.error.StripeError as e:
             logger.error(f"Stripe error in transfer payment: {e}")
             raise HTTPException(status_code=400, detail=f"Error de Stripe: {str(e)}")
+        except HTTPException:
+            db.rollback()
+            raise
         except Exception as e:
             logger.error(f"Error creating transfer payment intent: {e}")
             db.rollback()
             raise HTTPException(status_code=500, detail="Error interno del servidor")
     
+    def _create_intent_in_stripe(self, user: User, customer_id: str, amount: float, currency: str,
+                                 description: Optional[str], method_type: str):
+        """Crear el Payment Intent en Stripe (sin tocar la base de datos)"""
+        # Convertir amount a centavos (Stripe usa centavos)
+        amount_cents = int(amount * 100)
+        return self._call(
+            "payment_intent.create",
+            stripe.PaymentIntent.create,
+            amount=amount_cents,
+            currency=currency,
+            customer=customer_id,
+            description=description,
+            payment_method_types=[method_type],
+            metadata={
+                "user_id": user.id,
+                "user_email": user.email
+            }
+        )
+
+    def _payment_values(self, user: User, customer_id: str, payment_intent, amount: float,
+                        currency: str, description: Optional[str], method_type: str) -> Dict[str, Any]:
+        """Columnas del registro Payment para un Payment Intent recién creado"""
+        return {
+            "user_id": user.id,
+            "stripe_payment_intent_id": payment_intent.id,
+            "stripe_customer_id": customer_id,
+            "amount": amount,
+            "currency": currency,
+            "status": "pending",
+            "description": description,
+            "payment_method_types": method_type,
+            "expires_at": payment_state.expiry_for(method_type),
+        }
+
+    def _record_created(self, user_id: int, payment_intent_id: str, status: str, amount: float,
+                        currency: str, source: str):
+        """Primer evento de auditoría del pago (sin status anterior)"""
+        audit_writer.record(payment_intent_id, user_id, None, status, amount, currency, source)
+
+    def _store_voucher_expiry(self, db: Session, user_id: int, responses: List[Dict[str, Any]]):
+        """
+        Guardar el vencimiento real de los vouchers OXXO (un UPDATE para todos)
+        Si falla se queda el vencimiento estimado al crear el pago
+        """
+        expiries = [
+            {"intent_id": response["payment_intent_id"],
+             "voucher_expiry": payment_state.oxxo_expiry(response["oxxo_expires_at"])}
+            for response in responses if response.get("oxxo_expires_at")
+        ]
+        if not expiries:
+            return
+        table = Payment.__table__
+        try:
+            db.execute(
+                update(table)
+                .where(table.c.user_id == user_id, table.c.stripe_payment_intent_id == bindparam("intent_id"))
+                .values(expires_at=bindparam("voucher_expiry")),
+                expiries
+            )
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            logger.warning(f"Could not store OXXO expiry for {[row['intent_id'] for row in expiries]}: {e}")
+
+    def _intent_response(self, payment_intent, amount: float, currency: str, method_type: str) -> Dict[str, Any]:
+        """Preparar la respuesta dinámica para el frontend"""
+        response = {
+            "client_secret": payment_intent.client_secret,
+            "payment_intent_id": payment_intent.id,
+            "amount": amount,
+            "currency": currency,
+            "payment_method_types": method_type
+        }
+        # Metodos de pago oxxo y bank_transfer
+        if method_type in ["oxxo", "bank_transfer"]:
+            payment_intent = self._call("payment_intent.retrieve", stripe.PaymentIntent.retrieve, payment_intent.id)
+            if method_type == "oxxo" and payment_intent.next_action:
+                oxxo_details = payment_intent.next_action.get("oxxo_display_details")
+                if oxxo_details:
+                    response["oxxo_voucher_url"] = oxxo_details.get("hosted_voucher_url")
+                    response["oxxo_barcode"] = oxxo_details.get("number")
+                    response["oxxo_expires_at"] = oxxo_details.get("expires_at")
+            if method_type == "bank_transfer" and payment_intent.next_action:
+                # print("Entro a bank transfer")
+                bank_details = payment_intent.next_action.get("display_bank_transfer_instructions")
+                if bank_details:
+                    response["bank_transfer_details"] = bank_details.get("financial_addresses")
+        return response
+
     def create_payment_intent(self, db: Session, user: User, amount: float,
                               currency: str = "mxn", description: str = None,
                               payment_method_types: str = "card") -> Dict[str, Any]:
         try:
-            # Convertir amount a centavos (Stripe usa centavos)
-            amount_cents = int(amount * 100)
             # Crear o obtener customer
             customer_id = self.create_or_get_customer(db, user)
             # Determinar el tipo de método de pago
             method_type = payment_method_types[0].lower()
             
             # Crear Payment Intent con el método de pago específico
-            payment_intent = stripe.PaymentIntent.create(
-                amount=amount_cents,
-                currency=currency,
-                customer=customer_id,
-                description=description,
-                payment_method_types=[method_type],
-                metadata={
-                    "user_id": user.id,
-                    "user_email": user.email
-                }
+            payment_intent = self._create_intent_in_stripe(
+                user, customer_id, amount, currency, description, method_type
             )
-            # print(f"Payment_intent {payment_intent}")
             # Guardar en la base de datos
-            db_payment = Payment(
-                user_id=user.id,
-                stripe_payment_intent_id=payment_intent.id,
-                stripe_customer_id=customer_id,
-                amount=amount,
-                currency=currency,
-                status="pending",
-                description=description,
-                payment_method_types=method_type
-            )
+            db_payment = Payment(**self._payment_values(
+                user, customer_id, payment_intent, amount, currency, description, method_type
+            ))
             db.add(db_payment)
+            rollup_service.record_payment_created(db, db_payment)
             db.commit()
             db.refresh(db_payment)
-            # Preparar respuesta dinámica
-            response = {
-                "client_secret": payment_intent.client_secret,
-                "payment_intent_id": payment_intent.id,
-                "amount": amount,
-                "currency": currency,
-                "payment_method_types": method_type
-            }
-            # Metodos de pago oxxo y bank_transfer
-            if method_type in ["oxxo", "bank_transfer"]:
-                payment_intent = stripe.PaymentIntent.retrieve(payment_intent.id)
-                if method_type == "oxxo" and payment_intent.next_action:
-                    oxxo_details = payment_intent.next_action.get("oxxo_display_details")
-                    if oxxo_details:
-                        response["oxxo_voucher_url"] = oxxo_details.get("hosted_voucher_url")
-                        response["oxxo_barcode"] = oxxo_details.get("number")
-                        response["oxxo_expires_at"] = oxxo_details.get("expires_at")
-                if method_type == "bank_transfer" and payment_intent.next_action:
-                    # print("Entro a bank transfer")
-                    bank_details = payment_intent.next_action.get("display_bank_transfer_instructions")
-                    if bank_details:
-                        response["bank_transfer_details"] = bank_details.get("financial_addresses")
+            payment_state.invalidate_payment_cache(user.id, db_payment.stripe_payment_intent_id)
+            self._record_created(db_payment.user_id, db_payment.stripe_payment_intent_id, db_payment.status,
+                                 amount, currency, "api:create")
+            response = self._intent_response(payment_intent, amount, currency, method_type)
+            self._store_voucher_expiry(db, user.id, [response])
             return response
         except stripe.error.StripeError as e:
             logger.error(f"Error creating payment intent: {e}")
             raise HTTPException(status_code=400, detail=f"Error creando pago: {str(e)}")
 
+    def create_payment_intents_batch(self, db: Session, user: User, items: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Crear varios Payment Intents en una sola petición
+
+        - items: dicts con amount/currency/description/method_type ya resueltos, o
+          con "error" si el item no es válido (se reporta sin llamar a Stripe)
+        - El customer se resuelve una sola vez
+        - Los intents se crean en paralelo con un máximo de BATCH_PARALLELISM hilos
+        - Todos los pagos se insertan con un solo INSERT de varias filas
+        Regresa un resultado por item, en el mismo orden
+        """
+        results: List[Dict[str, Any]] = [
+            {"index": index, "success": False, "error": item.get("error")} for index, item in enumerate(items)
+        ]
+        pending = [index for index, item in enumerate(items) if not item.get("error")]
+        if not pending:
+            return results
+
+        customer_id = self.create_or_get_customer(db, user)
+
+        def create(index: int):
+            item = items[index]
+            payment_intent = self._create_intent_in_stripe(
+                user, customer_id, item["amount"], item["currency"], item.get("description"), item["method_type"]
+            )
+            values = self._payment_values(
+                user, customer_id, payment_intent, item["amount"], item["currency"],
+                item.get("description"), item["method_type"]
+            )
+            try:
+                response = self._intent_response(payment_intent, item["amount"], item["currency"], item["method_type"])
+            except Exception as e:
+                # El intent ya existe: se guarda aunque falten los detalles de OXXO/transferencia
+                return values, None, e
+            return values, response, None
+
+        payment_rows = []
+        workers = min(len(pending), StripeConfig.BATCH_PARALLELISM)
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="stripe-batch") as executor:
+            futures = {
+                index: executor.submit(contextvars.copy_context().run, create, index) for index in pending
+            }
+            for index, future in futures.items():
+                try:
+                    values, response, error = future.result()
+                except HTTPException as e:
+                    results[index]["error"] = e.detail
+                    continue
+                except stripe.error.StripeError as e:
+                    logger.error(f"Error creating payment intent in batch: {e}")
+                    results[index]["error"] = f"Error creando pago: {e.user_message or str(e)}"
+                    continue
+                except Exception as e:
+                    # Un item con un error inesperado no impide guardar los intents de los demás
+                    logger.exception(f"Unexpected error creating payment intent in batch: {e}")
+                    results[index]["error"] = "Error interno del servidor"
+                    continue
+                payment_rows.append(values)
+                if isinstance(error, (HTTPException, stripe.error.StripeError)):
+                    results[index]["error"] = getattr(error, "detail", None) or str(error)
+                elif error is not None:
+                    logger.error(f"Error building response for batch intent {values['stripe_payment_intent_id']}: {error}")
+                    results[index]["error"] = "Error interno del servidor"
+                else:
+                    results[index].update(success=True, error=None, payment=response)
+
+        if payment_rows:
+            now = datetime.utcnow()
+            for values in payment_rows:
+                values["created_at"] = now
+                values["updated_at"] = now
+            try:
+                # INSERT de Core: la sesión con shards no admite el bulk insert del ORM
+                db.execute(insert(Payment.__table__), payment_rows)
+                rollup_service.record_payments_created(db, [Payment(**values) for values in payment_rows])
+                db.commit()
+            except Exception as e:
+                db.rollback()
+                logger.error(
+                    "Error saving batch payments, orphan intents: "
+                    f"{[values['stripe_payment_intent_id'] for values in payment_rows]}: {e}"
+                )
+                raise HTTPException(status_code=500, detail="Error interno del servidor")
+            for values in payment_rows:
+                payment_state.invalidate_payment_cache(user.id, values["stripe_payment_intent_id"])
+                self._record_created(values["user_id"], values["stripe_payment_intent_id"], values["status"],
+                                     values["amount"], values["currency"], "api:batch")
+            self._store_voucher_expiry(db, user.id, [result["payment"] for result in results if result["success"]])
+
+        return results
+
     def handle_webhook_event(self, db: Session, payload: bytes, sig_header: str) -> Dict[str, Any]:
         """
         Manejar eventos de webhook de Stripe
@@ -237,36 +581,80 @@ class StripeService:
             raise HTTPException(status_code=400, detail="Invalid signature")
 
         # Manejar el evento
+        source = f"webhook:{event['type']}"
         if event["type"] == "payment_intent.succeeded":
-            self._handle_payment_succeeded(db, event["data"]["object"])
+            self._handle_payment_succeeded(db, event["data"]["object"], source)
         elif event["type"] == "payment_intent.payment_failed":
-            self._handle_payment_failed(db, event["data"]["object"])
+            self._handle_payment_failed(db, event["data"]["object"], source)
+        elif event["type"] == "charge.refunded":
+            self._handle_charge_refunded(db, event["data"]["object"], source)
         else:
             logger.info(f"Unhandled event type: {event['type']}")
 
         return {"status": "success"}
 
-    def _handle_payment_succeeded(self, db: Session, payment_intent: Dict[str, Any]):
+    def _handle_payment_succeeded(self, db: Session, payment_intent: Dict[str, Any], source: str = "webhook"):
         """Manejar pago exitoso"""
-        payment = db.query(Payment).filter(
-            Payment.stripe_payment_intent_id == payment_intent["id"]
-        ).first()
-        
-        if payment:
-            payment.status = "succeeded"
-            payment.updated_at = datetime.utcnow()
-            db.commit()
+        self._transition_payment(db, payment_intent, "succeeded", source)
 
-    def _handle_payment_failed(self, db: Session, payment_intent: Dict[str, Any]):
+    def _handle_payment_failed(self, db: Session, payment_intent: Dict[str, Any], source: str = "webhook"):
         """Manejar pago fallido"""
-        payment = db.query(Payment).filter(
-            Payment.stripe_payment_intent_id == payment_intent["id"]
-        ).first()
-        
-        if payment:
-            payment.status = "failed"
-            payment.updated_at = datetime.utcnow()
-            db.commit()
+        self._transition_payment(db, payment_intent, "failed", source)
+
+    def _handle_charge_refunded(self, db: Session, charge: Dict[str, Any], source: str = "webhook"):
+        """
+        Manejar reembolso (desde el dashboard o un job de reembolso masivo)
+        Sólo un reembolso total cambia el status del pago
+        """
+        if not charge.get("payment_intent"):
+            logger.info(f"Refunded charge {charge.get('id')} has no payment intent")
+            return
+        if not charge.get("refunded"):
+            logger.info(
+                f"Partial refund of {charge.get('amount_refunded')} on {charge['payment_intent']}, status unchanged"
+            )
+            return
+        self._transition_payment(
+            db, {"id": charge["payment_intent"], "metadata": charge.get("metadata")}, "refunded", source
+        )
+
+    def _transition_payment(self, db: Session, payment_intent: Dict[str, Any], new_status: str,
+                            source: str = "webhook"):
+        """
+        Cambiar el status del pago en su shard
+        Los ids de Stripe no llevan prefijo propio: el shard sale del user_id que se
+        guarda en la metadata del intent al crearlo. Sin metadata (o si no está ahí)
+        se busca el pago en todos los shards
+        """
+        user_id = (payment_intent.get("metadata") or {}).get("user_id")
+        if user_id:
+            pin_shard(db, int(user_id))
+            payment = payment_state.transition_payment_status(db, payment_intent["id"], new_status, source)
+            if payment is not None or len(SHARD_ENGINES) == 1:
+                return payment
+            db.info.pop("shard_id", None)
+        return payment_state.transition_payment_status(db, payment_intent["id"], new_status, source)
+
+    def cancel_payment_intent(self, payment_intent_id: str):
+        """Cancelar un Payment Intent que nadie pagó (services/expiry_service.py)"""
+        return self._call(
+            "payment_intent.cancel", stripe.PaymentIntent.cancel, payment_intent_id,
+            cancellation_reason="abandoned"
+        )
+
+    def retrieve_payment_intent(self, payment_intent_id: str):
+        return self._call("payment_intent.retrieve", stripe.PaymentIntent.retrieve, payment_intent_id)
+
+    def refund_payment_intent(self, payment_intent_id: str, idempotency_key: str,
+                              reason: Optional[str] = None, metadata: Optional[Dict[str, Any]] = None):
+        """
+        Reembolso total de un Payment Intent (services/refund_service.py)
+        Con la misma llave de idempotencia Stripe regresa el mismo reembolso
+        """
+        params = {"payment_intent": payment_intent_id, "metadata": metadata or {}}
+        if reason:
+            params["reason"] = reason
+        return self._call("refund.create", stripe.Refund.create, idempotency_key=idempotency_key, **params)
 
     # Métodos para productos
     def create_product_in_stripe(self, db: Session, product_data: Dict[str, Any]) -> Dict[str, Any]:
@@ -275,14 +663,18 @@ class StripeService:
         """
         try:
             # Crear producto en Stripe
-            stripe_product = stripe.Product.create(
+            stripe_product = self._call(
+                "product.create",
+                stripe.Product.create,
                 name=product_data["name"],
                 description=product_data.get("description"),
                 metadata={"created_from_api": "true"}
             )
             
             # Crear precio para pago único
-            stripe_price = stripe.Price.create(
+            stripe_price = self._call(
+                "price.create",
+                stripe.Price.create,
                 unit_amount=int(product_data["price"] * 100),  # Convertir a centavos
                 currency=product_data.get("currency", "usd"),
                 product=stripe_product.id,
@@ -0,0 +1,75 @@
+import logging
+from typing import Dict, Iterable, Optional
+
+from fastapi import HTTPException
+from sqlalchemy import bindparam, delete, insert, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from database import shard_for_user
+from models import UserDirectory
+
+logger = logging.getLogger(__name__)
+
+# Directorio global de usuarios (tabla user_directory en la base global).
+# El login y el registro sólo conocen el email: aquí se resuelve a qué id y
+# shard pertenece, y su autoincremental reparte ids únicos entre shards.
+# Se escribe con su propio commit antes de insertar al usuario en su shard.
+
+
+def lookup(db: Session, email: str) -> Optional[UserDirectory]:
+    """Entrada del directorio para un email (None si no existe)"""
+    return db.query(UserDirectory).filter(UserDirectory.email == email).first()
+
+
+def allocate_user_id(db: Session, email: str) -> int:
+    """
+    Reservar el email y asignar el id del usuario nuevo
+    Si el email ya está registrado responde 400
+    """
+    try:
+        entry = UserDirectory(email=email)
+        db.add(entry)
+        db.flush()
+        entry.shard = shard_for_user(entry.id)
+        db.commit()
+    except IntegrityError:
+        db.rollback()
+        raise HTTPException(status_code=400, detail="Email already registered")
+    return entry.id
+
+
+def allocate_user_ids(db: Session, emails: Iterable[str]) -> Dict[str, int]:
+    """
+    Asignar ids a varios emails con un INSERT de varias filas (importaciones)
+    Los emails que ya están en el directorio se omiten del resultado
+    """
+    emails = list(emails)
+    if not emails:
+        return {}
+    taken = set(db.scalars(select(UserDirectory.email).where(UserDirectory.email.in_(emails))))
+    new_emails = [email for email in emails if email not in taken]
+    if new_emails:
+        db.execute(insert(UserDirectory.__table__), [{"email": email} for email in new_emails])
+    rows = db.execute(
+        select(UserDirectory.id, UserDirectory.email).where(UserDirectory.email.in_(new_emails))
+    ).all() if new_emails else []
+    allocated = {email: user_id for user_id, email in rows}
+    if allocated:
+        table = UserDirectory.__table__
+        db.execute(
+            update(table).where(table.c.id == bindparam("directory_id")).values(shard=bindparam("shard")),
+            [{"directory_id": user_id, "shard": shard_for_user(user_id)} for user_id in allocated.values()]
+        )
+    db.commit()
+    return allocated
+
+
+def release(db: Session, *emails: str):
+    """Liberar emails reservados cuando los usuarios no se pudieron crear en su shard"""
+    try:
+        db.execute(delete(UserDirectory).where(UserDirectory.email.in_(emails)))
+        db.commit()
+    except Exception as e:
+        db.rollback()
+        logger.error(f"Could not release directory entries for {', '.join(emails)}: {e}")
@@ -0,0 +1,185 @@
+import logging
+import threading
+import time
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from sqlalchemy import text
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import configure_mappers
+
+from config.cache_config import CacheConfig
+from config.warmup_config import WarmupConfig
+from database import SessionLocal, database_engines
+from services.product_catalog import product_catalog, list_active_products
+from services.stripe_service import stripe_service
+from utils.cache import cache
+from utils.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# Sin calentar, las primeras peticiones de cada worker pagan la conexión a la
+# base de datos, el handshake TLS con Stripe y la configuración perezosa de los
+# mappers de SQLAlchemy. El warm-up corre en un hilo al arrancar y /health/ready
+# responde 503 hasta que termina, así el balanceador no le manda tráfico antes.
+# Si un paso obligatorio no se recupera con los reintentos el hilo lo sigue
+# intentando con más calma: el worker no se queda fuera del balanceador para siempre.
+
+
+def _prefill_pool(engine: Engine, connections: int) -> int:
+    """Abrir `connections` conexiones a la vez y regresarlas al pool"""
+    if connections <= 0:
+        size = getattr(engine.pool, "size", None)
+        connections = size() if callable(size) else 1
+    opened = []
+    try:
+        for _ in range(connections):
+            connection = engine.connect()
+            opened.append(connection)
+            connection.execute(text("SELECT 1"))
+    finally:
+        for connection in opened:
+            connection.close()
+    return len(opened)
+
+
+def warm_database() -> Dict[str, int]:
+    return {name: _prefill_pool(engine, WarmupConfig.DB_CONNECTIONS) for name, engine in database_engines().items()}
+
+
+def warm_mappers():
+    configure_mappers()
+
+
+def warm_stripe():
+    stripe_service.warm_up()
+
+
+def warm_caches() -> Dict[str, int]:
+    product_catalog.load()
+    db = SessionLocal()
+    try:
+        products = list_active_products(db)
+    finally:
+        db.close()
+    cache.set("products:active", products, CacheConfig.PRODUCT_TTL_SECONDS)
+    return {"active_products": len(products)}
+
+
+class Warmup:
+    """
+    Estado del calentamiento del worker
+
+    - starting -> warming -> ready
+    - failed si un paso obligatorio agota sus reintentos: se sigue reintentando en
+      segundo plano y el worker pasa a ready en cuanto se recupera
+    - stopping al apagarse, para que /health/ready deje de anunciar el worker
+    """
+
+    def __init__(self, steps: List[Tuple[str, Callable[[], Any], bool]]):
+        self.steps = steps  # (nombre, función, obligatorio)
+        self.status = "starting"
+        self.results: Dict[str, Dict[str, Any]] = {}
+        self.started_at: Optional[datetime] = None
+        self.finished_at: Optional[datetime] = None
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def ready(self) -> bool:
+        return self.status == "ready"
+
+    def start(self):
+        """Correr el warm-up en un hilo (el servidor ya responde /health/live mientras tanto)"""
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self.run, name="warmup", daemon=True)
+            self._thread.start()
+
+    def skip(self):
+        """Warm-up deshabilitado: el worker queda listo sin calentar"""
+        self.status = "ready"
+
+    def _set_status(self, status: str):
+        with self._lock:
+            if self.status != "stopping":
+                self.status = status
+
+    def _run_step(self, name: str, step: Callable[[], Any], required: bool) -> bool:
+        """
+        Correr un paso; regresa False sólo si el worker se apagó antes de completarlo
+        Un paso opcional se intenta una vez; uno obligatorio se reintenta hasta que funcione
+        """
+        attempt = 0
+        while not self._stopped.is_set():
+            attempt += 1
+            started = time.perf_counter()
+            try:
+                detail = step()
+            except Exception as e:
+                self.results[name] = {
+                    "ok": False, "required": required, "attempts": attempt,
+                    "duration_ms": round((time.perf_counter() - started) * 1000, 1), "error": str(e),
+                }
+                if not required:
+                    logger.warning(f"Warm-up step {name} failed: {e}")
+                    return True
+                if attempt < WarmupConfig.MAX_ATTEMPTS:
+                    logger.warning(f"Warm-up step {name} failed (attempt {attempt}/{WarmupConfig.MAX_ATTEMPTS}): {e}")
+                    self._stopped.wait(WarmupConfig.RETRY_SECONDS)
+                    continue
+                if attempt == WarmupConfig.MAX_ATTEMPTS:
+                    self._set_status("failed")
+                    logger.error(f"Warm-up step {name} failed {attempt} times, retrying every "
+                                 f"{WarmupConfig.RECOVERY_RETRY_SECONDS}s: {self.results}")
+                self._stopped.wait(WarmupConfig.RECOVERY_RETRY_SECONDS)
+                continue
+            self.results[name] = {
+                "ok": True, "required": required, "attempts": attempt,
+                "duration_ms": round((time.perf_counter() - started) * 1000, 1), "detail": detail,
+            }
+            if self.status == "failed":
+                logger.info(f"Warm-up step {name} recovered after {attempt} attempts")
+                self._set_status("warming")
+            return True
+        return False
+
+    def run(self):
+        self._set_status("warming")
+        self.started_at = datetime.utcnow()
+        started = time.perf_counter()
+        for name, step, required in self.steps:
+            if not self._run_step(name, step, required):
+                return
+        self.finished_at = datetime.utcnow()
+        self._set_status("ready")
+        logger.info(f"Warm-up finished in {time.perf_counter() - started:.2f}s")
+
+    def stop(self):
+        with self._lock:
+            self.status = "stopping"
+        self._stopped.set()
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "status": self.status,
+            "started_at": self.started_at.isoformat() if self.started_at else None,
+            "finished_at": self.finished_at.isoformat() if self.finished_at else None,
+            "steps": self.results,
+        }
+
+
+# Instancia global; el orden importa: mappers y pool antes de consultar productos
+warmup = Warmup([
+    ("mappers", warm_mappers, True),
+    ("database", warm_database, True),
+    *([("stripe", warm_stripe, WarmupConfig.REQUIRE_STRIPE)] if WarmupConfig.STRIPE else []),
+    ("caches", warm_caches, False),
+])
+
+metrics.callback_gauge(
+    "app_ready", "1 si el worker terminó el warm-up y acepta tráfico",
+    lambda: [({"status": warmup.status}, 1 if warmup.ready else 0)]
+)
@@ -0,0 +1,203 @@
+"""
+Prueba de carga del control de concurrencia optimista (services/concurrency.py)
+
+Corre varios hilos contra la misma fila y verifica que no se pierdan escrituras:
+  1. Producto: cada hilo suma 1 al precio con update_with_retry. El precio final
+     debe ser el inicial + hilos x escrituras, y version = 1 + número de escrituras
+  2. Pago: los hilos mandan "failed" y "succeeded" al mismo pago con
+     transition_payment_status. Debe terminar en succeeded (es final), cada cambio
+     aplicado debe tener su evento de auditoría (version = 1 + cambios) y el rollup
+     del día debe contar el pago una sola vez como exitoso
+También compara la latencia con y sin contención (sin SELECT ... FOR UPDATE los
+escritores no se bloquean: sólo reintentan cuando pierden la carrera). Con una
+sola fila caliente las escrituras se hacen una tras otra, así que lo mínimo es
+~ hilos x la latencia sin contención; falla si la p50 o la p95 con contención
+superan eso por más de --max-p50-slowdown / --max-p95-slowdown veces. La p95
+tiene más margen: SQLite bloquea todo el archivo al escribir y espera hasta
+100ms entre reintentos del lock, lo que no pasa con los locks por fila de MySQL
+
+Por defecto usa una base SQLite temporal; NUNCA apuntarlo a producción.
+
+Uso:
+    python stress_concurrency.py
+    python stress_concurrency.py --threads 16 --writes 50
+    python stress_concurrency.py --database-url mysql+pymysql://root@localhost/tudi_stress
+    python stress_concurrency.py --max-p95-slowdown 5  # margen sobre hilos x p95 sin contención
+    python stress_concurrency.py --max-p95-ms 200     # además, un tope absoluto para la p95 con contención
+"""
+
+import sys
+import os
+import argparse
+import statistics
+import tempfile
+import threading
+import time
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Prueba de concurrencia de Payment / Product")
+    parser.add_argument("--threads", type=int, default=8, help="Hilos escribiendo a la vez")
+    parser.add_argument("--writes", type=int, default=25, help="Escrituras por hilo")
+    parser.add_argument("--database-url", default=None,
+                        help="Base de pruebas (por defecto un archivo SQLite temporal)")
+    parser.add_argument("--max-p50-slowdown", type=float, default=3,
+                        help="Fallar si la p50 con contención supera hilos x p50 sin contención por más de este factor")
+    parser.add_argument("--max-p95-slowdown", type=float, default=20,
+                        help="Fallar si la p95 con contención supera hilos x p95 sin contención por más de este factor")
+    parser.add_argument("--max-p95-ms", type=float, default=None,
+                        help="Fallar si la p95 con contención supera este valor")
+    return parser.parse_args()
+
+
+args = parse_args()
+# La configuración de la base se lee al importar database: fijarla antes
+scratch = os.path.join(tempfile.mkdtemp(prefix="tudi-stress-"), "stress.db")
+os.environ["DATABASE_SHARD_URLS"] = args.database_url or f"sqlite:///{scratch}"
+os.environ.pop("DATABASE_DIRECTORY_URL", None)
+
+from datetime import date
+from database import SessionLocal, database_engines
+from models import Base, Payment, PaymentAuditEvent, Product, User
+from services import concurrency, payment_state, rollup_service
+from services.audit_service import audit_writer
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+def run_threads(threads: int, writes: int, work):
+    """Correr `work(i)` threads x writes veces; regresa las latencias en ms"""
+    latencies = []
+    lock = threading.Lock()
+    start = threading.Barrier(threads)
+
+    def worker(index: int):
+        start.wait()
+        for i in range(writes):
+            began = time.perf_counter()
+            work(index * writes + i)
+            with lock:
+                latencies.append((time.perf_counter() - began) * 1000)
+
+    pool = [threading.Thread(target=worker, args=(index,)) for index in range(threads)]
+    for thread in pool:
+        thread.start()
+    for thread in pool:
+        thread.join()
+    return latencies
+
+
+def increment_price(product_id: int):
+    def work(_):
+        db = SessionLocal()
+        try:
+            concurrency.update_with_retry(
+                db, Product, [Product.id == product_id],
+                lambda product: {"price": product.price + 1},
+                max_attempts=1000
+            )
+        finally:
+            db.close()
+    return work
+
+
+def report(name: str, latencies):
+    print(f"  {name}: {len(latencies)} escrituras, p50={statistics.median(latencies):.1f}ms "
+          f"p95={percentile(latencies, 0.95):.1f}ms")
+
+
+def main():
+    failures = []
+    for engine in database_engines().values():
+        Base.metadata.create_all(bind=engine)
+
+    db = SessionLocal()
+    product = Product(name="stress", price=0, currency="usd", is_active=True)
+    db.add(product)
+    db.commit()
+    product_id = product.id
+    db.close()
+
+    total = args.threads * args.writes
+    print(f"1. Producto: {args.threads} hilos x {args.writes} incrementos del precio")
+    baseline = run_threads(1, total, increment_price(product_id))
+    contended = run_threads(args.threads, args.writes, increment_price(product_id))
+    report("sin contención", baseline)
+    report("con contención", contended)
+
+    db = SessionLocal()
+    product = db.query(Product).filter(Product.id == product_id).one()
+    expected = 2 * total
+    if product.price == expected and product.version == 1 + expected:
+        print(f"✓ precio={product.price:.0f} version={product.version}: ninguna escritura perdida")
+    else:
+        failures.append(f"producto: precio={product.price} version={product.version}, esperado {expected}")
+    db.close()
+
+    print(f"\n2. Pago: {args.threads} hilos x {args.writes} webhooks failed/succeeded al mismo pago")
+    db = SessionLocal()
+    user = User(name="stress", last_name="test", email=f"stress-{time.time_ns()}@example.com")
+    db.add(user)
+    db.commit()
+    payment = Payment(user_id=user.id, stripe_payment_intent_id=f"pi_stress_{time.time_ns()}",
+                      amount=10, currency="usd", status="pending", payment_method_types="card")
+    db.add(payment)
+    rollup_service.record_payment_created(db, payment)
+    db.commit()
+    user_id, payment_intent_id = user.id, payment.stripe_payment_intent_id
+    db.close()
+
+    def deliver(index: int):
+        db = SessionLocal()
+        try:
+            new_status = "succeeded" if index % 3 == 2 else "failed"
+            payment_state.transition_payment_status(db, payment_intent_id, new_status, "stress")
+        finally:
+            db.close()
+
+    report("con contención", run_threads(args.threads, args.writes, deliver))
+    audit_writer.flush()
+
+    db = SessionLocal()
+    payment = db.query(Payment).filter(Payment.stripe_payment_intent_id == payment_intent_id,
+                                       Payment.user_id == user_id).one()
+    changes = db.query(PaymentAuditEvent).filter(
+        PaymentAuditEvent.stripe_payment_intent_id == payment_intent_id,
+        PaymentAuditEvent.user_id == user_id
+    ).count()
+    rollups = [row for row in rollup_service.get_daily_rollups(db, date.today()) if row["currency"] == "usd"]
+    db.close()
+
+    if payment.status != "succeeded":
+        failures.append(f"pago: status final {payment.status}, esperado succeeded")
+    if audit_writer.enabled and payment.version != 1 + changes:
+        failures.append(f"pago: version={payment.version} pero {changes} cambios auditados")
+    if not rollups or rollups[0]["succeeded_count"] != 1 or rollups[0]["failed_count"] != 0:
+        failures.append(f"rollup: {rollups}")
+    if not failures:
+        print(f"✓ status={payment.status} version={payment.version} cambios={changes}, rollup consistente")
+
+    for name, fraction, slowdown in (("p50", 0.5, args.max_p50_slowdown), ("p95", 0.95, args.max_p95_slowdown)):
+        contended_ms, baseline_ms = percentile(contended, fraction), percentile(baseline, fraction)
+        allowed_ms = slowdown * args.threads * baseline_ms
+        summary = (f"{name} con contención {contended_ms:.1f}ms, máximo {allowed_ms:.1f}ms "
+                   f"({slowdown:g} x {args.threads} hilos x {baseline_ms:.1f}ms sin contención)")
+        if contended_ms > allowed_ms:
+            failures.append(f"latencia: {summary}")
+        else:
+            print(f"✓ {summary}")
+    contended_p95 = percentile(contended, 0.95)
+    if args.max_p95_ms is not None and contended_p95 > args.max_p95_ms:
+        failures.append(f"latencia: p95 con contención {contended_p95:.1f}ms > {args.max_p95_ms}ms")
+
+    for failure in failures:
+        print(f"✗ {failure}")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,274 @@
+import abc
+import json
+import logging
+import pickle
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Any, Callable, Iterable, List, Optional
+
+from config.cache_config import CacheConfig
+
+try:
+    import redis
+except ImportError:  # redis es opcional: sin él sólo existe el backend en memoria
+    redis = None
+
+logger = logging.getLogger(__name__)
+
+_MISSING = object()
+
+
+# Serializadores
+class Serializer(abc.ABC):
+    """Convierte valores a bytes para backends fuera del proceso"""
+
+    @abc.abstractmethod
+    def dumps(self, value: Any) -> bytes:
+        ...
+
+    @abc.abstractmethod
+    def loads(self, data: bytes) -> Any:
+        ...
+
+
+class JsonSerializer(Serializer):
+    """JSON; fechas y decimales se guardan como texto (pydantic los vuelve a parsear)"""
+
+    @staticmethod
+    def _default(value):
+        if isinstance(value, (datetime, date)):
+            return value.isoformat()
+        if isinstance(value, Decimal):
+            return float(value)
+        raise TypeError(f"Tipo no serializable: {type(value).__name__}")
+
+    def dumps(self, value: Any) -> bytes:
+        return json.dumps(value, default=self._default, separators=(",", ":")).encode()
+
+    def loads(self, data: bytes) -> Any:
+        return json.loads(data)
+
+
+class PickleSerializer(Serializer):
+    """Pickle; sólo para datos generados por la propia aplicación"""
+
+    def dumps(self, value: Any) -> bytes:
+        return pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+
+    def loads(self, data: bytes) -> Any:
+        return pickle.loads(data)
+
+
+# Backends
+class MemoryCacheBackend:
+    """LRU con TTL por entrada; guarda los valores tal cual (sin serializar)"""
+
+    def __init__(self, max_entries: int = 10000):
+        self._max_entries = max_entries
+        self._entries = OrderedDict()  # key -> (expira_en, valor)
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Any:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return _MISSING
+            expires_at, value = entry
+            if expires_at is not None and expires_at <= time.monotonic():
+                del self._entries[key]
+                return _MISSING
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: Any, ttl: Optional[int] = None):
+        expires_at = time.monotonic() + ttl if ttl else None
+        with self._lock:
+            self._entries[key] = (expires_at, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self._max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, keys: Iterable[str]):
+        with self._lock:
+            for key in keys:
+                self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class RedisCacheBackend:
+    """Backend compartido sobre un servidor compatible con Redis"""
+
+    def __init__(self, url: str, serializer: Serializer):
+        if redis is None:
+            raise RuntimeError("El paquete 'redis' es necesario para RedisCacheBackend")
+        self.client = redis.Redis.from_url(url, socket_timeout=0.2, socket_connect_timeout=0.2)
+        self._serializer = serializer
+
+    def get(self, key: str) -> Any:
+        data = self.client.get(key)
+        return _MISSING if data is None else self._serializer.loads(data)
+
+    def set(self, key: str, value: Any, ttl: Optional[int] = None):
+        self.client.set(key, self._serializer.dumps(value), ex=ttl)
+
+    def delete(self, keys: Iterable[str]):
+        keys = list(keys)
+        if keys:
+            self.client.delete(*keys)
+
+
+# Invalidación entre workers
+class RedisInvalidationBus:
+    """
+    Publica las llaves invalidadas en un canal; cada worker escucha en un hilo
+    y borra su copia local. Se reconecta solo si el servidor se reinicia.
+    """
+
+    def __init__(self, client, channel: str, on_invalidate: Callable[[Iterable[str]], None]):
+        self._client = client
+        self._channel = channel
+        self._on_invalidate = on_invalidate
+        self._origin = uuid.uuid4().hex
+        self._thread = None
+
+    def publish(self, keys: Iterable[str]):
+        message = json.dumps({"origin": self._origin, "keys": list(keys)})
+        self._client.publish(self._channel, message)
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._listen, name="cache-invalidation", daemon=True)
+            self._thread.start()
+
+    def _listen(self):
+        while True:
+            try:
+                pubsub = self._client.pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(self._channel)
+                for message in pubsub.listen():
+                    payload = json.loads(message["data"])
+                    if payload.get("origin") != self._origin:
+                        self._on_invalidate(payload.get("keys", []))
+            except Exception as e:
+                logger.warning(f"Cache invalidation listener error, reconnecting: {e}")
+                # Lo que se haya perdido mientras tanto expira por el TTL local
+                time.sleep(1)
+
+
+class Cache:
+    """
+    Cache de dos niveles: copia local por worker (LRU/TTL) y, opcionalmente,
+    un backend compartido. Los errores del backend compartido se tratan como
+    un miss para que el cache nunca tumbe una petición.
+    """
+
+    def __init__(self, local: MemoryCacheBackend, shared=None, invalidation_bus=None,
+                 prefix: str = "tudi", local_ttl: Optional[int] = None, enabled: bool = True):
+        self.local = local
+        self.shared = shared
+        self.invalidation_bus = invalidation_bus
+        self.prefix = prefix
+        self.local_ttl = local_ttl
+        self.enabled = enabled
+        self._listeners: List[Callable[[List[str]], None]] = []
+
+    def _key(self, key: str) -> str:
+        return f"{self.prefix}:{key}"
+
+    def add_invalidation_listener(self, listener: Callable[[List[str]], None]):
+        """Registrar una función que recibe las llaves invalidadas por otros workers"""
+        self._listeners.append(listener)
+
+    def handle_remote_invalidation(self, full_keys: Iterable[str]):
+        """Aplicar una invalidación publicada por otro worker"""
+        full_keys = list(full_keys)
+        self.local.delete(full_keys)
+        prefix = f"{self.prefix}:"
+        keys = [key[len(prefix):] for key in full_keys if key.startswith(prefix)]
+        for listener in self._listeners:
+            try:
+                listener(keys)
+            except Exception as e:
+                logger.warning(f"Cache invalidation listener failed: {e}")
+
+    def get(self, key: str, default: Any = None) -> Any:
+        if not self.enabled:
+            return default
+        full_key = self._key(key)
+        value = self.local.get(full_key)
+        if value is not _MISSING:
+            return value
+        if self.shared is not None:
+            try:
+                value = self.shared.get(full_key)
+            except Exception as e:
+                logger.warning(f"Shared cache get failed: {e}")
+                return default
+            if value is not _MISSING:
+                self.local.set(full_key, value, self.local_ttl)
+                return value
+        return default
+
+    def set(self, key: str, value: Any, ttl: Optional[int] = None):
+        if not self.enabled:
+            return
+        full_key = self._key(key)
+        local_ttl = min(filter(None, [ttl, self.local_ttl]), default=None)
+        self.local.set(full_key, value, local_ttl)
+        if self.shared is not None:
+            try:
+                self.shared.set(full_key, value, ttl)
+            except Exception as e:
+                logger.warning(f"Shared cache set failed: {e}")
+
+    def get_or_set(self, key: str, loader: Callable[[], Any], ttl: Optional[int] = None) -> Any:
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            value = loader()
+            if value is not None:
+                self.set(key, value, ttl)
+        return value
+
+    def invalidate(self, *keys: str):
+        """Borrar llaves en este worker, en el backend compartido y en los demás workers"""
+        full_keys = [self._key(key) for key in keys]
+        self.local.delete(full_keys)
+        if self.shared is not None:
+            try:
+                self.shared.delete(full_keys)
+                if self.invalidation_bus is not None:
+                    self.invalidation_bus.publish(full_keys)
+            except Exception as e:
+                logger.warning(f"Shared cache invalidation failed: {e}")
+
+
+def _build_cache() -> Cache:
+    local = MemoryCacheBackend(max_entries=CacheConfig.LOCAL_MAX_ENTRIES)
+    if not CacheConfig.REDIS_URL:
+        return Cache(local, prefix=CacheConfig.KEY_PREFIX, enabled=CacheConfig.ENABLED)
+
+    shared = RedisCacheBackend(CacheConfig.REDIS_URL, JsonSerializer())
+    cache = Cache(
+        local,
+        shared=shared,
+        prefix=CacheConfig.KEY_PREFIX,
+        local_ttl=CacheConfig.LOCAL_TTL_SECONDS,
+        enabled=CacheConfig.ENABLED,
+    )
+    cache.invalidation_bus = RedisInvalidationBus(
+        shared.client, CacheConfig.INVALIDATION_CHANNEL, cache.handle_remote_invalidation
+    )
+    if CacheConfig.ENABLED:
+        cache.invalidation_bus.start()
+    return cache
+
+
+# Instancia global del cache
+cache = _build_cache()
@@ -1,13 +1,54 @@
+import hmac
 from fastapi import Depends, HTTPException, status
-from fastapi.security import OAuth2PasswordBearer
+from fastapi.security import APIKeyHeader, OAuth2PasswordBearer
 from jose import jwt, JWTError
 from sqlalchemy.orm import Session
+from typing import Optional
 from services.auth_service import SECRET_KEY, ALGORITHM
-from database import get_db
+from database import get_db, pin_shard
 from models import User
+from utils.cache import cache
+from config.cache_config import CacheConfig
+from config.auth_config import AuthConfig
+from utils.tracing import tracer
+
+# Campos del usuario que se guardan en cache (nunca el password ni tokens)
+# Campos del usuario que se cachean en "user:{id}"; cada escritura en users debe
+# invalidar esa llave (ver auth_service.invalidate_user_cache)
+USER_CACHE_FIELDS = ("id", "name", "last_name", "email", "stripe_customer_id")
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/login")
+optional_oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/login", auto_error=False)
+admin_token_scheme = APIKeyHeader(name=AuthConfig.ADMIN_TOKEN_HEADER, auto_error=False)
+
+def require_admin(token: Optional[str] = Depends(admin_token_scheme)):
+    """
+    Endpoints de administración: exigir el token ADMIN_API_TOKEN en el header
+    Sin ADMIN_API_TOKEN configurado los endpoints quedan cerrados
+    """
+    if not AuthConfig.ADMIN_API_TOKEN:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN,
+                            detail="Endpoints de administración deshabilitados (ADMIN_API_TOKEN)")
+    if token is None or not hmac.compare_digest(token, AuthConfig.ADMIN_API_TOKEN):
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Token de administración inválido")
 
+def get_current_user_id(token: Optional[str] = Depends(optional_oauth2_scheme), access_token: Optional[str] = None) -> int:
+    """
+    Id del usuario del token sin abrir sesión de base de datos (para conexiones largas)
+    Acepta el header Authorization o ?access_token=... (EventSource no permite headers)
+    """
+    token = token or access_token
+    try:
+        payload = jwt.decode(token or "", SECRET_KEY, algorithms=[ALGORITHM])
+        return int(payload["sub"])
+    except (JWTError, KeyError, TypeError, ValueError):
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Could not validate credentials",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+
+@tracer.traced("get_current_user")
 def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
@@ -21,7 +62,18 @@ def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(
             raise credentials_exception
     except JWTError:
         raise credentials_exception
+    # Las consultas de la petición van al shard del usuario autenticado
+    pin_shard(db, int(user_id))
+    # Con cache se regresa un User desconectado de la sesión (sólo campos públicos)
+    cached_user = cache.get(f"user:{int(user_id)}")
+    if cached_user is not None:
+        return User(**cached_user)
     user = db.query(User).filter(User.id == int(user_id)).first()
     if user is None:
         raise credentials_exception
+    cache.set(
+        f"user:{user.id}",
+        {field: getattr(user, field) for field in USER_CACHE_FIELDS},
+        CacheConfig.USER_TTL_SECONDS
+    )
     return user
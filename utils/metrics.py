@@ -0,0 +1,117 @@
+import threading
+from typing import Callable, Dict, Iterable, List, Tuple
+
+# Registro mínimo de métricas en formato de texto de Prometheus.
+# Cada worker tiene su propio registro; el scraper agrega por instancia.
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+
+def _label_key(labels: Dict[str, str]) -> LabelKey:
+    return tuple(sorted((name, str(value)) for name, value in labels.items()))
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(key: LabelKey) -> str:
+    if not key:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in key) + "}"
+
+
+class Counter:
+    metric_type = "counter"
+
+    def __init__(self, name: str, description: str):
+        self.name = name
+        self.description = description
+        self._values: Dict[LabelKey, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self) -> Iterable[Tuple[str, LabelKey, float]]:
+        with self._lock:
+            return [(self.name, key, value) for key, value in self._values.items()]
+
+
+class Gauge(Counter):
+    metric_type = "gauge"
+
+    def set(self, value: float, **labels):
+        with self._lock:
+            self._values[_label_key(labels)] = value
+
+
+class CallbackGauge:
+    """Gauge cuyo valor se calcula al momento de leer las métricas"""
+    metric_type = "gauge"
+
+    def __init__(self, name: str, description: str,
+                 callback: Callable[[], Iterable[Tuple[Dict[str, str], float]]]):
+        self.name = name
+        self.description = description
+        self._callback = callback
+
+    def samples(self) -> Iterable[Tuple[str, LabelKey, float]]:
+        return [(self.name, _label_key(labels), value) for labels, value in self._callback()]
+
+
+class Summary:
+    """Conteo y suma de observaciones (ej: latencias en segundos)"""
+    metric_type = "summary"
+
+    def __init__(self, name: str, description: str):
+        self.name = name
+        self.description = description
+        self._count = Counter(f"{name}_count", description)
+        self._sum = Counter(f"{name}_sum", description)
+
+    def observe(self, value: float, **labels):
+        self._count.inc(1, **labels)
+        self._sum.inc(value, **labels)
+
+    def samples(self) -> Iterable[Tuple[str, LabelKey, float]]:
+        return list(self._count.samples()) + list(self._sum.samples())
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics: Dict[str, object] = {}
+        self._lock = threading.Lock()
+
+    def _register(self, metric):
+        with self._lock:
+            return self._metrics.setdefault(metric.name, metric)
+
+    def counter(self, name: str, description: str) -> Counter:
+        return self._register(Counter(name, description))
+
+    def gauge(self, name: str, description: str) -> Gauge:
+        return self._register(Gauge(name, description))
+
+    def callback_gauge(self, name: str, description: str, callback) -> CallbackGauge:
+        return self._register(CallbackGauge(name, description, callback))
+
+    def summary(self, name: str, description: str) -> Summary:
+        return self._register(Summary(name, description))
+
+    def render(self) -> str:
+        lines: List[str] = []
+        with self._lock:
+            metrics = list(self._metrics.values())
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {metric.description}")
+            lines.append(f"# TYPE {metric.name} {metric.metric_type}")
+            for name, key, value in metric.samples():
+                lines.append(f"{name}{_format_labels(key)} {value:g}")
+        return "\n".join(lines) + "\n"
+
+
+# Registro global de métricas
+metrics = MetricsRegistry()
@@ -0,0 +1,254 @@
+import asyncio
+import contextvars
+import functools
+import hmac
+import logging
+import os
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Dict, List, Optional
+
+from fastapi.routing import APIRoute
+
+from config.profiling_config import ProfilingConfig
+
+logger = logging.getLogger(__name__)
+
+# La petición actual trae el header de profiling con un token válido
+_profile_requested: contextvars.ContextVar[bool] = contextvars.ContextVar("profile_requested", default=False)
+
+
+class ProfileSession:
+    """Muestras de stack de un hilo mientras se ejecuta un endpoint"""
+
+    def __init__(self, route_key: str, thread_ident: int, shared_thread: bool):
+        self.route_key = route_key
+        self.thread_ident = thread_ident
+        # En rutas async el hilo es el del event loop y las muestras incluyen otras corrutinas
+        self.shared_thread = shared_thread
+        self.stacks: Counter = Counter()
+
+
+class SamplingProfiler:
+    """
+    Profiler por muestreo: un hilo toma sys._current_frames() cada pocos
+    milisegundos sólo mientras hay peticiones perfiladas (sin costo cuando no hay)
+
+    - Se activa por petición con el header de ProfilingConfig o por ruta con enable_route()
+    - Rate limit por minuto y máximo de sesiones simultáneas
+    - Salida en formato "folded" (una línea "frame;frame;frame cuenta") por ruta
+    """
+
+    def __init__(self, enabled: bool, token: str, interval: float, max_per_minute: int,
+                 max_concurrent: int, output_dir: str):
+        self.enabled = enabled
+        self.token = token
+        self.interval = interval
+        self.max_per_minute = max_per_minute
+        self.max_concurrent = max_concurrent
+        self.output_dir = output_dir
+        self._sessions: Dict[int, ProfileSession] = {}
+        self._route_toggles: Dict[str, int] = {}  # route_key -> peticiones restantes
+        self._route_stacks: Dict[str, Counter] = {}
+        self._route_requests: Counter = Counter()
+        self._window_start = 0.0
+        self._window_count = 0
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+
+    # Activación
+    def token_matches(self, value: Optional[str]) -> bool:
+        return bool(self.token) and value is not None and hmac.compare_digest(value, self.token)
+
+    def enable_route(self, route_key: str, requests: int):
+        """Toggle de admin: perfilar las siguientes `requests` peticiones de la ruta"""
+        with self._lock:
+            if requests > 0:
+                self._route_toggles[route_key] = requests
+            else:
+                self._route_toggles.pop(route_key, None)
+
+    def _should_profile(self, route_key: str) -> bool:
+        if not self.enabled:
+            return False
+        requested = _profile_requested.get()
+        if not requested and route_key not in self._route_toggles:
+            return False
+        with self._lock:
+            now = time.monotonic()
+            if now - self._window_start >= 60:
+                self._window_start, self._window_count = now, 0
+            if self._window_count >= self.max_per_minute or len(self._sessions) >= self.max_concurrent:
+                return False
+            if not requested:
+                remaining = self._route_toggles.get(route_key, 0)
+                if remaining <= 0:
+                    return False
+                if remaining == 1:
+                    del self._route_toggles[route_key]
+                else:
+                    self._route_toggles[route_key] = remaining - 1
+            self._window_count += 1
+            return True
+
+    # Sesiones
+    def _start(self, route_key: str, shared_thread: bool) -> ProfileSession:
+        session = ProfileSession(route_key, threading.get_ident(), shared_thread)
+        with self._lock:
+            self._sessions[id(session)] = session
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+                self._thread.start()
+        return session
+
+    def _stop(self, session: ProfileSession):
+        with self._lock:
+            self._sessions.pop(id(session), None)
+            stacks = self._route_stacks.setdefault(session.route_key, Counter())
+            stacks.update(session.stacks)
+            self._route_requests[session.route_key] += 1
+            snapshot = Counter(stacks)
+        try:
+            self._write(session.route_key, snapshot)
+        except Exception as e:
+            logger.warning(f"Could not write profile for {session.route_key}: {e}")
+
+    def _run(self):
+        while True:
+            with self._lock:
+                sessions = list(self._sessions.values())
+                if not sessions:
+                    self._thread = None
+                    return
+            frames = sys._current_frames()
+            for session in sessions:
+                frame = frames.get(session.thread_ident)
+                if frame is not None:
+                    stack = _fold(frame)
+                    session.stacks[f"[event loop];{stack}" if session.shared_thread else stack] += 1
+            time.sleep(self.interval)
+
+    # Salida
+    def _path(self, route_key: str) -> str:
+        name = re.sub(r"[^A-Za-z0-9_.-]+", "_", route_key).strip("_")
+        return os.path.join(self.output_dir, f"{name}.folded")
+
+    def _write(self, route_key: str, stacks: Counter):
+        os.makedirs(self.output_dir, exist_ok=True)
+        path = self._path(route_key)
+        with open(f"{path}.tmp", "w", encoding="utf-8") as f:
+            for stack, count in stacks.most_common():
+                f.write(f"{stack} {count}\n")
+        os.replace(f"{path}.tmp", path)
+
+    def status(self) -> Dict[str, object]:
+        with self._lock:
+            return {
+                "enabled": self.enabled,
+                "active_sessions": len(self._sessions),
+                "route_toggles": dict(self._route_toggles),
+                "routes": {
+                    route_key: {
+                        "requests": self._route_requests[route_key],
+                        "samples": sum(stacks.values()),
+                        "file": self._path(route_key),
+                    }
+                    for route_key, stacks in self._route_stacks.items()
+                },
+            }
+
+    def reset(self, route_key: Optional[str] = None):
+        """Borrar las muestras acumuladas (de una ruta o de todas)"""
+        with self._lock:
+            keys = [route_key] if route_key else list(self._route_stacks)
+            for key in keys:
+                self._route_stacks.pop(key, None)
+                self._route_requests.pop(key, None)
+        for key in keys:
+            path = self._path(key)
+            if os.path.exists(path):
+                os.remove(path)
+
+    # Integración con FastAPI
+    def wrap_endpoint(self, route_key: str, endpoint):
+        """Envolver un endpoint para registrarlo como sesión cuando toca perfilarlo"""
+        # include_router vuelve a crear la ruta con el prefijo: envolver el original otra vez
+        endpoint = getattr(endpoint, "_profiled_endpoint", endpoint)
+        if asyncio.iscoroutinefunction(endpoint):
+            @functools.wraps(endpoint)
+            async def async_wrapper(*args, **kwargs):
+                if not self._should_profile(route_key):
+                    return await endpoint(*args, **kwargs)
+                session = self._start(route_key, shared_thread=True)
+                try:
+                    return await endpoint(*args, **kwargs)
+                finally:
+                    self._stop(session)
+            async_wrapper._profiled_endpoint = endpoint
+            return async_wrapper
+
+        @functools.wraps(endpoint)
+        def sync_wrapper(*args, **kwargs):
+            # Se ejecuta en el hilo del threadpool que atiende la petición
+            if not self._should_profile(route_key):
+                return endpoint(*args, **kwargs)
+            session = self._start(route_key, shared_thread=False)
+            try:
+                return endpoint(*args, **kwargs)
+            finally:
+                self._stop(session)
+        sync_wrapper._profiled_endpoint = endpoint
+        return sync_wrapper
+
+
+def _fold(frame) -> str:
+    """Stack de la raíz a la hoja como "func (archivo:línea);..." """
+    parts: List[str] = []
+    while frame is not None:
+        code = frame.f_code
+        parts.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+        frame = frame.f_back
+    return ";".join(reversed(parts))
+
+
+class ProfilingMiddleware:
+    """Middleware ASGI puro: marca la petición si trae el header de profiling válido"""
+
+    def __init__(self, app, profiler: SamplingProfiler, header: str):
+        self.app = app
+        self.profiler = profiler
+        self.header = header.lower().encode("latin-1")
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self.profiler.enabled or not self.profiler.token:
+            await self.app(scope, receive, send)
+            return
+        value = next((v for k, v in scope.get("headers") or [] if k == self.header), None)
+        token = _profile_requested.set(self.profiler.token_matches(value.decode("latin-1") if value else None))
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            _profile_requested.reset(token)
+
+
+# Instancia global del profiler
+profiler = SamplingProfiler(
+    enabled=ProfilingConfig.ENABLED,
+    token=ProfilingConfig.TOKEN,
+    interval=ProfilingConfig.SAMPLE_INTERVAL_MS / 1000,
+    max_per_minute=ProfilingConfig.MAX_PROFILES_PER_MINUTE,
+    max_concurrent=ProfilingConfig.MAX_CONCURRENT,
+    output_dir=ProfilingConfig.OUTPUT_DIR,
+)
+
+
+class ProfiledRoute(APIRoute):
+    """route_class para APIRouter: cada endpoint se puede perfilar por ruta ("METHOD /path")"""
+
+    def __init__(self, path: str, endpoint, **kwargs):
+        methods = sorted(kwargs.get("methods") or ["GET"])
+        route_key = f"{','.join(methods)} {path}"
+        super().__init__(path, profiler.wrap_endpoint(route_key, endpoint), **kwargs)
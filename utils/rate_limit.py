@@ -0,0 +1,164 @@
+import logging
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+from fastapi import HTTPException, Request, status
+
+from config.rate_limit_config import RateLimitConfig
+
+try:
+    import redis
+except ImportError:  # redis es opcional: sin él sólo existe el backend en memoria
+    redis = None
+
+logger = logging.getLogger(__name__)
+
+# Todas las operaciones usan ventana deslizante aproximada: el conteo de la
+# ventana fija actual más el de la anterior ponderado por el tiempo que aún se
+# traslapa. Es O(1) en tiempo y guarda sólo dos enteros por llave.
+
+
+def _sliding_count(previous: int, current: int, now: float, window: int) -> float:
+    elapsed_fraction = (now % window) / window
+    return previous * (1 - elapsed_fraction) + current
+
+
+def _retry_after(now: float, window: int) -> int:
+    return max(1, int(window - (now % window)) + 1)
+
+
+class MemoryRateLimitBackend:
+    """
+    Backend en proceso: dicts particionados, cada uno con su lock y un máximo
+    de llaves. Al llenarse se descarta la llave usada hace más tiempo (LRU).
+    """
+
+    def __init__(self, shards: int = 64, max_keys_per_shard: int = 4096):
+        self._max_keys = max_keys_per_shard
+        self._shards = [(threading.Lock(), OrderedDict()) for _ in range(shards)]
+
+    def hit(self, key: str, limit: int, window: int) -> Tuple[bool, int]:
+        now = time.time()
+        window_id = int(now // window)
+        lock, entries = self._shards[zlib.crc32(key.encode()) % len(self._shards)]
+
+        with lock:
+            entry = entries.get(key)  # [window_id, conteo actual, conteo anterior]
+            if entry is None:
+                entry = [window_id, 0, 0]
+            elif entry[0] != window_id:
+                previous = entry[1] if entry[0] == window_id - 1 else 0
+                entry = [window_id, 0, previous]
+
+            entries[key] = entry
+            entries.move_to_end(key)
+            if len(entries) > self._max_keys:
+                entries.popitem(last=False)
+
+            if _sliding_count(entry[2], entry[1] + 1, now, window) > limit:
+                return False, _retry_after(now, window)
+            entry[1] += 1
+            return True, 0
+
+
+class RedisRateLimitBackend:
+    """
+    Backend compartido entre workers sobre un servidor compatible con Redis.
+    Cada ventana es una llave con INCR + EXPIRE, así Redis descarta las viejas.
+    """
+
+    def __init__(self, url: str, prefix: str = "ratelimit"):
+        if redis is None:
+            raise RuntimeError("El paquete 'redis' es necesario para RedisRateLimitBackend")
+        self._client = redis.Redis.from_url(url, socket_timeout=0.2, socket_connect_timeout=0.2)
+        self._prefix = prefix
+
+    def hit(self, key: str, limit: int, window: int) -> Tuple[bool, int]:
+        now = time.time()
+        window_id = int(now // window)
+        current_key = f"{self._prefix}:{key}:{window_id}"
+        previous_key = f"{self._prefix}:{key}:{window_id - 1}"
+
+        pipe = self._client.pipeline(transaction=False)
+        pipe.incr(current_key)
+        pipe.expire(current_key, window * 2)
+        pipe.get(previous_key)
+        current, _, previous = pipe.execute()
+
+        if _sliding_count(int(previous or 0), int(current), now, window) > limit:
+            # Las peticiones rechazadas no cuentan para la siguiente ventana
+            self._client.decr(current_key)
+            return False, _retry_after(now, window)
+        return True, 0
+
+
+class RateLimiter:
+    """Aplica reglas "scope" -> (limite, ventana) sobre un backend intercambiable"""
+
+    def __init__(self, backend, rules: Dict[str, Tuple[int, int]], enabled: bool = True,
+                 fallback=None):
+        self.backend = backend
+        self.rules = rules
+        self.enabled = enabled
+        # Si el backend compartido falla, se usa el local en lugar de bloquear el login
+        self.fallback = fallback
+
+    def hit(self, scope: str, identifier: str) -> Tuple[bool, int]:
+        limit, window = self.rules[scope]
+        key = f"{scope}:{identifier}"
+        try:
+            return self.backend.hit(key, limit, window)
+        except Exception as e:
+            if self.fallback is None:
+                raise
+            logger.warning(f"Rate limit backend error, using in-memory fallback: {e}")
+            return self.fallback.hit(key, limit, window)
+
+    def check(self, scope: str, identifier: Optional[str]):
+        """Lanza 429 si se excede la regla; debe llamarse antes de cualquier hash"""
+        if not self.enabled or not identifier:
+            return
+        allowed, retry_after = self.hit(scope, identifier)
+        if not allowed:
+            logger.warning(f"Rate limit exceeded for {scope}")
+            raise HTTPException(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                detail="Demasiados intentos, intenta de nuevo más tarde",
+                headers={"Retry-After": str(retry_after)},
+            )
+
+    def check_request(self, action: str, request: Request, email: Optional[str] = None):
+        """Revisar los límites por IP y por email de una acción de autenticación"""
+        self.check(f"{action}:ip", get_client_ip(request))
+        if email:
+            self.check(f"{action}:email", email.strip().lower())
+
+
+def get_client_ip(request: Request) -> Optional[str]:
+    if RateLimitConfig.TRUST_FORWARDED_FOR:
+        forwarded_for = request.headers.get("x-forwarded-for")
+        if forwarded_for:
+            return forwarded_for.split(",")[0].strip()
+    return request.client.host if request.client else None
+
+
+def _build_auth_rate_limiter() -> RateLimiter:
+    memory_backend = MemoryRateLimitBackend(
+        shards=RateLimitConfig.MEMORY_SHARDS,
+        max_keys_per_shard=RateLimitConfig.MEMORY_MAX_KEYS_PER_SHARD,
+    )
+    if RateLimitConfig.REDIS_URL:
+        return RateLimiter(
+            RedisRateLimitBackend(RateLimitConfig.REDIS_URL),
+            RateLimitConfig.RULES,
+            enabled=RateLimitConfig.ENABLED,
+            fallback=memory_backend,
+        )
+    return RateLimiter(memory_backend, RateLimitConfig.RULES, enabled=RateLimitConfig.ENABLED)
+
+
+# Instancia global del limitador de autenticación
+auth_rate_limiter = _build_auth_rate_limiter()
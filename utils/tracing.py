@@ -0,0 +1,357 @@
+import atexit
+import contextvars
+import functools
+import json
+import logging
+import queue
+import random
+import re
+import secrets
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional
+
+import requests
+from sqlalchemy import event
+
+from config.tracing_config import TracingConfig
+
+logger = logging.getLogger(__name__)
+
+# Span activo en esta petición/hilo
+_current_span: contextvars.ContextVar[Optional["Span"]] = contextvars.ContextVar("current_span", default=None)
+
+TRACEPARENT = re.compile(r"^00-([0-9a-f]{32})-([0-9a-f]{16})-([0-9a-f]{2})$")
+
+SPAN_KINDS = {"internal": 1, "server": 2, "client": 3}
+
+
+class SpanContext:
+    """Identificadores que viajan en el header traceparent (W3C Trace Context)"""
+
+    def __init__(self, trace_id: str, span_id: str, sampled: bool):
+        self.trace_id = trace_id
+        self.span_id = span_id
+        self.sampled = sampled
+
+    @classmethod
+    def from_traceparent(cls, header: Optional[str]) -> Optional["SpanContext"]:
+        match = TRACEPARENT.match((header or "").strip().lower())
+        if not match or set(match.group(1)) == {"0"} or set(match.group(2)) == {"0"}:
+            return None
+        return cls(match.group(1), match.group(2), int(match.group(3), 16) & 1 == 1)
+
+    def to_traceparent(self) -> str:
+        return f"00-{self.trace_id}-{self.span_id}-{'01' if self.sampled else '00'}"
+
+
+class Span(SpanContext):
+    def __init__(self, name: str, trace_id: str, parent_id: Optional[str], sampled: bool,
+                 kind: str = "internal", attributes: Optional[Dict[str, Any]] = None):
+        super().__init__(trace_id, secrets.token_hex(8), sampled)
+        self.name = name
+        self.parent_id = parent_id
+        self.kind = kind
+        self.attributes = dict(attributes or {})
+        self.start_ns = time.time_ns()
+        self.end_ns: Optional[int] = None
+        self.error: Optional[str] = None
+
+    def set_attribute(self, key: str, value: Any):
+        self.attributes[key] = value
+
+    def record_error(self, error: BaseException):
+        self.error = f"{type(error).__name__}: {error}"
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "kind": self.kind,
+            "start_ns": self.start_ns,
+            "end_ns": self.end_ns,
+            "duration_ms": round((self.end_ns - self.start_ns) / 1e6, 3) if self.end_ns else None,
+            "attributes": self.attributes,
+            "error": self.error,
+        }
+
+
+# Exportadores
+class FileSpanExporter:
+    """Un span por línea (NDJSON) en un archivo local"""
+
+    def __init__(self, path: str):
+        self.path = path
+
+    def export(self, spans: List[Span]):
+        with open(self.path, "a", encoding="utf-8") as f:
+            for span in spans:
+                f.write(json.dumps(span.to_dict(), default=str) + "\n")
+
+
+class OtlpHttpSpanExporter:
+    """OTLP/HTTP con cuerpo JSON (collector de OpenTelemetry, Jaeger, Tempo o un stand-in)"""
+
+    def __init__(self, endpoint: str, service_name: str, timeout: float = 5):
+        self.endpoint = endpoint
+        self.service_name = service_name
+        self.timeout = timeout
+        self.session = requests.Session()
+
+    @staticmethod
+    def _attribute(key: str, value: Any) -> Dict[str, Any]:
+        if isinstance(value, bool):
+            return {"key": key, "value": {"boolValue": value}}
+        if isinstance(value, int):
+            return {"key": key, "value": {"intValue": str(value)}}
+        if isinstance(value, float):
+            return {"key": key, "value": {"doubleValue": value}}
+        return {"key": key, "value": {"stringValue": str(value)}}
+
+    def _span(self, span: Span) -> Dict[str, Any]:
+        data = {
+            "traceId": span.trace_id,
+            "spanId": span.span_id,
+            "name": span.name,
+            "kind": SPAN_KINDS.get(span.kind, 1),
+            "startTimeUnixNano": str(span.start_ns),
+            "endTimeUnixNano": str(span.end_ns),
+            "attributes": [self._attribute(key, value) for key, value in span.attributes.items()],
+            "status": {"code": 2, "message": span.error} if span.error else {"code": 1},
+        }
+        if span.parent_id:
+            data["parentSpanId"] = span.parent_id
+        return data
+
+    def export(self, spans: List[Span]):
+        body = {"resourceSpans": [{
+            "resource": {"attributes": [self._attribute("service.name", self.service_name)]},
+            "scopeSpans": [{"scope": {"name": "tudi.tracing"}, "spans": [self._span(span) for span in spans]}],
+        }]}
+        response = self.session.post(self.endpoint, json=body, timeout=self.timeout)
+        response.raise_for_status()
+
+
+class BatchSpanProcessor:
+    """Junta spans terminados y los exporta en lotes desde un hilo, sin bloquear las peticiones"""
+
+    def __init__(self, exporter, batch_size: int = 256, interval: float = 2, max_queue_size: int = 4096):
+        self.exporter = exporter
+        self.batch_size = batch_size
+        self.interval = interval
+        self._queue: "queue.Queue[Span]" = queue.Queue(maxsize=max_queue_size)
+        self._lock = threading.Lock()
+        self._thread = threading.Thread(target=self._run, name="span-exporter", daemon=True)
+        self._thread.start()
+        atexit.register(self.flush)
+
+    def on_end(self, span: Span):
+        try:
+            self._queue.put_nowait(span)
+        except queue.Full:
+            pass  # Si el exportador no alcanza se pierden spans, nunca peticiones
+
+    def _drain(self) -> List[Span]:
+        spans = []
+        while len(spans) < self.batch_size:
+            try:
+                spans.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return spans
+
+    def flush(self):
+        with self._lock:
+            while True:
+                spans = self._drain()
+                if not spans:
+                    return
+                try:
+                    self.exporter.export(spans)
+                except Exception as e:
+                    logger.warning(f"Span export failed, dropping {len(spans)} spans: {e}")
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            self.flush()
+
+
+class Tracer:
+    def __init__(self, processor: Optional[BatchSpanProcessor] = None, sample_rate: float = 1.0,
+                 enabled: bool = True):
+        self.processor = processor
+        self.sample_rate = sample_rate
+        self.enabled = enabled
+
+    def current_span(self) -> Optional[Span]:
+        return _current_span.get()
+
+    def _new_span(self, name: str, parent: Optional[SpanContext], kind: str, attributes) -> Span:
+        if parent is None:
+            return Span(name, secrets.token_hex(16), None, random.random() < self.sample_rate, kind, attributes)
+        return Span(name, parent.trace_id, parent.span_id, parent.sampled, kind, attributes)
+
+    @contextmanager
+    def start_span(self, name: str, kind: str = "internal", attributes: Optional[Dict[str, Any]] = None,
+                   parent: Optional[SpanContext] = None, child_only: bool = False):
+        """
+        Abrir un span como hijo del span activo (o de `parent`)
+        Con child_only=True no se crea nada si no hay una traza en curso
+        """
+        parent = parent or _current_span.get()
+        if not self.enabled or (child_only and parent is None):
+            yield None
+            return
+        span = self._new_span(name, parent, kind, attributes)
+        token = _current_span.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            span.record_error(e)
+            raise
+        finally:
+            _current_span.reset(token)
+            self.end_span(span)
+
+    def start_detached(self, name: str, kind: str = "internal", attributes: Optional[Dict[str, Any]] = None,
+                       child_only: bool = True) -> Optional[Span]:
+        """Span que se termina con end_span() desde otro callback (ej: eventos de SQLAlchemy)"""
+        parent = _current_span.get()
+        if not self.enabled or (child_only and parent is None):
+            return None
+        if parent is not None and not parent.sampled:
+            return None  # No se va a exportar: ahorrar el span por sentencia
+        return self._new_span(name, parent, kind, attributes)
+
+    def end_span(self, span: Span):
+        span.end_ns = time.time_ns()
+        if span.sampled and self.processor is not None:
+            self.processor.on_end(span)
+
+    def traced(self, name: str, kind: str = "internal"):
+        """Decorador para medir una función completa como span"""
+        def decorator(func):
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                with self.start_span(name, kind):
+                    return func(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def inject(self, headers: Dict[str, str]):
+        """Agregar traceparent a los headers de una llamada saliente"""
+        span = _current_span.get()
+        if self.enabled and span is not None:
+            headers["traceparent"] = span.to_traceparent()
+
+
+class TracingMiddleware:
+    """
+    Middleware ASGI puro: un span "server" por petición HTTP que continúa el
+    traceparent entrante y lo regresa en la respuesta
+    """
+
+    def __init__(self, app, tracer: "Tracer"):
+        self.app = app
+        self.tracer = tracer
+        self._route_templates: Dict[Any, str] = {}
+
+    def _route_template(self, scope) -> str:
+        # Starlette deja el endpoint resuelto en el scope; se traduce a la ruta declarada
+        endpoint = scope.get("endpoint")
+        if endpoint is None:
+            return scope.get("path", "")
+        template = self._route_templates.get(endpoint)
+        if template is None:
+            template = next(
+                (getattr(route, "path", None) for route in scope["app"].router.routes
+                 if getattr(route, "endpoint", None) is endpoint),
+                None
+            ) or scope.get("path", "")
+            self._route_templates[endpoint] = template
+        return template
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self.tracer.enabled:
+            await self.app(scope, receive, send)
+            return
+
+        headers = dict(scope.get("headers") or [])
+        parent = SpanContext.from_traceparent(headers.get(b"traceparent", b"").decode("latin-1"))
+        method = scope.get("method", "")
+        with self.tracer.start_span(f"{method} {scope.get('path', '')}", kind="server", parent=parent,
+                                    attributes={"http.method": method, "http.target": scope.get("path", "")}) as span:
+
+            async def send_wrapper(message):
+                if message["type"] == "http.response.start":
+                    span.set_attribute("http.status_code", message["status"])
+                    if message["status"] >= 500:
+                        span.error = f"HTTP {message['status']}"
+                    message.setdefault("headers", [])
+                    message["headers"] = list(message["headers"]) + [
+                        (b"traceparent", span.to_traceparent().encode("latin-1"))
+                    ]
+                await send(message)
+
+            try:
+                await self.app(scope, receive, send_wrapper)
+            finally:
+                route = self._route_template(scope)
+                span.name = f"{method} {route}"
+                span.set_attribute("http.route", route)
+
+
+def instrument_engine(engine, tracer: "Tracer"):
+    """Un span por sentencia SQL, sólo dentro de una traza en curso"""
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        span = tracer.start_detached(
+            "db.query", kind="client",
+            attributes={
+                "db.system": engine.dialect.name,
+                "db.statement": statement[:TracingConfig.MAX_STATEMENT_LENGTH],
+                "db.executemany": executemany,
+            },
+        )
+        if context is not None:
+            context._tracing_span = span
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        span = getattr(context, "_tracing_span", None)
+        if span is not None:
+            if cursor.rowcount is not None and cursor.rowcount >= 0:
+                span.set_attribute("db.rowcount", cursor.rowcount)
+            tracer.end_span(span)
+
+    @event.listens_for(engine, "handle_error")
+    def handle_error(exception_context):
+        span = getattr(exception_context.execution_context, "_tracing_span", None)
+        if span is not None:
+            span.record_error(exception_context.original_exception)
+            tracer.end_span(span)
+
+
+def _build_tracer() -> Tracer:
+    if not TracingConfig.ENABLED or TracingConfig.EXPORTER == "none":
+        return Tracer(enabled=TracingConfig.ENABLED, sample_rate=TracingConfig.SAMPLE_RATE)
+    if TracingConfig.EXPORTER == "otlp":
+        exporter = OtlpHttpSpanExporter(TracingConfig.OTLP_ENDPOINT, TracingConfig.SERVICE_NAME)
+    else:
+        exporter = FileSpanExporter(TracingConfig.FILE_PATH)
+    processor = BatchSpanProcessor(
+        exporter,
+        batch_size=TracingConfig.EXPORT_BATCH_SIZE,
+        interval=TracingConfig.EXPORT_INTERVAL_SECONDS,
+        max_queue_size=TracingConfig.MAX_QUEUE_SIZE,
+    )
+    return Tracer(processor, sample_rate=TracingConfig.SAMPLE_RATE)
+
+
+# Instancia global del tracer
+tracer = _build_tracer()